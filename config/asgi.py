@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# serve the public listing pages with their async views (see config.urls_async)
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'config.urls_async')
 
 application = get_asgi_application()
@@ -0,0 +1,232 @@
+"""
+Per-request query and timing metrics.
+
+RequestMetricsMiddleware records, for a sample of requests, the SQL query
+count, repeated queries, time spent in the database and in template
+rendering, and the response size. Each sampled request is logged to the
+``config.requests`` logger (the numbers are in the record's ``metrics``
+attribute for structured handlers), optionally reported in a
+``Server-Timing`` header, and checked against QUERY_BUDGETS, which maps URL
+names to the most queries that page may run.
+
+Queries are counted by an execute wrapper installed on every connection,
+and templates by wrapping the template backend's render(). Both look up the
+current request's metrics in a context variable, which follows async views
+into the threads their ORM calls run in. Unsampled requests pay for one
+context-variable lookup per query and template.
+
+Settings:
+
+    REQUEST_METRICS_SAMPLE_RATE   fraction of requests measured (0 disables)
+    REQUEST_METRICS_HEADER        add Server-Timing to measured responses
+    QUERY_BUDGETS                 {"url_name": max_queries}
+
+Tests call assert_query_budget(response) to fail when a page goes over.
+"""
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger("config.requests")
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []  # (sql, params, seconds)
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.url_name = None
+        self.size = None
+        self.status = None
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    @property
+    def db_seconds(self):
+        return sum(seconds for _, _, seconds in self.queries)
+
+    def duplicates(self):
+        """{sql: times run} for statements run more than once with the same parameters."""
+        seen = {}
+        for sql, params, _ in self.queries:
+            key = (sql, repr(params))
+            seen[key] = seen.get(key, 0) + 1
+        repeated = {}
+        for (sql, _), count in seen.items():
+            if count > 1:
+                repeated[sql] = repeated.get(sql, 0) + count - 1
+        return repeated
+
+    def budget(self):
+        return getattr(settings, "QUERY_BUDGETS", {}).get(self.url_name)
+
+    def over_budget(self):
+        budget = self.budget()
+        return budget is not None and self.query_count > budget
+
+    def as_dict(self):
+        return {
+            "url_name": self.url_name,
+            "status": self.status,
+            "queries": self.query_count,
+            "duplicate_queries": sum(self.duplicates().values()),
+            "db_ms": round(self.db_seconds * 1000, 2),
+            "template_ms": round(self.template_seconds * 1000, 2),
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "response_bytes": self.size,
+            "query_budget": self.budget(),
+        }
+
+    def server_timing(self):
+        data = self.as_dict()
+        return ", ".join((
+            f'db;dur={data["db_ms"]};desc="{data["queries"]} queries"',
+            f'tpl;dur={data["template_ms"]}',
+            f'total;dur={data["total_ms"]}',
+        ))
+
+
+# ---------- hooks ---------- #
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries.append((sql, params, time.perf_counter() - started))
+
+
+def install_query_hook(sender=None, connection=None, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_hook, dispatch_uid="config.instrumentation.queries")
+
+_backend_render = django_backend.Template.render
+
+
+def _timed_render(self, context=None, request=None):
+    metrics = _current.get()
+    if metrics is None:
+        return _backend_render(self, context, request)
+    # only the outermost render counts; includes are part of its time
+    metrics.template_depth += 1
+    started = time.perf_counter()
+    try:
+        return _backend_render(self, context, request)
+    finally:
+        metrics.template_depth -= 1
+        if not metrics.template_depth:
+            metrics.template_seconds += time.perf_counter() - started
+
+
+def install_template_hook():
+    django_backend.Template.render = _timed_render
+
+
+# ---------- middleware ---------- #
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_template_hook()
+        # connections opened before the middleware was loaded
+        for connection in connections.all(initialized_only=True):
+            install_query_hook(connection=connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = self.start(request)
+        if metrics is None:
+            return self.get_response(request)
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = self.start(request)
+        if metrics is None:
+            return await self.get_response(request)
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def start(self, request):
+        rate = getattr(settings, "REQUEST_METRICS_SAMPLE_RATE", 0)
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return None
+        return RequestMetrics()
+
+    def finish(self, request, response, metrics):
+        match = getattr(request, "resolver_match", None)
+        metrics.url_name = match.view_name if match else None
+        metrics.status = response.status_code
+        if not response.streaming:
+            metrics.size = len(response.content)
+        response.request_metrics = metrics
+        if getattr(settings, "REQUEST_METRICS_HEADER", False):
+            response["Server-Timing"] = metrics.server_timing()
+
+        data = metrics.as_dict()
+        level = logging.WARNING if metrics.over_budget() else logging.INFO
+        logger.log(
+            level,
+            "%s %s %s queries=%s duplicates=%s db=%sms templates=%sms total=%sms bytes=%s",
+            request.method, request.path, data["status"], data["queries"], data["duplicate_queries"],
+            data["db_ms"], data["template_ms"], data["total_ms"], data["response_bytes"],
+            extra={"metrics": data},
+        )
+        return response
+
+
+# ---------- tests ---------- #
+
+def assert_query_budget(response, budget=None):
+    """
+    Fail when the request behind ``response`` (from the test client, with
+    REQUEST_METRICS_SAMPLE_RATE = 1) ran more queries than its URL name's
+    budget, listing the statements it ran.
+    """
+    metrics = getattr(response, "request_metrics", None)
+    if metrics is None:
+        raise AssertionError("Response has no request metrics; is REQUEST_METRICS_SAMPLE_RATE 1?")
+    budget = metrics.budget() if budget is None else budget
+    if budget is None:
+        raise AssertionError(f"No query budget for {metrics.url_name!r}; add it to QUERY_BUDGETS.")
+    if metrics.query_count > budget:
+        statements = "\n".join(f"  {sql}" for sql, _, _ in metrics.queries)
+        raise QueryBudgetExceeded(
+            f"{metrics.url_name} ran {metrics.query_count} queries (budget {budget}):\n{statements}"
+        )
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 
+from .database import sqlite_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -40,10 +42,12 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'django.contrib.humanize',
     'accounts',
+    'jobs',
     'listings',
 ]
 
 MIDDLEWARE = [
+    'config.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,7 +59,30 @@ MIDDLEWARE = [
 
 ]
 
-ROOT_URLCONF = 'config.urls'
+# Query/timing metrics for a sample of requests (config.instrumentation).
+# Server-Timing is only sent in development.
+REQUEST_METRICS_SAMPLE_RATE = 1.0 if DEBUG else 0.02
+REQUEST_METRICS_HEADER = DEBUG
+
+# Most SQL queries each page may run (by URL name), checked by the tests.
+QUERY_BUDGETS = {
+    'public_home': 4,
+    'public_about': 0,
+    'public_contact': 0,
+    'public_omaha_info': 0,
+    'public_listings': 8,
+    'public_listing_detail': 3,
+    'public_listing_search': 2,
+    'public_listing_map': 1,
+    'public_market_stats': 1,
+    'api:listing_list': 3,
+    'api:listing_detail': 3,
+    'api:listing_photos': 3,
+    'api:market_stats': 1,
+}
+
+# config.asgi switches this to config.urls_async
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'config.urls')
 
 TEMPLATES = [
     {
@@ -79,10 +106,24 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# WAL, pragmas, persistent connections and BEGIN IMMEDIATE: see config.database
 DATABASES = {
+    'default': sqlite_database(BASE_DIR / 'db.sqlite3'),
+}
+
+
+# Cache
+# Public pages and listing cards are cached (see listings/caching.py) and
+# invalidated by version counters that the job worker, the importer and the
+# management commands bump too, so processes should share one cache. A
+# per-process backend (locmem) works for a single process such as runserver,
+# with the listings.W001 system check as a reminder. Redis or
+# Memcached work as well; the async views use the cache's a*() methods,
+# which Django runs the same way for every backend.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
     }
 }
 
@@ -130,10 +171,35 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # Keep this line only if you actually have a "static" folder in your project (you probably do)
 STATICFILES_DIRS = [BASE_DIR / "static"]
 
+# In production collectstatic writes content-hashed names (so they can be
+# cached forever) plus .gz/.br copies that listings.media.serve_static uses.
+# Listing photos are stored once per distinct content, named by SHA-256.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'photos': {
+        'BACKEND': 'config.storage.ContentAddressedStorage',
+        'OPTIONS': {'prefix': 'listing_photos/sha256'},
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'config.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
 # Media files (uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Let the front-end server stream media files instead of a Python worker:
+# 'x-accel-redirect' (nginx, internal location at MEDIA_ACCEL_PREFIX) or
+# 'x-sendfile' (Apache mod_xsendfile, lighttpd). None serves from Django.
+MEDIA_ACCEL = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+Storage backends.
+
+CompressedManifestStaticFilesStorage writes gzip and brotli copies next to
+each hashed static file during collectstatic, so nothing is compressed per
+request.
+
+ContentAddressedStorage (the "photos" storage) files every upload under the
+SHA-256 of its bytes, computed while the bytes are written, so the same
+photo uploaded twice is stored once and a name never changes content,
+which makes the files safe to cache as immutable. Deleting is left to the
+listings app, which counts who uses each file (see listings.blobs).
+"""
+import gzip
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip copies are always written
+    brotli = None
+
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt", ".html", ".map")
+MIN_SIZE = 256
+BLOCK_SIZE = 64 * 1024
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and hashed_name and not isinstance(processed, Exception):
+                self._compress(hashed_name)
+            yield name, hashed_name, processed
+
+    def _compress(self, name):
+        if not name.endswith(COMPRESSIBLE):
+            return
+        with self.open(name) as fh:
+            data = fh.read()
+        if len(data) < MIN_SIZE:
+            return
+        for suffix, compress in self._compressors():
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+
+    def _compressors(self):
+        yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+        if brotli is not None:
+            yield ".br", lambda data: brotli.compress(data, quality=11)
+
+
+# <prefix>/<first two hex digits>/<sha256><ext>
+CONTENT_NAME = re.compile(r"(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}(\.\w+)?$")
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def __init__(self, prefix="", **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix
+
+    def content_name(self, digest, name):
+        """The name a file with this SHA-256 is stored under; ``name`` gives the extension."""
+        ext = posixpath.splitext(name)[1].lower()
+        return posixpath.join(self.prefix, digest[:2], digest + ext)
+
+    def name_for(self, fh, name):
+        """The name the bytes of the open file ``fh`` would be stored under, without storing them."""
+        digest = hashlib.sha256()
+        for block in iter(lambda: fh.read(BLOCK_SIZE), b""):
+            digest.update(block)
+        fh.seek(0)
+        return self.content_name(digest.hexdigest(), name)
+
+    def is_content_name(self, name):
+        return name.startswith(self.prefix) and CONTENT_NAME.search(name) is not None
+
+    def get_available_name(self, name, max_length=None):
+        # _save() picks the name; the same bytes always get the same one
+        return name
+
+    def _save(self, name, content):
+        if hasattr(content, "temporary_file_path"):
+            # already on disk (a large upload): hash it, then move it into place
+            path = content.temporary_file_path()
+            digest = hashlib.sha256()
+            with open(path, "rb") as fh:
+                for block in iter(lambda: fh.read(BLOCK_SIZE), b""):
+                    digest.update(block)
+        else:
+            # hash the chunks as they are written to a temporary file
+            directory = self.path(self.prefix)
+            os.makedirs(directory, exist_ok=True)
+            fd, path = tempfile.mkstemp(dir=directory, suffix=".part")
+            digest = hashlib.sha256()
+            with os.fdopen(fd, "wb") as out:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+
+        name = self.content_name(digest.hexdigest(), name)
+        full_path = self.path(name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        try:
+            # stored already? touch it so a running GC leaves it alone
+            os.utime(full_path)
+        except FileNotFoundError:
+            # not stored, or GC removed it just now: write it
+            if hasattr(content, "temporary_file_path"):
+                file_move_safe(path, full_path)
+            else:
+                os.replace(path, full_path)
+        else:
+            if not hasattr(content, "temporary_file_path"):
+                os.remove(path)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
@@ -1,10 +1,14 @@
-from listings.views import public_home, public_listings, public_listing_detail
+from listings.views import (
+    public_home, public_listings, public_listing_detail, public_listing_map,
+    public_listing_search, public_market_stats,
+)
+from listings.media import serve_media, serve_static
 from accounts.views import admin_login_redirect
 from django.views.generic import TemplateView, RedirectView
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+import re
 
 urlpatterns = [
     path("", public_home, name="public_home"),
@@ -15,16 +19,32 @@ urlpatterns = [
     # LISTINGS
     path("listings/", public_listings, name="public_listings"),
     path("listings/<int:pk>/", public_listing_detail, name="public_listing_detail"),
+    path("listings/search/", public_listing_search, name="public_listing_search"),
+    path("listings/map/", public_listing_map, name="public_listing_map"),
 
     path("omaha-info/", TemplateView.as_view(
         template_name="site/omaha_info.html"), name="public_omaha_info"),
+    path("omaha-info/market/", public_market_stats, name="public_market_stats"),
 
     path("contact/", TemplateView.as_view(
         template_name="site/contact.html"), name="public_contact"),
 
+    # JSON API for the mobile app and partner sites
+    path("api/v1/", include("listings.api")),
+
     # admin stuff
     path("admin/", RedirectView.as_view(url="/dashboard/")),
     path("dashboard/login/", admin_login_redirect, name="admin-login-override"),
     path("dashboard/", admin.site.urls),
     path("accounts/", include("accounts.urls")),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+    # uploads are served with Range support (or handed off via MEDIA_ACCEL)
+    re_path(r"^%s(?P<path>.*)$" % re.escape(settings.MEDIA_URL.lstrip("/")), serve_media),
+]
+
+if not settings.DEBUG:
+    # collected, hashed and pre-compressed static files; in DEBUG runserver's
+    # staticfiles handler serves them from the app directories
+    urlpatterns.append(
+        re_path(r"^%s(?P<path>.*)$" % re.escape(settings.STATIC_URL.lstrip("/")), serve_static)
+    )
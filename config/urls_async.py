@@ -0,0 +1,22 @@
+"""
+URLconf for the ASGI deployment: config.urls with the public listing pages
+swapped for their async versions.
+"""
+from django.urls import URLPattern
+
+from listings import views
+
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    views.public_home: views.public_home_async,
+    views.public_listings: views.public_listings_async,
+    views.public_listing_detail: views.public_listing_detail_async,
+}
+
+urlpatterns = [
+    URLPattern(p.pattern, ASYNC_VIEWS[p.callback], p.default_args, p.name)
+    if isinstance(p, URLPattern) and p.callback in ASYNC_VIEWS
+    else p
+    for p in sync_urlpatterns
+]
@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "task", "status", "attempts", "run_after", "finished_at")
+    list_filter = ("status", "task")
+    readonly_fields = (
+        "task",
+        "payload",
+        "attempts",
+        "locked_at",
+        "last_error",
+        "created_at",
+        "finished_at",
+    )
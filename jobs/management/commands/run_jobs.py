@@ -0,0 +1,91 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from jobs.queue import claim, purge_done, requeue_stale, run_job, run_pending
+
+PURGE_INTERVAL = 3600
+
+
+def _init_worker():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    django.setup()
+
+
+def _run_in_worker(pk):
+    try:
+        return run_job(pk)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (photo processing, ...) from the jobs table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=2,
+            help="Number of worker processes (default: 2).",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no due jobs are left instead of polling forever.",
+        )
+        parser.add_argument(
+            "--inline",
+            action="store_true",
+            help="Run jobs in this process, without a pool (handy for debugging).",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when the queue is empty (default: 1).",
+        )
+
+    def handle(self, *args, **options):
+        self.next_purge = 0
+        if options["inline"]:
+            while True:
+                self.purge()
+                ran = run_pending()
+                if ran:
+                    self.stdout.write(f"Ran {ran} job(s).")
+                elif options["once"]:
+                    return
+                else:
+                    time.sleep(options["poll"])
+
+        concurrency = max(1, options["concurrency"])
+        # don't let forked workers inherit open database connections
+        connections.close_all()
+        running = set()
+        with ProcessPoolExecutor(max_workers=concurrency, initializer=_init_worker) as pool:
+            while True:
+                self.purge()
+                requeue_stale()
+                for pk in claim(concurrency - len(running)):
+                    running.add(pool.submit(_run_in_worker, pk))
+
+                if not running:
+                    if options["once"]:
+                        return
+                    time.sleep(options["poll"])
+                    continue
+
+                done, running = wait(running, timeout=options["poll"], return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.stdout.write(f"Job finished: {future.result()}")
+
+    def purge(self):
+        # finished jobs pile up otherwise; an hourly sweep is plenty
+        if time.monotonic() >= self.next_purge:
+            purge_done()
+            self.next_purge = time.monotonic() + PURGE_INTERVAL
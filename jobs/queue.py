@@ -0,0 +1,149 @@
+"""
+A small database-backed job queue.
+
+Jobs live in the ``jobs_job`` table, so the queue needs nothing besides the
+project database (SQLite included). Apps register work with ``@task`` in
+their ``tasks.py`` and hand it off with ``enqueue()``; ``manage.py run_jobs``
+claims due jobs and runs them in a process pool.
+
+Claiming is a conditional UPDATE (status "queued" -> "running"), so several
+workers can poll the same table without taking the same job twice. While a
+job runs its worker keeps refreshing ``locked_at``; only a job whose worker
+stopped doing that is handed out again. Finished jobs are kept for a week.
+"""
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+
+RETRY_BASE_SECONDS = 10
+# a "running" job whose worker died is handed out again after this long
+LOCK_TIMEOUT = timedelta(minutes=10)
+HEARTBEAT_SECONDS = LOCK_TIMEOUT.total_seconds() / 4
+KEEP_DONE = timedelta(days=7)
+
+
+def task(name):
+    """Register a function as a job task under ``name``."""
+    def decorator(func):
+        REGISTRY[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, max_attempts=3, delay=None, **payload):
+    """
+    Queue ``name`` to run with ``payload`` as keyword arguments. The job is
+    written in the current transaction: workers see it once that commits,
+    and it goes if that rolls back.
+    """
+    if name not in REGISTRY:
+        raise KeyError(f"Unknown job task {name!r}")
+    run_after = timezone.now() + (delay or timedelta())
+    job = Job(task=name, payload=payload, max_attempts=max_attempts, run_after=run_after)
+    job.save()
+    return job
+
+
+def requeue_stale():
+    return Job.objects.filter(
+        status="running", locked_at__lt=timezone.now() - LOCK_TIMEOUT
+    ).update(status="queued", locked_at=None)
+
+
+def purge_done(keep=KEEP_DONE):
+    """Delete the jobs that finished successfully more than ``keep`` ago."""
+    # run_after is never later than finished_at and is on the status index
+    deleted, _ = Job.objects.filter(status="done", run_after__lt=timezone.now() - keep).delete()
+    return deleted
+
+
+class Heartbeat(threading.Thread):
+    """Refreshes a running job's lock until stopped, so requeue_stale() leaves it alone."""
+
+    def __init__(self, pk):
+        super().__init__(daemon=True)
+        self.pk = pk
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(HEARTBEAT_SECONDS):
+                Job.objects.filter(pk=self.pk, status="running").update(locked_at=timezone.now())
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def claim(limit):
+    """Mark up to ``limit`` due jobs as running and return their ids."""
+    now = timezone.now()
+    candidates = (
+        Job.objects.filter(status="queued", run_after__lte=now)
+        .order_by("run_after", "id")
+        .values_list("pk", flat=True)[:limit]
+    )
+    claimed = []
+    for pk in candidates:
+        updated = Job.objects.filter(pk=pk, status="queued").update(
+            status="running", locked_at=now, attempts=F("attempts") + 1
+        )
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def run_job(pk):
+    """Run one claimed job and record the outcome. Returns the final status."""
+    job = Job.objects.get(pk=pk)
+    heartbeat = Heartbeat(pk)
+    heartbeat.start()
+    try:
+        func = REGISTRY[job.task]
+        func(**job.payload)
+    except Exception:
+        logger.warning("Job %s failed (attempt %s)", job, job.attempts, exc_info=True)
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            # exponential backoff: 10s, 20s, 40s, ...
+            delay = RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+            job.status = "queued"
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+        else:
+            job.status = "failed"
+            job.finished_at = timezone.now()
+    else:
+        job.status = "done"
+        job.last_error = ""
+        job.finished_at = timezone.now()
+    finally:
+        heartbeat.stop()
+    job.locked_at = None
+    job.save(update_fields=["status", "run_after", "last_error", "finished_at", "locked_at"])
+    return job.status
+
+
+def run_pending(limit=100):
+    """Run due jobs in this process. Used by tests and ``run_jobs --inline``."""
+    ran = 0
+    while ran < limit:
+        batch = claim(min(10, limit - ran))
+        if not batch:
+            break
+        for pk in batch:
+            run_job(pk)
+        ran += len(batch)
+    return ran
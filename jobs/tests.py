@@ -0,0 +1,86 @@
+import time
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from .models import Job
+from .queue import (
+    KEEP_DONE, LOCK_TIMEOUT, Heartbeat, claim, enqueue, purge_done, requeue_stale, run_pending, task,
+)
+
+calls = []
+
+
+@task("tests.record")
+def record(value):
+    calls.append(value)
+
+
+@task("tests.explode")
+def explode():
+    raise RuntimeError("boom")
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_joins_the_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                enqueue("tests.record", value=0)
+                raise RuntimeError
+        self.assertFalse(Job.objects.exists())
+        enqueue("tests.record", value=1)
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.objects.get().status, "done")
+
+    def test_job_is_claimed_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue("tests.record", value=1)
+        self.assertEqual(len(claim(5)), 1)
+        self.assertEqual(claim(5), [])
+
+    def test_failures_retry_then_fail(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue("tests.explode", max_attempts=2)
+        with self.assertLogs("jobs.queue", "WARNING"):
+            run_pending()
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), ("queued", 1))
+        self.assertIn("boom", job.last_error)
+
+        # make the retry due now
+        Job.objects.update(run_after=job.created_at)
+        with self.assertLogs("jobs.queue", "WARNING"):
+            run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+
+    def test_purge_keeps_recent_and_failed_jobs(self):
+        for status in ("done", "done", "failed"):
+            Job.objects.create(task="tests.record", status=status, run_after=timezone.now() - KEEP_DONE * 2)
+        Job.objects.create(task="tests.record", status="done")
+        self.assertEqual(purge_done(), 2)
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_unknown_task(self):
+        with self.assertRaises(KeyError):
+            enqueue("tests.nope")
+
+
+class HeartbeatTests(TransactionTestCase):
+    # the heartbeat writes from its own thread and connection
+    def test_running_job_keeps_its_lock(self):
+        job = enqueue("tests.record", value=1)
+        claim(1)
+        heartbeat = Heartbeat(job.pk)
+        with mock.patch("jobs.queue.HEARTBEAT_SECONDS", 0.01):
+            Job.objects.update(locked_at=timezone.now() - LOCK_TIMEOUT * 2)
+            heartbeat.start()
+            time.sleep(0.1)
+            heartbeat.stop()
+        self.assertEqual(requeue_stale(), 0)
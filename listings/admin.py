@@ -1,9 +1,14 @@
 from django import forms
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.utils.html import format_html
+from django.core.exceptions import PermissionDenied
 from django.forms.widgets import ClearableFileInput
+from django.urls import path, reverse
 
-from .models import Listing, ListingPhoto, Neighborhood, PriceRange, HomeType
+from . import search, uploads
+from .export import export_response
+from .models import Listing, ListingEvent, ListingPhoto, MarketStat, Neighborhood, PriceRange, HomeType, ZipCentroid
 
 
 # ---------- Inline for existing photos ---------- #
@@ -11,17 +16,31 @@ from .models import Listing, ListingPhoto, Neighborhood, PriceRange, HomeType
 class ListingPhotoInline(admin.TabularInline):
     model = ListingPhoto
     extra = 0
-    fields = ("preview", "image", "caption", "sort_order")
-    readonly_fields = ("preview",)
+    fields = ("preview", "image", "caption", "sort_order", "processing_status")
+    readonly_fields = ("preview", "processing_status")
 
     def preview(self, obj):
         if not obj or not obj.image:
             return ""
         return format_html(
-            '<img src="{}" style="height:70px;border-radius:6px;">', obj.image.url
+            '<img src="{}" style="height:70px;border-radius:6px;">',
+            obj.variant_url(320),
         )
 
 
+class ListingEventInline(admin.TabularInline):
+    """Read-only: the log is written by Listing.save()."""
+    model = ListingEvent
+    extra = 0
+    fields = ("at", "kind", "status", "visibility", "price", "old_price")
+    readonly_fields = fields
+    ordering = ("-at", "-id")
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 # ---------- Widget that supports multiple file selection ---------- #
 
 class MultiFileInput(ClearableFileInput):
@@ -59,10 +78,20 @@ class ListingAdminForm(forms.ModelForm):
 
 # ---------- Listing admin ---------- #
 
+class ExportChangeList(ChangeList):
+    """The changelist's filtering and ordering, without its paging counts."""
+
+    def get_results(self, request):
+        self.result_count = self.full_result_count = 0
+        self.result_list = []
+        self.can_show_all = self.multi_page = False
+        self.paginator = None
+
+
 @admin.register(Listing)
 class ListingAdmin(admin.ModelAdmin):
     form = ListingAdminForm
-    inlines = [ListingPhotoInline]
+    inlines = [ListingPhotoInline, ListingEventInline]
 
     list_display = (
         "__str__",
@@ -84,10 +113,19 @@ class ListingAdmin(admin.ModelAdmin):
         "neighborhood",
     )
     search_fields = ("street", "city", "zipcode", "description")
-    autocomplete_fields = ("neighborhood", "price_range", "home_type")
+    actions = ("export_csv", "export_json")
+    autocomplete_fields = ("neighborhood", "home_type")
     fieldsets = (
-        ("Basics", {"fields": ("status", "visibility", "is_featured", "description")}),
+        ("Basics", {"fields": ("status", "visibility", "is_featured", "mls_id", "description")}),
         ("Address", {"fields": ("street", "city", "state", "zipcode")}),
+        (
+            "Location",
+            {
+                "fields": ("latitude", "longitude"),
+                "description": "Leave blank to use the ZIP code's center.",
+                "classes": ("collapse",),
+            },
+        ),
         (
             "Attributes",
             {
@@ -114,10 +152,86 @@ class ListingAdmin(admin.ModelAdmin):
                 )
             },
         ),
-        ("Photos (upload new)", {"fields": ("new_photos",)}),
-        ("Timestamps", {"fields": ("created_at", "updated_at"), "classes": ("collapse",)}),
+        ("Photos (upload new)", {"fields": ("new_photos", "resumable_upload")}),
+        ("Timestamps", {"fields": ("created_at", "updated_at", "status_changed_at"), "classes": ("collapse",)}),
     )
-    readonly_fields = ("created_at", "updated_at")
+    # price_range is derived from price on save (see listings.pricing)
+    readonly_fields = ("price_range", "created_at", "updated_at", "status_changed_at", "resumable_upload")
+
+    class Media:
+        js = ("js/chunked_upload.js",)
+
+    def get_urls(self):
+        info = self.opts.app_label, self.opts.model_name
+        view = self.admin_site.admin_view
+        return [
+            path(
+                "<int:listing_id>/uploads/",
+                view(uploads.start_upload),
+                name="%s_%s_upload_start" % info,
+            ),
+            path(
+                "uploads/<uuid:upload_id>/",
+                view(uploads.upload_status),
+                name="%s_%s_upload_status" % info,
+            ),
+            path(
+                "uploads/<uuid:upload_id>/chunks/<int:index>/",
+                view(uploads.upload_chunk),
+                name="%s_%s_upload_chunk" % info,
+            ),
+            path(
+                "uploads/<uuid:upload_id>/complete/",
+                view(uploads.complete_upload),
+                name="%s_%s_upload_complete" % info,
+            ),
+            path("export/", view(self.export_view), name="%s_%s_export" % info),
+        ] + super().get_urls()
+
+    # ---------- export ---------- #
+
+    def export_view(self, request):
+        """The whole changelist as it's currently filtered, searched and sorted."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        fmt = request.GET.get("format", "csv")
+        # the changelist rejects query parameters it doesn't know
+        request.GET = request.GET.copy()
+        request.GET.pop("format", None)
+        request.listing_export = True
+        changelist = self.get_changelist_instance(request)
+        return export_response(changelist.get_queryset(request), fmt)
+
+    def get_changelist(self, request, **kwargs):
+        if getattr(request, "listing_export", False):
+            return ExportChangeList
+        return super().get_changelist(request, **kwargs)
+
+    @admin.action(description="Export selected listings as CSV", permissions=["view"])
+    def export_csv(self, request, queryset):
+        return export_response(queryset, "csv")
+
+    @admin.action(description="Export selected listings as JSON", permissions=["view"])
+    def export_json(self, request, queryset):
+        return export_response(queryset, "json")
+
+    @admin.display(description="Resumable upload")
+    def resumable_upload(self, obj):
+        if not obj or not obj.pk:
+            return "Save the listing first to use resumable uploads."
+        return format_html(
+            '<div class="chunked-upload" data-start-url="{}">'
+            '<input type="file" multiple accept="image/*">'
+            '<ul class="chunked-upload-list"></ul>'
+            "</div>",
+            reverse("admin:listings_listing_upload_start", args=[obj.pk]),
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        # FTS5 index instead of LIKE '%term%' over every search field
+        if not search_term.strip() or not search.available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        return search.search(queryset, search_term), False
 
     def save_model(self, request, obj, form, change):
         # set created_by once
@@ -156,3 +270,26 @@ class PriceRangeAdmin(admin.ModelAdmin):
     list_display = ("min_price", "max_price")
     ordering = ("min_price",)
     search_fields = ("min_price", "max_price")
+
+
+@admin.register(ZipCentroid)
+class ZipCentroidAdmin(admin.ModelAdmin):
+    list_display = ("zipcode", "city", "latitude", "longitude")
+    search_fields = ("zipcode", "city")
+
+
+@admin.register(MarketStat)
+class MarketStatAdmin(admin.ModelAdmin):
+    """Read-only: rows are written by listings.stats."""
+    list_display = (
+        "label", "dimension", "active_count", "pending_count", "sold_count",
+        "price_p50", "price_per_sqft_p50", "days_on_market_p50", "computed_at",
+    )
+    list_filter = ("dimension",)
+    search_fields = ("label", "key")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
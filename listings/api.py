@@ -0,0 +1,286 @@
+"""
+Read-only JSON API, mounted at /api/v1/.
+
+    GET listings/                 filtered, keyset-paginated listing search
+    GET listings/<pk>/            one listing with its photos
+    GET listings/<pk>/photos/     a listing's photos with variant URLs
+    GET market-stats/             neighborhood / home type / ZIP code rollups
+
+Rows are serialized straight from ``.values()`` (related names come in
+through joins, photos in one extra query), so no model instances or
+templates are involved. ``?fields=a,b`` limits the output to those fields.
+Responses carry the same ETag / Last-Modified validators as the public pages
+plus a short public max-age so a CDN can serve most reads, and anonymous
+responses go through the public page cache.
+"""
+from decimal import Decimal
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
+from django.urls import path, reverse
+from django.views.decorators.http import require_GET
+
+from .browse import SORTS, ListingFilterForm, apply_filters, paginate
+from .caching import cache_public_page
+from .conditional import conditional_listing_response
+from .images import FORMATS
+from .models import Listing, ListingPhoto, MarketStat
+from .stats import DIMENSIONS, PERCENTILES
+
+API_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+MAX_AGE = 60
+SHARED_MAX_AGE = 300
+
+# public field name -> .values() lookup
+LISTING_FIELDS = {
+    "id": "id",
+    "status": "status",
+    "street": "street",
+    "city": "city",
+    "state": "state",
+    "zipcode": "zipcode",
+    "latitude": "latitude",
+    "longitude": "longitude",
+    "price": "price",
+    "beds": "beds",
+    "baths": "baths",
+    "sqft": "sqft",
+    "year_built": "year_built",
+    "garage_spaces": "garage_spaces",
+    "lot_size_sqft": "lot_size_sqft",
+    "hoa_fee": "hoa_fee",
+    "description": "description",
+    "neighborhood": "neighborhood__name",
+    "home_type": "home_type__type_name",
+    "is_featured": "is_featured",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+# fields computed after the query
+EXTRA_FIELDS = ("url", "photo", "photos")
+LIST_DEFAULT = (
+    "id", "url", "street", "city", "state", "zipcode", "price",
+    "beds", "baths", "sqft", "neighborhood", "home_type", "photo",
+)
+DETAIL_DEFAULT = tuple(LISTING_FIELDS) + ("url", "photos")
+PHOTO_FIELDS = ("id", "listing_id", "image", "caption", "variants", "processing_status")
+
+api_response = conditional_listing_response(public=True, max_age=MAX_AGE, s_maxage=SHARED_MAX_AGE)
+
+
+class FieldError(ValueError):
+    pass
+
+
+def _error(message, code=400):
+    return JsonResponse({"error": message}, status=code)
+
+
+def requested_fields(request, default):
+    raw = request.GET.get("fields")
+    if not raw:
+        return list(default)
+    fields = [name.strip() for name in raw.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in LISTING_FIELDS and name not in EXTRA_FIELDS]
+    if unknown:
+        raise FieldError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def _plain(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+# ---------- photos ---------- #
+
+def photo_payload(row, storage):
+    sources = {}
+    if row["processing_status"] == "ready":
+        for fmt, entries in row["variants"].get("sources", {}).items():
+            sources[fmt] = [{"width": width, "url": storage.url(name)} for width, name in entries]
+    return {
+        "id": row["id"],
+        "url": storage.url(row["image"]) if row["image"] else None,
+        "caption": row["caption"],
+        "variants": sources,
+        "types": {fmt: FORMATS[fmt][2] for fmt in sources if fmt in FORMATS},
+    }
+
+
+def _photo_storage():
+    return ListingPhoto._meta.get_field("image").storage
+
+
+def cover_photos(listing_ids):
+    """{listing_id: photo payload} for the first photo of each listing, in one query."""
+    if not listing_ids:
+        return {}
+    rows = (
+        ListingPhoto.objects.filter(listing_id__in=listing_ids)
+        .annotate(
+            position=Window(
+                RowNumber(), partition_by=F("listing_id"), order_by=[F("sort_order"), F("id")]
+            )
+        )
+        .filter(position=1)
+        .values(*PHOTO_FIELDS)
+    )
+    storage = _photo_storage()
+    return {row["listing_id"]: photo_payload(row, storage) for row in rows}
+
+
+def photo_list(listing_id):
+    storage = _photo_storage()
+    return [
+        photo_payload(row, storage)
+        for row in ListingPhoto.objects.filter(listing_id=listing_id)
+        .order_by("sort_order", "id")
+        .values(*PHOTO_FIELDS)
+    ]
+
+
+# ---------- listings ---------- #
+
+def _lookups(fields, required=()):
+    lookups = {"id", *required}
+    lookups.update(LISTING_FIELDS[name] for name in fields if name in LISTING_FIELDS)
+    return sorted(lookups)
+
+
+def serialize(rows, fields):
+    """Rows from .values() to dicts holding only ``fields``, under their API names."""
+    ids = [row["id"] for row in rows]
+    covers = cover_photos(ids) if "photo" in fields else {}
+    items = []
+    for row in rows:
+        item = {}
+        for name in fields:
+            if name == "url":
+                item[name] = reverse("public_listing_detail", args=[row["id"]])
+            elif name == "photo":
+                item[name] = covers.get(row["id"])
+            elif name == "photos":
+                item[name] = photo_list(row["id"])
+            else:
+                item[name] = _plain(row[LISTING_FIELDS[name]])
+        items.append(item)
+    return items
+
+
+def _page_link(request, **params):
+    query = request.GET.copy()
+    for key in ("after", "before"):
+        query.pop(key, None)
+    query.update(params)
+    # relative: cached pages are shared by every host and scheme
+    return f"{request.path}?{query.urlencode()}"
+
+
+@require_GET
+@api_response
+@cache_public_page
+def listing_list(request):
+    try:
+        fields = requested_fields(request, LIST_DEFAULT)
+    except FieldError as exc:
+        return _error(str(exc))
+    if "photos" in fields:
+        return _error("'photos' is only available on a single listing; use 'photo'.")
+    try:
+        limit = min(max(int(request.GET.get("limit", API_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return _error("limit must be a number.")
+
+    form = ListingFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"error": "Invalid filters.", "fields": form.errors}, status=400)
+    sort = form.sort_key()
+
+    # the keyset cursor needs the sort column and id in every row
+    lookups = _lookups(fields, required=(SORTS[sort][1],))
+    queryset = apply_filters(Listing.objects.public(), form.filter_state()).values(*lookups)
+    page = paginate(
+        queryset,
+        sort=sort,
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+        page_size=limit,
+    )
+    return JsonResponse({
+        "results": serialize(page.items, fields),
+        "next": _page_link(request, after=page.next_cursor) if page.has_next else None,
+        "previous": _page_link(request, before=page.prev_cursor) if page.has_previous else None,
+    })
+
+
+def _listing_row(pk, lookups):
+    return Listing.objects.filter(pk=pk, visibility="Y").values(*lookups).first()
+
+
+@require_GET
+@api_response
+@cache_public_page
+def listing_detail(request, pk):
+    try:
+        fields = requested_fields(request, DETAIL_DEFAULT)
+    except FieldError as exc:
+        return _error(str(exc))
+    lookups = _lookups(fields)
+    row = _listing_row(pk, lookups)
+    if row is None:
+        return _error("No such listing.", code=404)
+    return JsonResponse(serialize([row], fields)[0])
+
+
+@require_GET
+@api_response
+@cache_public_page
+def listing_photos(request, pk):
+    if _listing_row(pk, ["id"]) is None:
+        return _error("No such listing.", code=404)
+    return JsonResponse({"results": photo_list(pk)})
+
+
+# ---------- market stats ---------- #
+
+def stat_payload(stat):
+    return {
+        "dimension": stat.dimension,
+        "key": stat.key,
+        "label": stat.label,
+        "active": stat.active_count,
+        "pending": stat.pending_count,
+        "sold": stat.sold_count,
+        "new": stat.new_count,
+        "price": {f"p{p}": getattr(stat, f"price_p{p}") for p in PERCENTILES},
+        "price_per_sqft_median": stat.price_per_sqft_p50,
+        "days_on_market_median": stat.days_on_market_p50,
+        "days_to_sell_median": stat.days_to_sell_p50,
+        "computed_at": stat.computed_at,
+    }
+
+
+@require_GET
+def market_stats(request):
+    """Rollups from listings.stats; ``?dimension=neighborhood`` (or home_type, zipcode, all) narrows them."""
+    stats = MarketStat.objects.all()
+    dimension = request.GET.get("dimension")
+    if dimension:
+        if dimension not in DIMENSIONS:
+            return _error(f"dimension must be one of: {', '.join(DIMENSIONS)}.")
+        stats = stats.filter(dimension=dimension)
+    response = JsonResponse({"results": [stat_payload(stat) for stat in stats]})
+    patch_cache_control(response, public=True, max_age=MAX_AGE, s_maxage=SHARED_MAX_AGE)
+    return response
+
+
+app_name = "api"
+urlpatterns = [
+    path("listings/", listing_list, name="listing_list"),
+    path("listings/<int:pk>/", listing_detail, name="listing_detail"),
+    path("listings/<int:pk>/photos/", listing_photos, name="listing_photos"),
+    path("market-stats/", market_stats, name="market_stats"),
+]
@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    from .search import ensure_schema
+
+    ensure_schema(using)
 
 
 class ListingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'listings'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+
+        # the FTS table lives outside migrations; see listings.search
+        post_migrate.connect(ensure_search_index, sender=self)
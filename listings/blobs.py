@@ -0,0 +1,132 @@
+"""
+Upkeep of the content-addressed photo files.
+
+The "photos" storage (config.storage.ContentAddressedStorage) keeps one
+file per distinct content, so several photos can share a file and deleting
+a photo can't delete its files. Instead PhotoBlob counts the photos using
+each file: ListingPhoto.save(), photo deletes, variant builds and the feed
+importer move the counts in the same transaction as the rows they change.
+
+collect() (``manage.py collect_photo_files``) deletes the files nothing
+counts any more, along with temporary files left by interrupted saves.
+Anything written within the grace period is left alone: its photo row may
+not be committed yet. recount() rebuilds the counts from the photo rows.
+
+rehash() (``manage.py rehash_listing_photos``) moves photos stored under
+the old listing_photos/<listing id>/<filename> names, and their variants,
+into the content-addressed storage, hashing on a thread pool.
+"""
+import os
+import posixpath
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching, cards
+from .models import ListingPhoto, PhotoBlob, variant_names
+
+GRACE = timedelta(hours=1)
+BATCH_SIZE = 500
+
+
+def _storage():
+    storage = ListingPhoto._meta.get_field("image").storage
+    if not hasattr(storage, "is_content_name"):
+        raise ImproperlyConfigured("The photos storage is not content-addressed.")
+    return storage
+
+
+def recount():
+    """Rebuild every PhotoBlob from the photo rows; returns how many files are in use."""
+    # read and rewrite in one write transaction, so no photo saved in
+    # between is counted from a stale read
+    with transaction.atomic():
+        counts = Counter()
+        for image, variants in ListingPhoto.objects.values_list("image", "variants").iterator():
+            counts.update([image] + variant_names(variants))
+        counts.pop("", None)
+        PhotoBlob.objects.all().delete()
+        PhotoBlob.objects.bulk_create(
+            (PhotoBlob(name=name, refs=refs) for name, refs in counts.items()),
+            batch_size=BATCH_SIZE,
+        )
+    return len(counts)
+
+
+def collect(grace=GRACE, now=None):
+    """
+    Delete the stored files no photo uses that haven't been written for
+    ``grace``, and their PhotoBlob rows. Returns how many files went.
+    """
+    storage = _storage()
+    cutoff = (now or timezone.now()) - grace
+    in_use = set(PhotoBlob.objects.filter(refs__gt=0).values_list("name", flat=True))
+    root = storage.path(storage.prefix)
+    removed = 0
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = posixpath.join(storage.prefix, os.path.relpath(path, root).replace(os.sep, "/"))
+            if name in in_use or not (storage.is_content_name(name) or filename.endswith(".part")):
+                continue
+            # saving a file that is already stored touches it
+            if os.path.getmtime(path) >= cutoff.timestamp():
+                continue
+            os.remove(path)
+            removed += 1
+    PhotoBlob.objects.filter(refs__lte=0, updated_at__lt=cutoff).delete()
+    return removed
+
+
+def _store(storage, name):
+    try:
+        with open(storage.path(name), "rb") as fh:
+            return storage.save(name, File(fh))
+    except FileNotFoundError:
+        return None
+
+
+def rehash(workers=None):
+    """
+    Copy every photo and variant file not yet stored by content into the
+    photo storage, point the photos at the new names, then delete the old
+    files. Returns (files moved, photos updated).
+    """
+    storage = _storage()
+    photos = list(ListingPhoto.objects.exclude(image="").only("listing", "image", "variants"))
+    names = sorted({
+        name for photo in photos for name in photo.stored_names()
+        if name and not storage.is_content_name(name)
+    })
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        # missing files (synthetic rows) map to None and stay as they are
+        moved = {old: new for old, new in zip(names, pool.map(lambda n: _store(storage, n), names)) if new}
+
+    with transaction.atomic():
+        # re-read the photos under the write lock: a variant build may have
+        # rewritten them while the files were hashed
+        changed = []
+        for photo in ListingPhoto.objects.exclude(image="").only("listing", "image", "variants"):
+            if not any(name in moved for name in photo.stored_names()):
+                continue
+            photo.image.name = moved.get(photo.image.name, photo.image.name)
+            sources = photo.variants.get("sources", {})
+            for fmt, widths in sources.items():
+                sources[fmt] = [[width, moved.get(name, name)] for width, name in widths]
+            if "source" in photo.variants:
+                photo.variants["source"] = photo.image.name
+            changed.append(photo)
+        ListingPhoto.objects.bulk_update(changed, ["image", "variants"], batch_size=BATCH_SIZE)
+    recount()
+
+    # pages and cards stop pointing at the old files before they go
+    cards.refresh({photo.listing_id for photo in changed})
+    caching.shared_changed()
+    for old in moved:
+        storage.delete(old)
+    return len(moved), len(changed)
@@ -0,0 +1,239 @@
+"""
+Filtering, sorting and keyset pagination for the public listings browse page.
+
+Pages are addressed by an opaque cursor holding the sort value and id of the
+last (or first) row of the previous page, so page 500 costs the same indexed
+range scan as page 1 instead of an ever-growing OFFSET.
+"""
+import base64
+import binascii
+import hashlib
+import json
+
+from django import forms
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .caching import alist_version, list_version
+from .models import HomeType, Listing, Neighborhood
+
+PAGE_SIZE = 24
+COUNT_CACHE_SECONDS = 300
+
+# sort name -> (label, model field used for the cursor, descending?)
+SORTS = {
+    "newest": ("Newest", "created_at", True),
+    "price_asc": ("Price: low to high", "price", False),
+    "price_desc": ("Price: high to low", "price", True),
+    "sqft": ("Largest first", "sqft_sort", True),
+}
+DEFAULT_SORT = "newest"
+KM_PER_MILE = 1.609344
+RADIUS_MILES = (1, 3, 5, 10, 25)
+DEFAULT_RADIUS_MILES = 5
+
+
+class ListingFilterForm(forms.Form):
+    min_price = forms.IntegerField(required=False, min_value=0)
+    max_price = forms.IntegerField(required=False, min_value=0)
+    beds = forms.IntegerField(required=False, min_value=0, label="Min beds")
+    baths = forms.DecimalField(
+        required=False, min_value=0, max_digits=3, decimal_places=1, label="Min baths"
+    )
+    home_type = forms.ModelChoiceField(
+        queryset=HomeType.objects.all(), required=False, empty_label="Any type"
+    )
+    neighborhood = forms.ModelChoiceField(
+        queryset=Neighborhood.objects.all(), required=False, empty_label="Any neighborhood"
+    )
+    zipcode = forms.CharField(required=False, max_length=10)
+    # "homes near me": the browser fills in lat/lng
+    lat = forms.FloatField(required=False, min_value=-90, max_value=90, widget=forms.HiddenInput)
+    lng = forms.FloatField(required=False, min_value=-180, max_value=180, widget=forms.HiddenInput)
+    radius = forms.TypedChoiceField(
+        choices=[("", "Any distance")] + [(miles, f"{miles} mi") for miles in RADIUS_MILES],
+        coerce=int,
+        empty_value=None,
+        required=False,
+        label="Within",
+    )
+    sort = forms.ChoiceField(
+        choices=[(key, label) for key, (label, _, _) in SORTS.items()],
+        required=False,
+    )
+
+    def filter_state(self):
+        """Cleaned, non-empty filter values as plain (hashable) data."""
+        if not self.is_valid():
+            return {}
+        state = {}
+        for name, value in self.cleaned_data.items():
+            if name == "sort" or value in (None, ""):
+                continue
+            state[name] = value.pk if hasattr(value, "pk") else value
+        return state
+
+    def sort_key(self):
+        if self.is_valid() and self.cleaned_data.get("sort"):
+            return self.cleaned_data["sort"]
+        return DEFAULT_SORT
+
+
+def apply_filters(queryset, state):
+    if "min_price" in state:
+        queryset = queryset.filter(price__gte=state["min_price"])
+    if "max_price" in state:
+        queryset = queryset.filter(price__lte=state["max_price"])
+    if "beds" in state:
+        queryset = queryset.filter(beds__gte=state["beds"])
+    if "baths" in state:
+        queryset = queryset.filter(baths__gte=state["baths"])
+    if "home_type" in state:
+        queryset = queryset.filter(home_type_id=state["home_type"])
+    if "neighborhood" in state:
+        queryset = queryset.filter(neighborhood_id=state["neighborhood"])
+    if "zipcode" in state:
+        queryset = queryset.filter(zipcode=state["zipcode"])
+    if "lat" in state and "lng" in state:
+        miles = state.get("radius", DEFAULT_RADIUS_MILES)
+        queryset = queryset.near(state["lat"], state["lng"], miles * KM_PER_MILE, public=True)
+    return queryset
+
+
+def state_digest(state):
+    return hashlib.sha1(
+        json.dumps(state, sort_keys=True, cls=DjangoJSONEncoder).encode()
+    ).hexdigest()
+
+
+def cached_count(queryset, state):
+    """
+    COUNT(*) for the filtered browse set, cached per filter state so paging
+    through results doesn't recount the whole table on every request.
+    """
+    key = f"listings:count:{list_version()}:{state_digest(state)}"
+    return cache.get_or_set(key, queryset.count, COUNT_CACHE_SECONDS)
+
+
+async def acached_count(queryset, state):
+    key = f"listings:count:{await alist_version()}:{state_digest(state)}"
+    count = await cache.aget(key)
+    if count is None:
+        count = await queryset.acount()
+        await cache.aset(key, count, COUNT_CACHE_SECONDS)
+    return count
+
+
+# ---------- cursors ---------- #
+
+def encode_cursor(value, pk):
+    # full isoformat: DjangoJSONEncoder drops microseconds, which would make
+    # rows created in the same millisecond skip or repeat across pages
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    raw = json.dumps([value, pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, field_name):
+    """Return (value, pk) or None for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        value = Listing._meta.get_field(field_name).to_python(value)
+        return value, int(pk)
+    except (binascii.Error, ValueError, TypeError, ValidationError):
+        return None
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+
+def keyset_queryset(queryset, sort=DEFAULT_SORT, cursor=None, backwards=False):
+    """
+    Order ``queryset`` by (sort field, pk) and, given a decoded cursor, keep
+    only the rows after it (or before it when walking ``backwards``).
+    Returns the queryset and the name of the field holding the sort key.
+    """
+    _, key, descending = SORTS.get(sort, SORTS[DEFAULT_SORT])
+
+    # walking backwards flips both the comparison and the ordering
+    reverse = descending != backwards
+    ordering = [f"-{key}", "-pk"] if reverse else [key, "pk"]
+    if cursor is not None:
+        value, pk = cursor
+        op = "lt" if reverse else "gt"
+        queryset = queryset.filter(
+            Q(**{f"{key}__{op}": value}) | Q(**{key: value, f"pk__{op}": pk})
+        )
+    return queryset.order_by(*ordering), key
+
+
+def _keyset_plan(queryset, sort, after, before):
+    field_name = SORTS.get(sort, SORTS[DEFAULT_SORT])[1]
+    cursor = decode_cursor(after, field_name)
+    backwards = False
+    if cursor is None:
+        cursor = decode_cursor(before, field_name)
+        backwards = cursor is not None
+    queryset, key = keyset_queryset(queryset, sort, cursor, backwards)
+    return queryset, key, cursor, backwards
+
+
+def _keyset_page(rows, key, cursor, backwards, page_size):
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return KeysetPage(rows)
+
+    def cursor_for(obj):
+        # model instances, or dicts from .values() that include key and "id"
+        if isinstance(obj, dict):
+            return encode_cursor(obj[key], obj["id"])
+        return encode_cursor(getattr(obj, key), obj.pk)
+
+    if backwards:
+        next_cursor = cursor_for(rows[-1])
+        prev_cursor = cursor_for(rows[0]) if has_more else None
+    else:
+        next_cursor = cursor_for(rows[-1]) if has_more else None
+        prev_cursor = cursor_for(rows[0]) if cursor is not None else None
+    return KeysetPage(rows, next_cursor, prev_cursor)
+
+
+def paginate(queryset, sort=DEFAULT_SORT, after=None, before=None, page_size=PAGE_SIZE):
+    """
+    Keyset-paginate ``queryset`` ordered by (sort field, id).
+
+    ``after`` / ``before`` are cursors taken from a previous page. The sort
+    field is compared together with the id, so ties on price or sqft still
+    page deterministically.
+    """
+    queryset, key, cursor, backwards = _keyset_plan(queryset, sort, after, before)
+    rows = list(queryset[: page_size + 1])
+    return _keyset_page(rows, key, cursor, backwards, page_size)
+
+
+async def apaginate(queryset, sort=DEFAULT_SORT, after=None, before=None, page_size=PAGE_SIZE):
+    """paginate() through the async ORM."""
+    queryset, key, cursor, backwards = _keyset_plan(queryset, sort, after, before)
+    rows = [row async for row in queryset[: page_size + 1]]
+    return _keyset_page(rows, key, cursor, backwards, page_size)
@@ -0,0 +1,209 @@
+"""
+Caching for the public pages.
+
+Whole responses are cached for anonymous visitors and individual listing cards
+are cached as template fragments. Nothing is deleted on invalidation; instead
+every key embeds a version counter that signals bump:
+
+* ``lists``   -- any listing added, edited, hidden or deleted: home and browse
+                 pages (and their cached counts) are rebuilt;
+* ``listing:<pk>`` -- that listing's detail page;
+* ``shared``  -- neighborhood, home type or price range rows changed: every
+                 page, since their names appear everywhere.
+
+Counters start at the current time in milliseconds, so a counter that the
+cache evicted comes back larger than before and can never revive old entries.
+Counters are bumped from the job worker and management commands as well as
+the web processes, so the cache has to be one they all share (the
+file-based backend by default); listings.checks refuses per-process ones.
+
+The ``a``-prefixed helpers are the same operations through the cache's async
+API, for the ASGI views; cache_public_page wraps sync and async views alike.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.core.cache import cache
+from django.utils import timezone
+
+PAGE_TIMEOUT = 60 * 10
+STATS_KEYS = ("hits", "misses")
+
+
+# ---------- version counters ---------- #
+
+def _version_key(name):
+    return f"listings:version:{name}"
+
+
+def version(name):
+    key = _version_key(name)
+    value = cache.get(key)
+    if value is None:
+        fresh = int(time.time() * 1000)
+        cache.add(key, fresh, None)
+        # a cache that stores nothing (DummyCache) gets a new version every time
+        value = cache.get(key, fresh)
+    return value
+
+
+def bump(name):
+    key = _version_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+async def aversion(name):
+    key = _version_key(name)
+    value = await cache.aget(key)
+    if value is None:
+        fresh = int(time.time() * 1000)
+        await cache.aadd(key, fresh, None)
+        value = await cache.aget(key, fresh)
+    return value
+
+
+def shared_version():
+    return version("shared")
+
+
+async def ashared_version():
+    return await aversion("shared")
+
+
+def list_version():
+    return f"{version('shared')}.{version('lists')}"
+
+
+def listing_version(pk):
+    return f"{version('shared')}.{version(f'listing:{pk}')}"
+
+
+async def alist_version():
+    return f"{await aversion('shared')}.{await aversion('lists')}"
+
+
+async def alisting_version(pk):
+    return f"{await aversion('shared')}.{await aversion(f'listing:{pk}')}"
+
+
+def listing_changed(pk):
+    bump("lists")
+    bump(f"listing:{pk}")
+
+
+def photos_changed(listing_id):
+    # card fragments are keyed on Listing.updated_at, so move it forward
+    from .models import Listing
+
+    Listing.objects.filter(pk=listing_id).update(updated_at=timezone.now())
+    listing_changed(listing_id)
+
+
+def shared_changed():
+    bump("shared")
+
+
+# ---------- hit / miss counters ---------- #
+
+def _record(stat):
+    key = f"listings:stats:{stat}"
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+async def _arecord(stat):
+    key = f"listings:stats:{stat}"
+    if not await cache.aadd(key, 1, None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, 1, None)
+
+
+def cache_stats():
+    stats = {name: cache.get(f"listings:stats:{name}", 0) for name in STATS_KEYS}
+    total = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / total if total else 0.0
+    return stats
+
+
+def reset_cache_stats():
+    cache.delete_many([f"listings:stats:{name}" for name in STATS_KEYS])
+
+
+# ---------- whole-page cache ---------- #
+
+def _page_key(request, scope):
+    path = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+    return f"listings:page:{scope}:{path}"
+
+
+def page_key(request, pk=None):
+    return _page_key(request, listing_version(pk) if pk is not None else list_version())
+
+
+async def apage_key(request, pk=None):
+    return _page_key(request, await alisting_version(pk) if pk is not None else await alist_version())
+
+
+def _cacheable(response):
+    return response.status_code == 200 and not response.streaming and not response.cookies
+
+
+def cache_public_page(view):
+    """
+    Cache a public view's response for anonymous GET requests. Detail views
+    (with a ``pk`` argument) are keyed on that listing's version, everything
+    else on the listing-set version.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or (await request.auser()).is_authenticated:
+                return await view(request, *args, **kwargs)
+
+            key = await apage_key(request, kwargs.get("pk"))
+            response = await cache.aget(key)
+            if response is not None:
+                await _arecord("hits")
+                response["X-Cache"] = "HIT"
+                return response
+
+            await _arecord("misses")
+            response = await view(request, *args, **kwargs)
+            if _cacheable(response):
+                await cache.aset(key, response, PAGE_TIMEOUT)
+            response["X-Cache"] = "MISS"
+            return response
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        key = page_key(request, kwargs.get("pk"))
+        response = cache.get(key)
+        if response is not None:
+            _record("hits")
+            response["X-Cache"] = "HIT"
+            return response
+
+        _record("misses")
+        response = view(request, *args, **kwargs)
+        if _cacheable(response):
+            cache.set(key, response, PAGE_TIMEOUT)
+        response["X-Cache"] = "MISS"
+        return response
+
+    return wrapper
@@ -0,0 +1,139 @@
+"""
+Upkeep of the ListingCard read model.
+
+The public grids read cards only, so a page is one indexed scan of one
+table with nothing left to format. Cards are rewritten from the source rows
+by refresh() whenever a listing or one of its photos changes (see
+listings.signals). Renaming a neighborhood or home type touches just the
+name column of the cards showing it. Bulk writes that skip signals (the
+feed importer, geocoding, synthetic data, variant builds) refresh the
+cards of the listings they wrote. rebuild_listing_cards rewrites the table.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Listing, ListingCard, Neighborhood
+
+BATCH_SIZE = 500
+MISSING = "—"
+
+# everything refresh() writes over an existing card
+CARD_FIELDS = [
+    "created_at", "price", "sqft_sort", "beds", "baths", "zipcode",
+    "neighborhood", "home_type", "is_featured", "latitude", "longitude", "geohash",
+    "street", "city", "state", "price_display", "meta_display",
+    "neighborhood_name", "home_type_name", "photo", "refreshed_at",
+]
+
+
+def format_price(price):
+    return f"${price:,}"
+
+
+def format_meta(beds, baths, sqft):
+    """'3 beds · 2.5 baths · 1,850 sqft', with a dash for anything missing."""
+    beds = f"{beds:.0f}" if beds is not None else MISSING
+    baths = f"{baths:.1f}" if baths is not None else MISSING
+    sqft = f"{sqft:,}" if sqft else MISSING
+    return f"{beds} beds · {baths} baths · {sqft} sqft"
+
+
+def build_card(listing, now=None):
+    """
+    An unsaved ListingCard for ``listing``; load it with
+    select_related("neighborhood", "home_type").with_cover_photo().
+    """
+    photo = listing.cover_photo
+    return ListingCard(
+        listing_id=listing.pk,
+        created_at=listing.created_at,
+        price=listing.price,
+        sqft_sort=listing.sqft or 0,
+        beds=listing.beds,
+        baths=listing.baths,
+        zipcode=listing.zipcode,
+        neighborhood_id=listing.neighborhood_id,
+        home_type_id=listing.home_type_id,
+        is_featured=listing.is_featured,
+        latitude=listing.latitude,
+        longitude=listing.longitude,
+        geohash=listing.geohash,
+        street=listing.street,
+        city=listing.city,
+        state=listing.state,
+        price_display=format_price(listing.price),
+        meta_display=format_meta(listing.beds, listing.baths, listing.sqft),
+        neighborhood_name=listing.neighborhood.name if listing.neighborhood else "",
+        home_type_name=listing.home_type.type_name if listing.home_type else "",
+        photo=photo.stored_picture() if photo else None,
+        refreshed_at=now or timezone.now(),
+    )
+
+
+def refresh(listing_ids):
+    """
+    Rewrite the cards of ``listing_ids``: public listings get an up-to-date
+    card, the rest (hidden, inactive or deleted) lose theirs.
+    """
+    ids = sorted(set(listing_ids))
+    now = timezone.now()
+    for start in range(0, len(ids), BATCH_SIZE):
+        chunk = ids[start:start + BATCH_SIZE]
+        cards = [
+            build_card(listing, now)
+            for listing in Listing.objects.public()
+            .filter(pk__in=chunk)
+            .select_related("neighborhood", "home_type")
+            .with_cover_photo()
+            .order_by()
+        ]
+        ListingCard.objects.bulk_create(
+            cards,
+            update_conflicts=True,
+            unique_fields=["listing"],
+            update_fields=CARD_FIELDS,
+        )
+        gone = set(chunk) - {card.listing_id for card in cards}
+        if gone:
+            ListingCard.objects.filter(listing_id__in=gone).delete()
+
+
+def rebuild():
+    """Rewrite every card from the listings; returns how many there are."""
+    with transaction.atomic():
+        ListingCard.objects.all().delete()
+        last = 0
+        while True:
+            ids = list(
+                Listing.objects.public()
+                .filter(pk__gt=last)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:BATCH_SIZE]
+            )
+            if not ids:
+                break
+            refresh(ids)
+            last = ids[-1]
+    return ListingCard.objects.count()
+
+
+def featured_changed(listing):
+    # Listing.save() demoted the previous featured listing with update()
+    if listing.is_featured:
+        ListingCard.objects.filter(is_featured=True).exclude(listing_id=listing.pk).update(
+            is_featured=False, refreshed_at=timezone.now()
+        )
+
+
+def lookup_changed(instance, deleted=False):
+    """
+    Copy a renamed neighborhood or home type onto the cards showing it, or
+    clear it from them once deleted (the listings' foreign keys were set to
+    NULL without signals).
+    """
+    field = "neighborhood" if isinstance(instance, Neighborhood) else "home_type"
+    cards = ListingCard.objects.filter(**{f"{field}_id": instance.pk})
+    if deleted:
+        cards.update(**{field: None, f"{field}_name": ""}, refreshed_at=timezone.now())
+    else:
+        cards.update(**{f"{field}_name": str(instance)}, refreshed_at=timezone.now())
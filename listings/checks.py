@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# backends whose entries only the process that wrote them can see
+PER_PROCESS_CACHES = ("django.core.cache.backends.locmem.LocMemCache",)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Page caches are invalidated by version counters that the job worker and
+    management commands bump, which a per-process cache never shows the
+    web servers. Fine for a single process (runserver, tests), so only a
+    warning.
+    """
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend not in PER_PROCESS_CACHES:
+        return []
+    return [
+        Warning(
+            f"The default cache ({backend}) is per process.",
+            hint=(
+                "Cache invalidations made by run_jobs and management commands will not "
+                "reach the web processes, so pages can stay stale until they expire. "
+                "Use a shared cache such as FileBasedCache when running more than one process."
+            ),
+            id="listings.W001",
+        )
+    ]
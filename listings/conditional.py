@@ -0,0 +1,88 @@
+"""
+ETag / Last-Modified support for the public pages.
+
+The validators come from one small aggregate query per request, run before
+the view (and before the page cache), so a revalidation that ends in a 304
+never touches the template engine.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .caching import list_version, listing_version
+from .models import Listing
+
+
+def _validators(request, pk=None):
+    # etag_func and last_modified_func both need these; query once per request
+    if not hasattr(request, "_listing_validators"):
+        if pk is None:
+            # the newest change to *any* listing, so hiding or featuring one
+            # also moves Last-Modified; served by listing_updated_idx
+            latest = Listing.objects.aggregate(latest=Max("updated_at"))["latest"]
+            tag = f"list:{list_version()}:{latest}"
+        else:
+            row = Listing.objects.filter(pk=pk, visibility="Y").aggregate(
+                latest=Max("updated_at"),
+                photo_id=Max("photos__id"),
+                photos=Count("photos"),
+            )
+            latest = row["latest"]
+            tag = f"detail:{pk}:{listing_version(pk)}:{latest}:{row['photo_id']}:{row['photos']}"
+        request._listing_validators = (hashlib.sha1(tag.encode()).hexdigest(), latest)
+    return request._listing_validators
+
+
+def list_stamp(request):
+    """The browse pages' ETag: moves with any listing change or version bump."""
+    return _validators(request)[0]
+
+
+def _etag(request, pk=None, **kwargs):
+    return _validators(request, pk)[0]
+
+
+def _last_modified(request, pk=None, **kwargs):
+    return _validators(request, pk)[1]
+
+
+def conditional_listing_response(**cache_control):
+    """
+    Answer If-None-Match / If-Modified-Since with 304 from the listing
+    validators, and add the given Cache-Control directives.
+    """
+    def decorator(view):
+        conditional_view = condition(etag_func=_etag, last_modified_func=_last_modified)(view)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # condition() calls the validator functions synchronously;
+                # run the query off the event loop first so they hit the memo
+                await sync_to_async(_validators)(request, kwargs.get("pk"))
+                response = await conditional_view(request, *args, **kwargs)
+                if response.status_code in (200, 304):
+                    patch_cache_control(response, **cache_control)
+                return response
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                patch_cache_control(response, **cache_control)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+# public pages: browsers revalidate instead of guessing a freshness time
+conditional_listing_page = conditional_listing_response(no_cache=True)
@@ -0,0 +1,139 @@
+"""
+Facet counts for the listings browse page.
+
+One grouped query returns a count per (neighborhood, home type, beds, price
+range) combination present in the filtered set; every facet is then summed
+from those cells in Python. The number of cells is bounded by the product of
+the facet cardinalities, not by the number of listings or facet values
+shown, and each facet ignores its own selection, so picking a neighborhood
+still lists the other neighborhoods with their counts. The price band is
+left out of the WHERE clause for the same reason: each cell carries its
+count with and without it.
+"""
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .browse import apply_filters, state_digest
+from .models import Listing
+from .pricing import price_range_index
+
+FACET_CACHE_SECONDS = 300
+
+# facets narrowed in Python from the grouped cells: state key -> cell column.
+# The other filters (baths, zipcode, distance) go into the SQL WHERE clause.
+FACET_FILTERS = {
+    "neighborhood": "neighborhood_id",
+    "home_type": "home_type_id",
+    "beds": "beds",
+}
+# the price band, counted with a conditional aggregate instead
+PRICE_FILTERS = ("min_price", "max_price")
+
+
+def _matches(cell, state, skip):
+    for name, column in FACET_FILTERS.items():
+        if name == skip or name not in state:
+            continue
+        value = cell[column]
+        if name == "beds":
+            if value is None or value < state["beds"]:
+                return False
+        elif value != state[name]:
+            return False
+    return True
+
+
+def _tally(cells, state, skip, key, count="n"):
+    counts = {}
+    for cell in cells:
+        if cell[key] is not None and cell[count] and _matches(cell, state, skip):
+            counts[cell[key]] = counts.get(cell[key], 0) + cell[count]
+    return counts
+
+
+def _price_q(state):
+    q = Q()
+    if "min_price" in state:
+        q &= Q(price__gte=state["min_price"])
+    if "max_price" in state:
+        q &= Q(price__lte=state["max_price"])
+    return q or None
+
+
+def compute_facets(state):
+    ranges = price_range_index().ranges
+    sql_state = {
+        k: v for k, v in state.items() if k not in FACET_FILTERS and k not in PRICE_FILTERS
+    }
+    cells = list(
+        apply_filters(Listing.objects.public(), sql_state)
+        .order_by()
+        .values(
+            "neighborhood_id",
+            "neighborhood__name",
+            "home_type_id",
+            "home_type__type_name",
+            "beds",
+            "price_range_id",
+        )
+        # n: within the price band, for every facet but price; any_price: all
+        .annotate(n=Count("id", filter=_price_q(state)), any_price=Count("id"))
+    )
+
+    labels = {}
+    for cell in cells:
+        labels[("neighborhood", cell["neighborhood_id"])] = cell["neighborhood__name"]
+        labels[("home_type", cell["home_type_id"])] = cell["home_type__type_name"]
+
+    facets = {}
+    for name in ("neighborhood", "home_type"):
+        counts = _tally(cells, state, name, FACET_FILTERS[name])
+        facets[name] = sorted(
+            (
+                {
+                    "value": value,
+                    "label": labels[(name, value)],
+                    "count": count,
+                    "selected": state.get(name) == value,
+                }
+                for value, count in counts.items()
+            ),
+            key=lambda item: item["label"],
+        )
+
+    # "N+ beds": the min-beds filter, so each option counts homes with >= N
+    exact = _tally(cells, state, "beds", "beds")
+    facets["beds"] = [
+        {
+            "value": int(beds),
+            "label": f"{int(beds)}+",
+            "count": sum(n for other, n in exact.items() if other >= beds),
+            "selected": state.get("beds") == int(beds),
+        }
+        for beds in sorted(exact)
+        if beds > 0
+    ]
+
+    bands = _tally(cells, state, None, "price_range_id", count="any_price")
+    facets["price"] = [
+        {
+            "value": pk,
+            "label": label,
+            "count": bands[pk],
+            "min_price": low,
+            "max_price": high,
+            "selected": state.get("min_price") == low and state.get("max_price") == high,
+        }
+        for pk, low, high, label in ranges
+        if pk in bands
+    ]
+    return facets
+
+
+def facet_counts(state, stamp):
+    """
+    Facets for a filter state, cached under ``stamp`` -- the browse pages'
+    validator, which changes with the newest updated_at and list version.
+    """
+    key = f"listings:facets:{stamp}:{state_digest(state)}"
+    return cache.get_or_set(key, lambda: compute_facets(state), FACET_CACHE_SECONDS)
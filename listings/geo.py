@@ -0,0 +1,200 @@
+"""
+Geohash helpers for the distance and map queries.
+
+Every located listing stores the geohash of its coordinates. A geohash cell
+is a prefix, so all listings inside a cell sit in one contiguous range of
+the geohash index. A bounding box is covered by a handful of cells (merged
+into ranges where they are adjacent in geohash order), which narrows the
+candidates with indexed range scans before the exact latitude/longitude and
+haversine filters run on what is left.
+"""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION = 9  # about 5m x 5m
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+# cells used to cover a bounding box before they're merged into ranges
+MAX_COVER_CELLS = 16
+# target marker cluster size on screen, in pixels of a 256px-tile map
+CLUSTER_PIXELS = 64
+MAX_ZOOM = 20
+
+
+def _bits(precision):
+    """(longitude bits, latitude bits) in a geohash of ``precision`` characters."""
+    total = 5 * precision
+    return (total + 1) // 2, total // 2
+
+
+def cell_size(precision):
+    """(degrees of latitude, degrees of longitude) spanned by one cell."""
+    lng_bits, lat_bits = _bits(precision)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def _index(value, low, span, bits):
+    cells = 1 << bits
+    return min(cells - 1, max(0, int((value - low) / span * cells)))
+
+
+def _interleave(lng_index, lat_index, precision):
+    lng_bits, lat_bits = _bits(precision)
+    number = 0
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            lng_bits -= 1
+            number = (number << 1) | ((lng_index >> lng_bits) & 1)
+        else:
+            lat_bits -= 1
+            number = (number << 1) | ((lat_index >> lat_bits) & 1)
+    return number
+
+
+def _to_string(number, precision):
+    chars = []
+    for _ in range(precision):
+        chars.append(BASE32[number & 31])
+        number >>= 5
+    return "".join(reversed(chars))
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    lng_bits, lat_bits = _bits(precision)
+    return _to_string(
+        _interleave(
+            _index(longitude, -180.0, 360.0, lng_bits),
+            _index(latitude, -90.0, 180.0, lat_bits),
+            precision,
+        ),
+        precision,
+    )
+
+
+def bounds(geohash):
+    """(south, west, north, east) of a geohash cell."""
+    number = 0
+    for char in geohash:
+        number = (number << 5) | BASE32.index(char)
+    lng_index = lat_index = 0
+    for bit in range(5 * len(geohash)):
+        value = (number >> (5 * len(geohash) - 1 - bit)) & 1
+        if bit % 2 == 0:
+            lng_index = (lng_index << 1) | value
+        else:
+            lat_index = (lat_index << 1) | value
+    height, width = cell_size(len(geohash))
+    south, west = -90.0 + lat_index * height, -180.0 + lng_index * width
+    return south, west, south + height, west + width
+
+
+def decode(geohash):
+    """Center (latitude, longitude) of a geohash cell."""
+    south, west, north, east = bounds(geohash)
+    return (south + north) / 2, (west + east) / 2
+
+
+# ---------- covering a bounding box ---------- #
+
+def _cells(south, west, north, east, precision):
+    lng_bits, lat_bits = _bits(precision)
+    lng_range = range(_index(west, -180.0, 360.0, lng_bits), _index(east, -180.0, 360.0, lng_bits) + 1)
+    lat_range = range(_index(south, -90.0, 180.0, lat_bits), _index(north, -90.0, 180.0, lat_bits) + 1)
+    return lng_range, lat_range
+
+
+def cover_precision(south, west, north, east, max_cells=MAX_COVER_CELLS):
+    """The finest precision whose cells cover the box in at most ``max_cells`` cells."""
+    best = 1
+    for precision in range(1, PRECISION + 1):
+        lng_range, lat_range = _cells(south, west, north, east, precision)
+        if len(lng_range) * len(lat_range) > max_cells:
+            break
+        best = precision
+    return best
+
+
+def cover(south, west, north, east, max_cells=MAX_COVER_CELLS):
+    """
+    Geohash ranges [(low, high), ...] whose union contains the box; ``high``
+    is exclusive and None for the end of the keyspace.
+    """
+    precision = cover_precision(south, west, north, east, max_cells)
+    lng_range, lat_range = _cells(south, west, north, east, precision)
+    numbers = sorted(
+        _interleave(lng_index, lat_index, precision) for lng_index in lng_range for lat_index in lat_range
+    )
+    ranges = []
+    for number in numbers:
+        if ranges and ranges[-1][1] == number:
+            ranges[-1][1] = number + 1
+        else:
+            ranges.append([number, number + 1])
+    end = 1 << (5 * precision)
+    return [
+        (_to_string(low, precision), _to_string(high, precision) if high < end else None)
+        for low, high in ranges
+    ]
+
+
+def cover_q(ranges, field="geohash", condition=None):
+    """
+    OR of the ranges. A partial index's ``condition`` has to be repeated in
+    every term for SQLite to search each range through that index.
+    """
+    q = Q()
+    for low, high in ranges:
+        term = Q(**{f"{field}__gte": low})
+        if high is not None:
+            term &= Q(**{f"{field}__lt": high})
+        if condition is not None:
+            term &= condition
+        q |= term
+    return q
+
+
+def box_around(latitude, longitude, km):
+    """(south, west, north, east) of the box containing a circle of ``km``."""
+    dlat = km / KM_PER_DEGREE
+    dlng = km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return (
+        max(-90.0, latitude - dlat),
+        max(-180.0, longitude - dlng),
+        min(90.0, latitude + dlat),
+        min(180.0, longitude + dlng),
+    )
+
+
+def distance_km(latitude, longitude, lat_field="latitude", lng_field="longitude"):
+    """Haversine distance from a point to each row, as a query expression."""
+    lat1 = Radians(Value(latitude, output_field=FloatField()))
+    lat2 = Radians(F(lat_field))
+    dlat = Radians(F(lat_field) - Value(latitude, output_field=FloatField()))
+    dlng = Radians(F(lng_field) - Value(longitude, output_field=FloatField()))
+    a = Power(Sin(dlat / 2), 2) + Cos(lat1) * Cos(lat2) * Power(Sin(dlng / 2), 2)
+    return ASin(Sqrt(a)) * (2 * EARTH_RADIUS_KM)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+# ---------- map clustering ---------- #
+
+def cluster_precision(zoom):
+    """
+    Geohash precision whose cells are about CLUSTER_PIXELS wide at ``zoom``
+    (web-mercator zoom levels, 256px tiles).
+    """
+    target = 360.0 / (256 * (1 << zoom)) * CLUSTER_PIXELS
+    best = 1
+    for precision in range(1, PRECISION + 1):
+        if cell_size(precision)[1] < target:
+            break
+        best = precision
+    return best
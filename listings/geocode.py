@@ -0,0 +1,89 @@
+"""
+Offline geocoding from the ZIP centroid table.
+
+Listings get the center of their ZIP code area, which is enough for "homes
+near me" and map clusters; agents can overwrite the coordinates in the
+dashboard with the exact point. The table ships as data/zip_centroids.csv
+and can be replaced with a fuller file through geocode_listings --centroids.
+"""
+import csv
+import os
+
+from django.db import transaction
+
+from . import caching, cards, geo
+
+CENTROIDS_CSV = os.path.join(os.path.dirname(__file__), "data", "zip_centroids.csv")
+
+
+def read_centroids(path=CENTROIDS_CSV):
+    """(zipcode, city, latitude, longitude) rows from a centroid CSV."""
+    with open(path, newline="", encoding="utf-8-sig") as fh:
+        for row in csv.DictReader(fh):
+            yield (
+                row["zipcode"].strip()[:5],
+                (row.get("city") or "").strip(),
+                float(row["latitude"]),
+                float(row["longitude"]),
+            )
+
+
+def load_centroids(path=CENTROIDS_CSV):
+    """Create or update ZipCentroid rows from a CSV; returns how many were read."""
+    from .models import ZipCentroid
+
+    rows = [
+        ZipCentroid(zipcode=zipcode, city=city, latitude=latitude, longitude=longitude)
+        for zipcode, city, latitude, longitude in read_centroids(path)
+    ]
+    ZipCentroid.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["zipcode"],
+        update_fields=["city", "latitude", "longitude"],
+    )
+    return len(rows)
+
+
+def geocode(queryset, batch_size=1000):
+    """
+    Fill coordinates from ZIP centroids and refresh the geohash for every
+    listing in ``queryset``. Returns (updated, {zipcode: listings not found}).
+    """
+    from .models import Listing, ZipCentroid
+
+    centroids = {
+        zipcode: (latitude, longitude)
+        for zipcode, latitude, longitude in ZipCentroid.objects.values_list("zipcode", "latitude", "longitude")
+    }
+    missing = {}
+    updated = 0
+    last = 0
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last)
+            .order_by("pk")
+            .values_list("pk", "zipcode", "latitude", "longitude", "geohash")[:batch_size]
+        )
+        if not rows:
+            break
+        last = rows[-1][0]
+        changes = []
+        for pk, zipcode, latitude, longitude, old_hash in rows:
+            located = latitude is not None and longitude is not None
+            if not located:
+                latitude, longitude = centroids.get((zipcode or "")[:5], (None, None))
+                if latitude is None:
+                    missing[zipcode] = missing.get(zipcode, 0) + 1
+                    continue
+            geohash = geo.encode(latitude, longitude)
+            if not located or geohash != old_hash:
+                changes.append(Listing(pk=pk, latitude=latitude, longitude=longitude, geohash=geohash))
+        with transaction.atomic():
+            Listing.objects.bulk_update(changes, ["latitude", "longitude", "geohash"])
+            cards.refresh(listing.pk for listing in changes)
+        updated += len(changes)
+    if updated:
+        # bulk_update sent no signals
+        caching.shared_changed()
+    return updated, missing
@@ -0,0 +1,215 @@
+"""
+Queries over the ListingEvent log, and its monthly compaction.
+
+Every event holds the listing's status, price and visibility after the
+change, so a listing's state at a moment is its latest event at or before
+it. Replaying the whole log for that gets slower every year, so compact()
+writes a ListingMonthSnapshot of the listings on the market at the start of
+each month: an as-of query starts from the latest snapshot and replays only
+the events since, which is at most about a month of them once compaction
+runs regularly. Without snapshots the queries still work, from the start
+of the log.
+
+The event window is read as ``status IN (every status) AND at`` range so it
+stays on listingevent_status_idx; one listing's history reads
+listingevent_listing_idx and price cuts the partial listingevent_price_idx.
+
+``compact_listing_events --keep-months N`` also drops events and snapshots
+older than N months. Inventory before that cutoff is then gone, and days on
+market and price cuts only count what is left of the log.
+"""
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.db.models import F, Max, Min
+from django.utils import timezone
+
+from .models import Listing, ListingEvent, ListingMonthSnapshot
+
+ON_MARKET = ("active", "pending")
+STATUSES = tuple(status for status, _ in Listing.STATUS_CHOICES)
+BATCH_SIZE = 1000
+
+# the latest state of every listing in a window: the checkpoint snapshot
+# (seq 0) and the events after it (seq 1), newest first per listing
+LATEST_SQL = """
+WITH timeline AS (
+    {snapshot}
+    SELECT listing_id, 1 AS seq, at, id, kind, status, visibility, price
+    FROM listings_listingevent
+    WHERE status IN ({statuses}) {window}
+),
+latest AS (
+    SELECT *, ROW_NUMBER() OVER (
+        PARTITION BY listing_id ORDER BY seq DESC, at DESC, id DESC
+    ) AS rn
+    FROM timeline
+)
+SELECT {columns}
+FROM latest
+WHERE rn = 1 AND kind != 'deleted' AND visibility = 'Y' AND status IN ({on_market})
+{group}
+"""
+
+SNAPSHOT_SQL = """
+    SELECT listing_id, 0 AS seq, NULL AS at, 0 AS id, 'snapshot' AS kind, status, 'Y' AS visibility, price
+    FROM listings_listingmonthsnapshot
+    WHERE month = %s
+    UNION ALL
+"""
+
+
+def month_start(when):
+    """Midnight on the first of ``when``'s month, in the current time zone."""
+    when = timezone.localtime(when)
+    return when.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(start):
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def previous_month(start):
+    if start.month == 1:
+        return start.replace(year=start.year - 1, month=12)
+    return start.replace(month=start.month - 1)
+
+
+def _month_datetime(month):
+    return timezone.make_aware(datetime(month.year, month.month, 1))
+
+
+def _on_market(when, columns, group="", inclusive=True):
+    """
+    Run LATEST_SQL for the listings on the market at ``when`` (or just
+    before it unless ``inclusive``), from the latest snapshot at or before it.
+    """
+    adapt = connection.ops.adapt_datetimefield_value
+    checkpoint = ListingMonthSnapshot.objects.filter(
+        month__lte=timezone.localtime(when).date()
+    ).aggregate(month=Max("month"))["month"]
+    snapshot, params = "", []
+    if checkpoint is not None:
+        snapshot = SNAPSHOT_SQL
+        params.append(checkpoint)
+    params.extend(STATUSES)
+    window = f"AND at {'<=' if inclusive else '<'} %s"
+    if checkpoint is not None:
+        window = "AND at >= %s " + window
+        params.append(adapt(_month_datetime(checkpoint)))
+    params.append(adapt(when))
+    params.extend(ON_MARKET)
+    sql = LATEST_SQL.format(
+        snapshot=snapshot,
+        statuses=", ".join(["%s"] * len(STATUSES)),
+        window=window,
+        columns=columns,
+        on_market=", ".join(["%s"] * len(ON_MARKET)),
+        group=group,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def state_as_of(when):
+    """{listing id: (status, price)} for every listing on the market at ``when``."""
+    return {
+        listing_id: (status, price)
+        for listing_id, status, price in _on_market(when, "listing_id, status, price")
+    }
+
+
+def inventory_as_of(when):
+    """How many listings were active and pending at ``when``."""
+    counts = dict.fromkeys(ON_MARKET, 0)
+    counts.update(_on_market(when, "status, COUNT(*)", group="GROUP BY status"))
+    return counts
+
+
+def days_on_market(listing, until=None):
+    """
+    Days ``listing`` (or its id) spent active and visible up to ``until``
+    (default now), summed over every stretch, so relisting resumes the count.
+    """
+    listing_id = getattr(listing, "pk", listing)
+    until = until or timezone.now()
+    events = ListingEvent.objects.filter(listing_id=listing_id, at__lte=until).order_by("at", "id")
+    total, since = 0.0, None
+    for at, kind, status, visibility in events.values_list("at", "kind", "status", "visibility"):
+        listed = kind != "deleted" and status == "active" and visibility == "Y"
+        if listed and since is None:
+            since = at
+        elif not listed and since is not None:
+            total += (at - since).total_seconds()
+            since = None
+    if since is not None:
+        total += (until - since).total_seconds()
+    return total / 86400
+
+
+def price_cuts(since=None, until=None, listing=None):
+    """Price reductions, newest first, optionally in a period or for one listing."""
+    events = ListingEvent.objects.filter(kind="price", price__lt=F("old_price"))
+    if listing is not None:
+        events = events.filter(listing_id=getattr(listing, "pk", listing))
+    if since is not None:
+        events = events.filter(at__gte=since)
+    if until is not None:
+        events = events.filter(at__lt=until)
+    return events.order_by("-at", "-id")
+
+
+# ---------- compaction ---------- #
+
+def compact(now=None):
+    """
+    Write the month snapshots missing up to the current month, each from the
+    one before it and that month's events. Returns how many rows were
+    written; a month with nothing on the market has none, and is simply
+    recomputed by the next run.
+    """
+    now = now or timezone.now()
+    latest = ListingMonthSnapshot.objects.aggregate(month=Max("month"))["month"]
+    if latest is not None:
+        month = next_month(_month_datetime(latest))
+    else:
+        first = ListingEvent.objects.aggregate(at=Min("at"))["at"]
+        if first is None:
+            return 0
+        month = next_month(month_start(first))
+    written = 0
+    while month <= now:
+        with transaction.atomic():
+            written += len(ListingMonthSnapshot.objects.bulk_create(
+                (
+                    ListingMonthSnapshot(month=month.date(), listing_id=listing_id, status=status, price=price)
+                    for listing_id, status, price in _on_market(
+                        month, "listing_id, status, price", inclusive=False
+                    )
+                ),
+                batch_size=BATCH_SIZE,
+            ))
+        month = next_month(month)
+    return written
+
+
+def prune(keep_months, now=None):
+    """
+    Drop events and snapshots from before the start of the month
+    ``keep_months`` back. The missing snapshots are written first, so that
+    month's snapshot carries the state forward. Returns how many events
+    were deleted.
+    """
+    now = now or timezone.now()
+    cutoff = month_start(now)
+    for _ in range(keep_months):
+        cutoff = previous_month(cutoff)
+    with transaction.atomic():
+        # as-of queries from the cutoff on start at its snapshot
+        compact(now)
+        deleted, _ = ListingEvent.objects.filter(status__in=STATUSES, at__lt=cutoff).delete()
+        ListingMonthSnapshot.objects.filter(month__lt=cutoff.date()).delete()
+    return deleted
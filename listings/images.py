@@ -0,0 +1,121 @@
+"""
+Resized copies ("variants") of listing photos.
+
+Originals uploaded through the admin are full-resolution PNGs of a megabyte or
+more. For every photo we write a handful of widths in modern formats plus a
+JPEG fallback and record them on ``ListingPhoto.variants``, which the
+``responsive_image`` template tag turns into a srcset.
+
+This module deliberately doesn't import any models so ``build_variants`` can
+run inside a process pool.
+"""
+import hashlib
+import io
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (320, 640, 1280, 1920)
+
+# format name -> (Pillow format, save options, content type)
+FORMATS = {
+    "avif": ("AVIF", {"quality": 55, "speed": 8}, "image/avif"),
+    "webp": ("WEBP", {"quality": 80, "method": 4}, "image/webp"),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}, "image/jpeg"),
+}
+FALLBACK_FORMAT = "jpeg"
+
+
+def photo_storage():
+    """The storage photos live in; a callable so migrations don't record the backend."""
+    return storages["photos"]
+
+
+def variant_formats():
+    """Formats to generate, best first. JPEG is always last as the fallback."""
+    wanted = getattr(settings, "PHOTO_VARIANT_FORMATS", ("avif", "webp", "jpeg"))
+    formats = [
+        name for name in wanted
+        if name != FALLBACK_FORMAT and features.check(FORMATS[name][0].lower())
+    ]
+    return formats + [FALLBACK_FORMAT]
+
+
+def variant_widths(original_width):
+    widths = [w for w in VARIANT_WIDTHS if w < original_width]
+    # always include the original size (capped) so small uploads still get one
+    widths.append(min(original_width, VARIANT_WIDTHS[-1]))
+    return sorted(set(widths))
+
+
+def _flatten(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def build_variants(name, storage=None):
+    """
+    Write every width/format of the image stored at ``name`` and return the
+    description saved on ``ListingPhoto.variants``::
+
+        {"source": "listing_photos/1/1.png", "width": 1174, "height": 692,
+         "hash": "3f1c...",
+         "sources": {"webp": [[320, "listing_photos/1/variants/..."], ...], ...}}
+
+    File names include a digest of the original, so they can be served with
+    long-lived immutable cache headers; the content-addressed photo storage
+    renames them to their own SHA-256, which is recorded instead.
+    """
+    storage = storage or photo_storage()
+    with storage.open(name, "rb") as fh:
+        data = fh.read()
+    digest = hashlib.sha256(data).hexdigest()[:12]
+
+    with Image.open(ContentFile(data)) as source:
+        image = _flatten(source)
+    width, height = image.size
+
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    sources = {fmt: [] for fmt in variant_formats()}
+
+    for w in variant_widths(width):
+        resized = image if w == width else image.resize(
+            (w, round(height * w / width)), Image.Resampling.LANCZOS
+        )
+        for fmt in sources:
+            pil_format, options, _ = FORMATS[fmt]
+            target = posixpath.join(directory, "variants", f"{stem}.{digest}.{w}.{fmt}")
+            if not storage.exists(target):
+                buffer = io.BytesIO()
+                resized.save(buffer, pil_format, **options)
+                target = storage.save(target, ContentFile(buffer.getvalue()))
+            sources[fmt].append([w, target])
+
+    return {
+        "source": name,
+        "width": width,
+        "height": height,
+        "hash": digest,
+        "sources": sources,
+    }
+
+
+def safe_build_variants(name, storage=None):
+    """build_variants() that logs and returns {} for missing or unreadable files."""
+    try:
+        return build_variants(name, storage)
+    except (OSError, Image.DecompressionBombError) as exc:
+        logger.warning("Could not build variants for %s: %s", name, exc)
+        return {}
@@ -0,0 +1,334 @@
+"""
+Bulk import of MLS-style listing feeds.
+
+Rows are read lazily from CSV or JSON (a top-level array or JSON Lines) and
+upserted in batches keyed on ``Listing.mls_id`` with
+``bulk_create(update_conflicts=True)``, so re-running a feed updates the same
+rows instead of duplicating them. Neighborhood and home-type names resolve
+through an in-memory cache, photos are copied from a local directory on a
+thread pool, and the new photos are queued for variant processing.
+
+bulk_create() skips Listing.save() and signals: price_range is filled in
+from the interval index and missing coordinates from the ZIP centroids here,
+the listing cards are refreshed, ListingEvent rows written and photo files
+counted per batch, and the page caches are invalidated and a market stats
+refresh queued once at the end.
+"""
+import csv
+import json
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from jobs.queue import enqueue
+
+from . import caching, cards, geo, stats
+from .models import (
+    HomeType, Listing, ListingEvent, ListingPhoto, Neighborhood, PhotoBlob, ZipCentroid,
+)
+from .pricing import price_range_index
+
+# feed columns copied onto Listing (mls_id is the upsert key)
+UPDATE_FIELDS = (
+    "status",
+    "visibility",
+    "description",
+    "street",
+    "city",
+    "state",
+    "zipcode",
+    "sqft",
+    "beds",
+    "baths",
+    "price",
+    "year_built",
+    "garage_spaces",
+    "lot_size_sqft",
+    "hoa_fee",
+    "neighborhood",
+    "home_type",
+    "price_range",
+    "latitude",
+    "longitude",
+    "geohash",
+    "updated_at",
+    "status_changed_at",
+)
+# columns a feed may leave out: an existing listing keeps its value and a
+# new one gets the model default (status and visibility also when blank)
+OPTIONAL_FIELDS = (
+    "status", "visibility", "description", "sqft", "beds", "baths", "year_built",
+    "garage_spaces", "lot_size_sqft", "hoa_fee", "neighborhood", "home_type",
+)
+INTEGER_FIELDS = ("sqft", "price", "year_built", "garage_spaces", "lot_size_sqft")
+DECIMAL_FIELDS = ("beds", "baths", "hoa_fee")
+FLOAT_FIELDS = ("latitude", "longitude")
+TEXT_FIELDS = ("status", "visibility", "description", "street", "city", "state", "zipcode")
+JSON_BLOCK = 64 * 1024
+
+
+class RowError(ValueError):
+    pass
+
+
+# ---------- readers ---------- #
+
+def read_csv(fh):
+    yield from csv.DictReader(fh)
+
+
+def read_json(fh):
+    """Objects from a JSON array or JSON Lines, without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = fh.read(JSON_BLOCK).lstrip()
+    if buffer.startswith("["):
+        buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            block = fh.read(JSON_BLOCK)
+            if not block:
+                if buffer.strip():
+                    raise
+                return
+            buffer += block
+            continue
+        yield obj
+        buffer = buffer[end:]
+
+
+def read_feed(path, fmt=None):
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "json")
+    with open(path, newline="", encoding="utf-8-sig") as fh:
+        yield from (read_csv(fh) if fmt == "csv" else read_json(fh))
+
+
+# ---------- row conversion ---------- #
+
+class NameCache:
+    """name -> pk for a lookup model, loaded once and filled in as rows need."""
+
+    def __init__(self, model, field):
+        self.model = model
+        self.field = field
+        self.ids = {name.casefold(): pk for pk, name in model.objects.values_list("pk", field)}
+
+    def get(self, name):
+        name = (name or "").strip()
+        if not name:
+            return None
+        key = name.casefold()
+        if key not in self.ids:
+            obj, _ = self.model.objects.get_or_create(
+                **{f"{self.field}__iexact": name}, defaults={self.field: name}
+            )
+            self.ids[key] = obj.pk
+        return self.ids[key]
+
+
+def photo_names(value):
+    """A list of file names, or one string of names separated by ";" or "|"."""
+    if isinstance(value, str):
+        value = value.replace("|", ";").split(";")
+    return [str(name).strip() for name in value or () if str(name).strip()]
+
+
+def _number(value, convert):
+    if value in (None, ""):
+        return None
+    try:
+        return convert(str(value).replace(",", "").replace("$", "").strip())
+    except (ValueError, InvalidOperation):
+        raise RowError(f"not a number: {value!r}")
+
+
+class Importer:
+    def __init__(self, photo_dir=None, batch_size=500, workers=8):
+        self.photo_dir = photo_dir
+        self.batch_size = batch_size
+        self.workers = workers
+        self.neighborhoods = NameCache(Neighborhood, "name")
+        self.home_types = NameCache(HomeType, "type_name")
+        self.price_ranges = price_range_index()
+        self.centroids = {
+            zipcode: (latitude, longitude)
+            for zipcode, latitude, longitude in ZipCentroid.objects.values_list("zipcode", "latitude", "longitude")
+        }
+        self.stats = {"rows": 0, "created": 0, "updated": 0, "skipped": 0, "photos": 0}
+        self.errors = []
+
+    def listing_from_row(self, row):
+        mls_id = str(row.get("mls_id") or "").strip()
+        if not mls_id:
+            raise RowError("missing mls_id")
+        data = {"mls_id": mls_id}
+        for name in TEXT_FIELDS:
+            if row.get(name) not in (None, ""):
+                data[name] = str(row[name]).strip()
+        for name in INTEGER_FIELDS:
+            data[name] = _number(row.get(name), lambda v: int(Decimal(v)))
+        for name in DECIMAL_FIELDS:
+            data[name] = _number(row.get(name), Decimal)
+        for name in FLOAT_FIELDS:
+            data[name] = _number(row.get(name), float)
+        if data["latitude"] is not None and not -90 <= data["latitude"] <= 90:
+            raise RowError(f"latitude out of range: {data['latitude']}")
+        if data["longitude"] is not None and not -180 <= data["longitude"] <= 180:
+            raise RowError(f"longitude out of range: {data['longitude']}")
+        for name in ("street", "city", "state", "zipcode", "price"):
+            if data.get(name) in (None, ""):
+                raise RowError(f"missing {name}")
+        for name in ("status", "visibility"):
+            choices = dict(Listing._meta.get_field(name).choices)
+            if name in data and data[name] not in choices:
+                raise RowError(f"unknown {name}: {data[name]!r}")
+        listing = Listing(**data)
+        listing.missing = [
+            name for name in OPTIONAL_FIELDS
+            if row.get(name) is None or (name in ("status", "visibility") and name not in data)
+        ]
+        listing.neighborhood_id = self.neighborhoods.get(row.get("neighborhood"))
+        listing.home_type_id = self.home_types.get(row.get("home_type"))
+        listing.price_range_id = self.price_ranges.lookup(listing.price)
+        if listing.latitude is None or listing.longitude is None:
+            listing.latitude, listing.longitude = self.centroids.get(listing.zipcode[:5], (None, None))
+        if listing.latitude is not None and listing.longitude is not None:
+            listing.geohash = geo.encode(listing.latitude, listing.longitude)
+        return listing
+
+    # ---------- batches ---------- #
+
+    def run(self, rows):
+        batch = []
+        for number, row in enumerate(rows, start=1):
+            self.stats["rows"] += 1
+            try:
+                batch.append((self.listing_from_row(row), photo_names(row.get("photos"))))
+            except RowError as exc:
+                self.stats["skipped"] += 1
+                self.errors.append((number, str(exc)))
+                continue
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = []
+        if batch:
+            self.write_batch(batch)
+        # bulk_create() sent no signals
+        caching.shared_changed()
+        stats.queue_refresh()
+        return self.stats
+
+    def write_batch(self, batch):
+        # the last row wins when a feed repeats an mls_id within one batch
+        by_id = {listing.mls_id: (listing, photos) for listing, photos in batch}
+        listings = [listing for listing, _ in by_id.values()]
+        mls_ids = list(by_id)
+        with transaction.atomic():
+            existing = {
+                row["mls_id"]: row
+                for row in Listing.objects.filter(mls_id__in=mls_ids).values(
+                    "mls_id", "price", "status_changed_at", *OPTIONAL_FIELDS
+                )
+            }
+            now = timezone.now()
+            for listing in listings:
+                before = existing.get(listing.mls_id)
+                if before is None:
+                    continue
+                for name in listing.missing:
+                    setattr(listing, Listing._meta.get_field(name).attname, before[name])
+                # as Listing.save() does; days on market end here
+                changed = before["status"] != listing.status
+                listing.status_changed_at = now if changed else before["status_changed_at"]
+            Listing.objects.bulk_create(
+                listings,
+                update_conflicts=True,
+                unique_fields=["mls_id"],
+                update_fields=UPDATE_FIELDS,
+            )
+            pks = dict(Listing.objects.filter(mls_id__in=mls_ids).values_list("mls_id", "pk"))
+            events = []
+            for listing in listings:
+                listing.pk = pks[listing.mls_id]
+                events.extend(ListingEvent.changes(listing, existing.get(listing.mls_id)))
+            ListingEvent.objects.bulk_create(events)
+            if self.photo_dir:
+                self.import_photos(
+                    [(pks[mls_id], photos) for mls_id, (_, photos) in by_id.items() if photos]
+                )
+            cards.refresh(pks.values())
+        self.stats["created"] += len(mls_ids) - len(existing)
+        self.stats["updated"] += len(existing)
+
+    # ---------- photos ---------- #
+
+    def import_photos(self, wanted):
+        have = {}
+        for listing_id, name, sort_order in ListingPhoto.objects.filter(
+            listing_id__in=[listing_id for listing_id, _ in wanted]
+        ).values_list("listing_id", "image", "sort_order"):
+            have.setdefault(listing_id, {})[name] = sort_order
+
+        # names come from the feed: only read files inside the photo directory
+        root = os.path.realpath(self.photo_dir)
+        copies = []
+        for listing_id, names in wanted:
+            have.setdefault(listing_id, {})
+            for filename in names:
+                source = os.path.realpath(os.path.join(root, filename))
+                if os.path.commonpath([root, source]) != root:
+                    self.errors.append((None, f"photo outside the photo directory: {filename}"))
+                    continue
+                photo = ListingPhoto(listing_id=listing_id)
+                photo.mime_type = mimetypes.guess_type(filename)[0] or ""
+                copies.append((photo, source))
+        if not copies:
+            return
+
+        storage = ListingPhoto._meta.get_field("image").storage
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            results = list(pool.map(
+                lambda c: _copy(storage, c[1], have[c[0].listing_id]), copies
+            ))
+
+        photos = []
+        for (photo, source), name in zip(copies, results):
+            if name is None:
+                self.errors.append((None, f"photo not found: {source}"))
+                continue
+            existing = have[photo.listing_id]
+            if name in existing:
+                continue  # imported by an earlier run, or twice in this one
+            photo.image.name = name
+            photo.sort_order = max(existing.values(), default=-1) + 1
+            existing[name] = photo.sort_order
+            photos.append(photo)
+        ListingPhoto.objects.bulk_create(photos)
+        PhotoBlob.count(photo.image.name for photo in photos)
+        for photo in photos:
+            enqueue("listings.process_photo", photo_id=photo.pk)
+        self.stats["photos"] += len(photos)
+
+
+def _copy(storage, source, existing):
+    """
+    Store ``source`` unless the listing already has a photo with its
+    content; returns the stored name, or None if there is no such file.
+    """
+    try:
+        with open(source, "rb") as fh:
+            name = storage.name_for(fh, source)
+            if name in existing:
+                return name
+            return storage.save(name, File(fh))
+    except FileNotFoundError:
+        return None
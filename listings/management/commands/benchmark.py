@@ -0,0 +1,185 @@
+import json
+import platform
+import statistics
+import tempfile
+import time
+
+import django
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from listings import caching, synthetic
+from listings.models import Listing, Neighborhood
+from listings.pricing import price_ranges_changed
+
+DEFAULT_SIZES = "100,10000,100000"
+# a tiny valid GIF: save_model stores the bytes, processing happens in a job
+PHOTO = (
+    b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00"
+    b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+def compare(results, baseline, threshold):
+    """[(size, name, baseline ms, current ms)] for timings more than ``threshold`` slower."""
+    regressions = []
+    for size, timings in results["results"].items():
+        for name, current in timings.items():
+            before = baseline.get("results", {}).get(size, {}).get(name)
+            if before and current["median_ms"] > before["median_ms"] * (1 + threshold):
+                regressions.append((size, name, before["median_ms"], current["median_ms"]))
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the public pages, admin changelist and admin save on seeded synthetic data "
+        "at several sizes. Everything runs in a transaction that is rolled back; run it "
+        "on an empty database so the sizes are the real listing counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Listing counts to test (default: {DEFAULT_SIZES}).")
+        parser.add_argument("--photos", type=int, default=3, help="Photos per listing (default: 3).")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark (default: 5).")
+        parser.add_argument("--seed", type=int, default=0, help="Data generator seed (default: 0).")
+        parser.add_argument("--output", metavar="FILE", help="Write the results as JSON.")
+        parser.add_argument("--baseline", metavar="FILE", help="Earlier --output to compare against.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.25,
+            help="Fail when a median is this much slower than the baseline (default: 0.25).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(size) for size in options["sizes"].split(","))
+        except ValueError:
+            raise CommandError("--sizes takes comma-separated numbers.")
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"]) as fh:
+                    baseline = json.load(fh)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Could not read {options['baseline']}: {exc}")
+
+        results = {
+            "meta": {
+                "seed": options["seed"],
+                "photos": options["photos"],
+                "repeat": options["repeat"],
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "machine": platform.machine(),
+                "existing_listings": Listing.objects.count(),
+            },
+            "results": {},
+        }
+        # render every page (no page cache) and keep uploads out of MEDIA_ROOT
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}},
+            REQUEST_METRICS_SAMPLE_RATE=0,
+            ALLOWED_HOSTS=["*"],
+            MEDIA_ROOT=media,
+        ):
+            try:
+                with transaction.atomic():
+                    self.run(sizes, options, results["results"])
+                    raise Rollback
+            except Rollback:
+                pass
+            finally:
+                price_ranges_changed()
+                caching.shared_changed()
+
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                json.dump(results, fh, indent=2, sort_keys=True)
+            self.stdout.write(f"Wrote {options['output']}")
+        if baseline is not None:
+            regressions = compare(results, baseline, options["threshold"])
+            for size, name, before, after in regressions:
+                self.stderr.write(f"{size:>7} {name}: {before:.2f}ms -> {after:.2f}ms")
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} benchmark(s) more than {options['threshold']:.0%} slower than the baseline."
+                )
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def run(self, sizes, options, results):
+        user = get_user_model().objects.create_superuser("benchmark", "benchmark@example.com", "benchmark")
+        client = Client()
+        client.force_login(user)
+        anonymous = Client()
+        have = 0
+        for size in sizes:
+            synthetic.generate(size - have, photos=options["photos"], seed=options["seed"])
+            have = size
+            timings = results[str(size)] = {}
+            self.stdout.write(f"\n{size} listings")
+            for name, run in self.benchmarks(client, anonymous, user).items():
+                timings[name] = self.measure(run, options["repeat"])
+                self.stdout.write(
+                    f"  {name:<26}{timings[name]['median_ms']:>10.2f}ms"
+                    f"{timings[name]['min_ms']:>10.2f}ms min   {timings[name]['queries']} queries"
+                )
+
+    def benchmarks(self, client, anonymous, user):
+        listing = Listing.objects.public().order_by("-pk").first()
+        neighborhood = Neighborhood.objects.order_by("pk").first()
+        changelist = reverse("admin:listings_listing_changelist")
+        model_admin = admin.site._registry[Listing]
+
+        def page(http, url):
+            return lambda: http.get(url)
+
+        def save_with_upload():
+            request = RequestFactory().post(
+                "/",
+                {"new_photos": [
+                    SimpleUploadedFile(f"bench-{n}.gif", PHOTO, content_type="image/gif") for n in range(2)
+                ]},
+            )
+            request.user = user
+            model_admin.save_model(request, listing, None, True)
+
+        return {
+            "public_home": page(anonymous, reverse("public_home")),
+            "public_listings": page(anonymous, reverse("public_listings")),
+            "public_listings_filtered": page(
+                anonymous, reverse("public_listings") + f"?neighborhood={neighborhood.pk}&beds=3&sort=price_asc"
+            ),
+            "public_listing_detail": page(anonymous, reverse("public_listing_detail", args=[listing.pk])),
+            "admin_changelist": page(client, changelist),
+            "admin_search": page(client, changelist + "?q=maple+kitchen"),
+            "admin_filter": page(client, changelist + f"?status__exact=active&neighborhood__id__exact={neighborhood.pk}"),
+            "admin_save_with_upload": save_with_upload,
+        }
+
+    def measure(self, run, repeat):
+        timings = []
+        for _ in range(max(1, repeat)):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = run()
+                timings.append((time.perf_counter() - started) * 1000)
+            if response is not None and response.status_code != 200:
+                raise CommandError(f"{response.request['PATH_INFO']} returned {response.status_code}")
+            queries = len(captured)
+        return {
+            "median_ms": round(statistics.median(timings), 3),
+            "min_ms": round(min(timings), 3),
+            "queries": queries,
+        }
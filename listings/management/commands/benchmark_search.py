@@ -0,0 +1,80 @@
+import time
+
+from django.contrib import admin
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+
+from listings import search, synthetic
+from listings.models import Listing
+
+DEFAULT_TERMS = ("maple", "omaha", "68132", "brick ranch", "dund", "3 car garage")
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time the admin changelist search: icontains vs the FTS5 index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("terms", nargs="*", help=f"Search terms (default: {', '.join(DEFAULT_TERMS)}).")
+        parser.add_argument("--repeat", type=int, default=20, help="Runs per term (default: 20).")
+        parser.add_argument(
+            "--generate",
+            type=int,
+            default=0,
+            metavar="N",
+            help="Insert N synthetic listings first, rolled back afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError("Full-text search needs SQLite (FTS5).")
+        try:
+            with transaction.atomic():
+                if options["generate"]:
+                    self.generate(options["generate"])
+                self.run(options["terms"] or DEFAULT_TERMS, options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def generate(self, count):
+        synthetic.generate(count)
+        self.stdout.write(f"Generated {count} listings.")
+
+    def run(self, terms, repeat):
+        model_admin = admin.site._registry[Listing]
+        request = RequestFactory().get("/")
+        base = Listing.objects.order_by("-created_at")
+
+        def icontains(term):
+            # the stock ModelAdmin search over search_fields
+            return admin.ModelAdmin.get_search_results(model_admin, request, base, term)[0]
+
+        def fts(term):
+            # the changelist re-applies its ordering after searching
+            return model_admin.get_search_results(request, base, term)[0].order_by("-created_at")
+
+        self.stdout.write(f"{Listing.objects.count()} listings, {repeat} runs per term\n")
+        self.stdout.write(f"{'term':<16}{'hits':>7}{'icontains ms':>15}{'fts ms':>10}{'speedup':>10}")
+        for term in terms:
+            slow, matches = self.time(icontains, term, repeat)
+            fast, fts_matches = self.time(fts, term, repeat)
+            self.stdout.write(
+                f"{term:<16}{fts_matches:>7}{slow:>15.2f}{fast:>10.2f}{slow / fast if fast else 0:>9.1f}x"
+                + ("" if matches == fts_matches else f"  (icontains: {matches} hits)")
+            )
+
+    def time(self, build, term, repeat):
+        # what the changelist does: count the matches, fetch the first page
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            queryset = build(term)
+            count = queryset.count()
+            list(queryset[:100])
+            best = min(best, time.perf_counter() - start)
+        return best * 1000, count
@@ -0,0 +1,76 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from listings import cards
+from listings.images import safe_build_variants
+from listings.models import ListingPhoto, PhotoBlob, variant_names
+
+
+def _init_worker():
+    # spawned workers start from a fresh interpreter
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/AVIF/JPEG variants for listing photos that don't have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild variants for every photo, not just the missing ones.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes (default: one per CPU).",
+        )
+
+    def handle(self, *args, **options):
+        photos = ListingPhoto.objects.exclude(image="")
+        if not options["all"]:
+            photos = photos.exclude(processing_status="ready")
+        rows = list(photos.values_list("pk", "image", "listing_id", "variants"))
+        jobs = {pk: name for pk, name, _, _ in rows}
+        listing_ids = {pk: listing_id for pk, _, listing_id, _ in rows}
+        old_variants = {pk: variants for pk, _, _, variants in rows}
+        if not jobs:
+            self.stdout.write("All photos already have variants.")
+            return
+
+        # don't let forked workers inherit open database connections
+        connections.close_all()
+
+        done = failed = 0
+        refreshed = set()
+        with ProcessPoolExecutor(
+            max_workers=max(1, options["workers"]), initializer=_init_worker
+        ) as pool:
+            futures = {pool.submit(safe_build_variants, name): pk for pk, name in jobs.items()}
+            for future in as_completed(futures):
+                pk = futures[future]
+                variants = future.result()
+                if variants:
+                    with transaction.atomic():
+                        ListingPhoto.objects.filter(pk=pk).update(
+                            variants=variants, processing_status="ready"
+                        )
+                        PhotoBlob.count(variant_names(variants))
+                        PhotoBlob.count(variant_names(old_variants[pk]), -1)
+                    refreshed.add(listing_ids[pk])
+                    done += 1
+                else:
+                    failed += 1
+                self.stdout.write(f"[{done + failed}/{len(jobs)}] {jobs[pk]}")
+
+        # update() sent no signals
+        cards.refresh(refreshed)
+        self.stdout.write(self.style.SUCCESS(f"Built variants for {done} photo(s)."))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} photo(s) could not be read."))
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from listings import blobs
+
+
+class Command(BaseCommand):
+    help = "Delete stored photo files that no listing photo uses any more."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=int,
+            default=1,
+            help="Leave files written within this many hours (default: 1).",
+        )
+        parser.add_argument(
+            "--recount",
+            action="store_true",
+            help="Rebuild the reference counts from the photos first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["recount"]:
+            count = blobs.recount()
+            self.stdout.write(f"{count} file(s) in use.")
+        removed = blobs.collect(timedelta(hours=options["hours"]))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {removed} unused file(s)."))
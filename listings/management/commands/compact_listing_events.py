@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from listings import history
+
+
+class Command(BaseCommand):
+    help = "Write the monthly listing snapshots that keep history queries fast (run monthly or daily)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-months",
+            type=int,
+            help="Also delete events and snapshots older than this many months.",
+        )
+
+    def handle(self, *args, **options):
+        count = history.compact()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} month snapshot row(s)."))
+        if options["keep_months"] is not None:
+            deleted = history.prune(options["keep_months"])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} old event(s)."))
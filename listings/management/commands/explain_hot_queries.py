@@ -0,0 +1,75 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from listings import geo
+from listings.browse import SORTS, keyset_queryset
+from listings.models import PUBLIC_LISTING, Listing, ListingCard, ListingPhoto
+
+# "SCAN listings_listing" with no "USING ... INDEX" is a full table scan
+FULL_SCAN = re.compile(r"\bSCAN (listings_\w+)(?!.*\bUSING\b)")
+
+
+def hot_queries():
+    """(name, queryset) pairs mirroring the queries the public views and admin run."""
+    public = Listing.objects.public()
+    cards = ListingCard.objects.all()
+    yield "home: featured", cards.filter(is_featured=True).order_by()[:1]
+    yield "save: demote featured", Listing.objects.filter(is_featured=True).exclude(pk=1).order_by()
+    yield "save: demote featured card", cards.filter(is_featured=True).exclude(pk=1).order_by()
+    yield "home: latest", cards.order_by("-created_at")[:6]
+
+    for sort, (_, field_name, _) in SORTS.items():
+        qs, _ = keyset_queryset(cards, sort)
+        yield f"browse: {sort}", qs[:25]
+        value = timezone.now() if field_name == "created_at" else 100000
+        qs, _ = keyset_queryset(cards, sort, cursor=(value, 1000))
+        yield f"browse: {sort} (cursor)", qs[:25]
+
+    yield "browse: neighborhood filter", cards.filter(neighborhood_id=1).order_by("-created_at", "-pk")[:25]
+    yield "browse: near a point", cards.near(41.2565, -95.9345, 8).order_by("-created_at", "-pk")[:25]
+    yield "cards: refresh", public.filter(pk__in=[1, 2, 3])
+    ranges = geo.cover(41.24, -96.02, 41.28, -95.96)
+    yield "map: clusters", public.filter(geo.cover_q(ranges, condition=PUBLIC_LISTING)).values("geohash", "latitude", "longitude", "price")
+    yield "validators: latest update", Listing.objects.order_by("-updated_at").values("updated_at")[:1]
+    yield "detail", Listing.objects.filter(pk=1, visibility="Y")
+    yield "detail: photos", ListingPhoto.objects.filter(listing_id=1).order_by("sort_order", "id")
+
+    for field, value in (("city", "Omaha"), ("state", "NE"), ("home_type", 1), ("neighborhood", 1)):
+        yield f"admin: filter {field}", Listing.objects.filter(**{field: value}).order_by("-created_at")[:100]
+    yield "admin: changelist", Listing.objects.order_by("-created_at")[:100]
+
+
+class Command(BaseCommand):
+    help = "Print EXPLAIN QUERY PLAN for the hot listing queries and flag full table scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="Exit with an error if any query does a full table scan (for CI).",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("explain_hot_queries only understands SQLite query plans.")
+
+        offenders = []
+        for name, queryset in hot_queries():
+            plan = queryset.explain()
+            scans = FULL_SCAN.findall(plan)
+            style = self.style.ERROR if scans else self.style.SUCCESS
+            self.stdout.write(style(f"== {name}"))
+            self.stdout.write(plan)
+            if scans:
+                offenders.append(name)
+
+        if offenders:
+            message = "Full table scans in: " + ", ".join(offenders)
+            if options["strict"]:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("No full table scans."))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from listings import cards
+from listings.geocode import geocode, load_centroids
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Fill listing coordinates from the ZIP centroid table (no network) and refresh geohashes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--centroids",
+            metavar="CSV",
+            help="Load or update centroids from a zipcode,city,latitude,longitude CSV first.",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-geocode every listing, replacing coordinates entered by hand.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Listings per update (default: 1000).")
+
+    def handle(self, *args, **options):
+        if options["centroids"]:
+            try:
+                count = load_centroids(options["centroids"])
+            except (OSError, KeyError, ValueError) as exc:
+                raise CommandError(f"Could not load {options['centroids']}: {exc}")
+            self.stdout.write(f"Loaded {count} ZIP centroids.")
+
+        if options["all"]:
+            Listing.objects.update(latitude=None, longitude=None)
+            queryset = Listing.objects.all()
+        else:
+            # rows without coordinates, or with coordinates but no geohash
+            queryset = Listing.objects.filter(
+                Q(latitude=None) | Q(longitude=None) | Q(geohash=None)
+            )
+        updated, missing = geocode(queryset, batch_size=max(1, options["batch_size"]))
+        if options["all"]:
+            # listings left without coordinates were cleared by update()
+            cards.rebuild()
+
+        for zipcode, count in sorted(missing.items(), key=lambda item: -item[1])[:20]:
+            self.stderr.write(f"no centroid for ZIP {zipcode!r} ({count} listing(s))")
+        self.stdout.write(self.style.SUCCESS(
+            f"Geocoded {updated} listing(s); {sum(missing.values())} left without coordinates."
+        ))
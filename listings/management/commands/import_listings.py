@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.importer import Importer, read_feed
+
+
+class Command(BaseCommand):
+    help = "Create or update listings (and their photos) from an MLS-style CSV or JSON feed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("feed", help="Path to a .csv, .json (array) or .jsonl file.")
+        parser.add_argument("--format", choices=("csv", "json"), help="Override the format guessed from the extension.")
+        parser.add_argument("--photos", metavar="DIR", help="Directory the feed's photo file names are relative to.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per upsert (default: 500).")
+        parser.add_argument("--workers", type=int, default=8, help="Threads copying photos (default: 8).")
+
+    def handle(self, *args, **options):
+        try:
+            rows = read_feed(options["feed"], options["format"])
+            importer = Importer(
+                photo_dir=options["photos"],
+                batch_size=max(1, options["batch_size"]),
+                workers=options["workers"],
+            )
+            started = time.perf_counter()
+            stats = importer.run(rows)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Could not import {options['feed']}: {exc}")
+        elapsed = time.perf_counter() - started
+
+        for line, message in importer.errors[:20]:
+            self.stderr.write(f"row {line}: {message}" if line else message)
+        if len(importer.errors) > 20:
+            self.stderr.write(f"... and {len(importer.errors) - 20} more problems")
+
+        rate = stats["rows"] / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{stats['rows']} rows in {elapsed:.2f}s ({rate:,.0f} rows/s): "
+                f"{stats['created']} created, {stats['updated']} updated, "
+                f"{stats['skipped']} skipped, {stats['photos']} photo(s) added."
+            )
+        )
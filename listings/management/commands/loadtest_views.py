@@ -0,0 +1,144 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+DEFAULT_PATHS = ("/", "/listings/", "/listings/?sort=price_asc", "/listings/search/?q=omaha")
+MODES = {
+    "wsgi": "config.urls",
+    "asgi": "config.urls_async",
+    "asgi-sync": "config.urls",
+}
+
+
+def _percentile(timings, fraction):
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the public pages through Django's WSGI and ASGI handlers in-process "
+        "and compare throughput and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help=f"Paths to request (default: {', '.join(DEFAULT_PATHS)}).")
+        parser.add_argument("--requests", type=int, default=400, help="Requests per mode (default: 400).")
+        parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight (default: 16).")
+        parser.add_argument(
+            "--mode",
+            action="append",
+            choices=tuple(MODES),
+            help="Handler to test; repeat for several (default: all). "
+                 "asgi-sync serves the sync views through the ASGI handler.",
+        )
+        parser.add_argument("--no-cache", action="store_true", help="Swap in a dummy cache so every request renders.")
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or DEFAULT_PATHS
+        total = max(1, options["requests"])
+        concurrency = max(1, options["concurrency"])
+        overrides = {}
+        if options["no_cache"]:
+            overrides["CACHES"] = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+        host = next((h for h in settings.ALLOWED_HOSTS if not h.startswith(".")), "localhost")
+        targets = [paths[i % len(paths)] for i in range(total)]
+
+        for mode in options["mode"] or tuple(MODES):
+            with override_settings(ROOT_URLCONF=MODES[mode], **overrides):
+                started = time.perf_counter()
+                if mode == "wsgi":
+                    results = self.run_wsgi(targets, concurrency, host)
+                else:
+                    results = asyncio.run(self.run_asgi(targets, concurrency, host))
+                elapsed = time.perf_counter() - started
+            self.report(mode, results, elapsed)
+
+    # ---------- WSGI: a thread per request in flight ---------- #
+
+    def run_wsgi(self, targets, concurrency, host):
+        handler = WSGIHandler()
+
+        def call(target):
+            path, _, query = target.partition("?")
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "PATH_INFO": path,
+                "QUERY_STRING": query,
+                "SERVER_NAME": host,
+                "SERVER_PORT": "80",
+                "HTTP_HOST": host,
+                "wsgi.url_scheme": "http",
+                "wsgi.input": BytesIO(),
+                "wsgi.errors": self.stderr,
+            }
+            status = []
+            started = time.perf_counter()
+            response = handler(environ, lambda s, headers: status.append(s))
+            b"".join(response)
+            response.close()
+            return int(status[0].split()[0]), time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(call, targets))
+
+    # ---------- ASGI: one event loop ---------- #
+
+    async def run_asgi(self, targets, concurrency, host):
+        handler = ASGIHandler()
+        gate = asyncio.Semaphore(concurrency)
+        never = asyncio.Event()
+
+        async def call(target):
+            path, _, query = target.partition("?")
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": query.encode(),
+                "headers": [(b"host", host.encode())],
+                "client": ("127.0.0.1", 50000),
+                "server": (host, 80),
+            }
+            sent = False
+            status = []
+
+            async def receive():
+                nonlocal sent
+                if not sent:
+                    sent = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await never.wait()
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+
+            async with gate:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                return status[0], time.perf_counter() - started
+
+        return await asyncio.gather(*(call(target) for target in targets))
+
+    def report(self, mode, results, elapsed):
+        timings = sorted(seconds * 1000 for _, seconds in results)
+        errors = sum(1 for status, _ in results if status >= 400)
+        self.stdout.write(
+            f"{mode:<10} {len(results) / elapsed:8.1f} req/s   "
+            f"p50 {_percentile(timings, 0.50):7.1f}ms  "
+            f"p95 {_percentile(timings, 0.95):7.1f}ms  "
+            f"p99 {_percentile(timings, 0.99):7.1f}ms  "
+            f"max {timings[-1]:7.1f}ms   "
+            f"errors {errors}"
+        )
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from listings.uploads import purge_stale_uploads
+
+
+class Command(BaseCommand):
+    help = "Delete resumable photo uploads that were abandoned before completing."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=int,
+            default=48,
+            help="Only purge uploads idle for at least this many hours (default: 48).",
+        )
+
+    def handle(self, *args, **options):
+        count = purge_stale_uploads(timedelta(hours=options["hours"]))
+        self.stdout.write(self.style.SUCCESS(f"Purged {count} stale upload(s)."))
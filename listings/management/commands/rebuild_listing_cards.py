@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from listings import caching, cards
+
+
+class Command(BaseCommand):
+    help = "Rewrite the listing card table behind the public grids from the listings and their photos."
+
+    def handle(self, *args, **options):
+        count = cards.rebuild()
+        caching.shared_changed()
+        self.stdout.write(self.style.SUCCESS(f"Built {count} listing card(s)."))
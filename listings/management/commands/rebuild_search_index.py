@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from listings import search
+
+
+class Command(BaseCommand):
+    help = "Recreate the listing full-text search table and triggers, then re-index every listing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        if not search.available(using):
+            raise CommandError("Full-text search needs SQLite (FTS5).")
+        search.ensure_schema(using)
+        count = search.rebuild(using)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} listing(s)."))
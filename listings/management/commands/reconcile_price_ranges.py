@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from listings.pricing import price_range_index, reconcile
+
+
+class Command(BaseCommand):
+    help = "Point every listing's price_range at the range its price falls in, in bulk UPDATEs."
+
+    def handle(self, *args, **options):
+        ranges = len(price_range_index())
+        count = reconcile()
+        self.stdout.write(
+            self.style.SUCCESS(f"Reassigned {count} listing(s) across {ranges} price range(s).")
+        )
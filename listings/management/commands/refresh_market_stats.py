@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from listings import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the neighborhood, home type and ZIP code market stats (run daily)."
+
+    def handle(self, *args, **options):
+        count = stats.refresh()
+        self.stdout.write(self.style.SUCCESS(f"Computed market stats for {count} group(s)."))
@@ -0,0 +1,21 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from listings import blobs
+
+
+class Command(BaseCommand):
+    help = "Move photos stored under listing_photos/<listing id>/ into the content-addressed storage."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of hashing threads (default: one per CPU).",
+        )
+
+    def handle(self, *args, **options):
+        files, photos = blobs.rehash(workers=max(1, options["workers"]))
+        self.stdout.write(self.style.SUCCESS(f"Rehashed {files} file(s) used by {photos} photo(s)."))
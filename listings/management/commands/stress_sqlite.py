@@ -0,0 +1,129 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from config.database import BUSY_TIMEOUT_MS, pragma_statements
+
+READ_SQL = (
+    "SELECT id, street, city, price FROM listings_listing "
+    "WHERE visibility = 'Y' ORDER BY created_at DESC, id DESC LIMIT 24"
+)
+# what an admin save does: read the row, then write it
+SELECT_SQL = "SELECT price FROM listings_listing WHERE id = ?"
+UPDATE_SQL = "UPDATE listings_listing SET price = ?, updated_at = datetime('now') WHERE id = ?"
+
+CONFIGS = {
+    # Django's previous defaults: rollback journal, deferred transactions
+    "default": {"pragmas": [], "begin": "BEGIN"},
+    "tuned": {"pragmas": pragma_statements(), "begin": "BEGIN IMMEDIATE"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer a scratch copy of the database with concurrent readers and writers, "
+        "with SQLite's default settings and with config.database's."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8, help="Reader threads (default: 8).")
+        parser.add_argument("--writers", type=int, default=4, help="Writer threads (default: 4).")
+        parser.add_argument("--seconds", type=float, default=5, help="Duration per configuration (default: 5).")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("This stress test is for SQLite databases.")
+        connection.ensure_connection()
+        with tempfile.TemporaryDirectory() as scratch:
+            for name, config in CONFIGS.items():
+                path = os.path.join(scratch, f"{name}.sqlite3")
+                target = sqlite3.connect(path)
+                connection.connection.backup(target)
+                target.execute("PRAGMA journal_mode = DELETE")
+                target.close()
+                ids = self.listing_ids(path)
+                if not ids:
+                    raise CommandError("No listings to update; load some data first.")
+                result = self.run(path, config, ids, options)
+                self.report(name, result, options["seconds"])
+
+    def listing_ids(self, path):
+        db = sqlite3.connect(path)
+        try:
+            return [pk for (pk,) in db.execute("SELECT id FROM listings_listing")]
+        finally:
+            db.close()
+
+    def connect(self, path, config):
+        db = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False
+        )
+        for statement in config["pragmas"]:
+            db.execute(statement)
+        return db
+
+    def run(self, path, config, ids, options):
+        stop = threading.Event()
+        counts = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0}
+        latencies = []
+        lock = threading.Lock()
+
+        def tally(key, started=None):
+            with lock:
+                counts[key] += 1
+                if started is not None:
+                    latencies.append(time.perf_counter() - started)
+
+        def reader():
+            db = self.connect(path, config)
+            while not stop.is_set():
+                try:
+                    db.execute(READ_SQL).fetchall()
+                    tally("reads")
+                except sqlite3.OperationalError:
+                    tally("read_errors")
+            db.close()
+
+        def writer(seed):
+            rng = random.Random(seed)
+            db = self.connect(path, config)
+            while not stop.is_set():
+                pk = rng.choice(ids)
+                started = time.perf_counter()
+                try:
+                    db.execute(config["begin"])
+                    (price,) = db.execute(SELECT_SQL, [pk]).fetchone()
+                    db.execute(UPDATE_SQL, [price + rng.choice((-1000, 1000)), pk])
+                    db.execute("COMMIT")
+                    tally("writes", started)
+                except sqlite3.OperationalError:
+                    if db.in_transaction:
+                        db.execute("ROLLBACK")
+                    tally("write_errors")
+            db.close()
+
+        threads = [threading.Thread(target=reader) for _ in range(options["readers"])]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(options["writers"])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options["seconds"])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        counts["latencies"] = sorted(latencies)
+        return counts
+
+    def report(self, name, result, seconds):
+        latencies = result["latencies"]
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+        self.stdout.write(
+            f"{name:<8} reads {result['reads'] / seconds:9.0f}/s  "
+            f"writes {result['writes'] / seconds:7.0f}/s (p95 {p95:6.1f}ms)  "
+            f"locked: {result['read_errors']} reads, {result['write_errors']} writes"
+        )
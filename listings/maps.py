@@ -0,0 +1,76 @@
+"""
+Server-side marker clustering for the listings map.
+
+The viewport is covered by a few geohash ranges (see geo.cover), and the
+public listings in them are grouped by their geohash prefix at a precision
+picked for the zoom level, so a cell is roughly one cluster marker wide on
+screen. One grouped query over listing_public_geohash_idx returns a row per
+cell; a cell holding one listing comes back as that listing's marker.
+
+Clusters are returned for the covering cells rather than the exact viewport,
+so small pans land on the same covering and are served from the cache.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import Substr
+from django.urls import reverse
+
+from . import geo
+from .browse import apply_filters, state_digest
+from .caching import list_version
+from .models import PUBLIC_LISTING, Listing
+
+MAP_CACHE_SECONDS = 300
+
+
+def compute_clusters(state, ranges, precision):
+    cells = (
+        apply_filters(Listing.objects.public(), state)
+        .filter(geo.cover_q(ranges, condition=PUBLIC_LISTING))
+        .order_by()
+        .annotate(cell=Substr("geohash", 1, precision))
+        .values("cell")
+        .annotate(
+            count=Count("id"),
+            lat=Avg("latitude"),
+            lng=Avg("longitude"),
+            first_id=Min("id"),
+            min_price=Min("price"),
+            max_price=Max("price"),
+        )
+    )
+    clusters = []
+    markers = []
+    for cell in cells:
+        if cell["count"] == 1:
+            markers.append({
+                "id": cell["first_id"],
+                "url": reverse("public_listing_detail", args=[cell["first_id"]]),
+                "lat": cell["lat"],
+                "lng": cell["lng"],
+                "price": cell["min_price"],
+            })
+        else:
+            south, west, north, east = geo.bounds(cell["cell"])
+            clusters.append({
+                "cell": cell["cell"],
+                "lat": cell["lat"],
+                "lng": cell["lng"],
+                "count": cell["count"],
+                "min_price": cell["min_price"],
+                "max_price": cell["max_price"],
+                "bbox": [west, south, east, north],
+            })
+    return {"clusters": clusters, "listings": markers}
+
+
+def map_clusters(state, bbox, zoom):
+    """Clusters and single-listing markers for ``bbox`` (south, west, north, east) at ``zoom``."""
+    precision = geo.cluster_precision(zoom)
+    ranges = geo.cover(*bbox)
+    area = hashlib.sha1(repr(ranges).encode()).hexdigest()
+    key = f"listings:map:{list_version()}:{precision}:{area}:{state_digest(state)}"
+    data = cache.get_or_set(key, lambda: compute_clusters(state, ranges, precision), MAP_CACHE_SECONDS)
+    return {"zoom": zoom, "precision": precision, **data}
@@ -0,0 +1,195 @@
+"""
+Serving uploaded media and collected static files.
+
+Unlike django.views.static.serve this answers Range requests (the browser
+asks for byte ranges of large photos), revalidates with ETag/Last-Modified,
+hands whole files to the WSGI server's sendfile through FileResponse, and can
+skip Python entirely by replying with an X-Accel-Redirect (nginx) or
+X-Sendfile (Apache, lighttpd) header when ``MEDIA_ACCEL`` is configured:
+
+    MEDIA_ACCEL = "x-accel-redirect"
+    MEDIA_ACCEL_PREFIX = "/protected-media/"   # nginx "internal" location
+
+Static files are served from the pre-compressed .br / .gz copies written by
+config.storage.CompressedManifestStaticFilesStorage when the client accepts
+them.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+# variant files carry a digest of their source: <stem>.<digest>.<width>.<ext>;
+# ManifestStaticFilesStorage names look like site.<digest>.css, and the
+# content-addressed photo storage names files <sha256>.<ext>
+HASHED_NAME = re.compile(r"(\.[0-9a-f]{12}(\.\d+)?|/[0-9a-f]{64})\.\w+$")
+ONE_YEAR = 60 * 60 * 24 * 365
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+BLOCK_SIZE = 64 * 1024
+
+# Accept-Encoding token -> (file suffix, Content-Encoding), best first
+PRECOMPRESSED = (("br", ".br", "br"), ("gzip", ".gz", "gzip"))
+
+
+def _resolve(document_root, path):
+    path = posixpath.normpath(path).lstrip("/")
+    try:
+        fullpath = safe_join(document_root, path)
+    except ValueError:
+        raise Http404("Invalid path")  # outside the document root
+    if not os.path.isfile(fullpath):
+        raise Http404(f"“{path}” does not exist")
+    return path, fullpath
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) inclusive for a single "bytes=" range, None to serve
+    the whole file (no header, or several ranges), or "invalid" when the
+    range can't be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE.match(header.strip())
+    if not match:
+        return None  # multiple or malformed ranges: send the whole file
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return "invalid"
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return "invalid"
+    return start, end
+
+
+def _iter_range(fullpath, start, length):
+    with open(fullpath, "rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            block = fh.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def _cache_headers(response, path):
+    if HASHED_NAME.search(path):
+        # content-hashed names never change
+        patch_cache_control(response, public=True, max_age=ONE_YEAR, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=3600)
+
+
+def serve_file(request, path, fullpath, content_type=None, encoding=None, offload=False):
+    stat = os.stat(fullpath)
+    etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}{"-" + encoding if encoding else ""}"'
+    last_modified = int(stat.st_mtime)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        _cache_headers(not_modified, path)
+        return not_modified
+
+    if content_type is None:
+        content_type = mimetypes.guess_type(fullpath)[0] or "application/octet-stream"
+
+    accel = getattr(settings, "MEDIA_ACCEL", None) if offload else None
+    if accel:
+        # the front-end server streams the file (and handles Range) itself
+        response = HttpResponse(content_type=content_type)
+        if accel == "x-accel-redirect":
+            prefix = getattr(settings, "MEDIA_ACCEL_PREFIX", "/protected-media/")
+            response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + path
+        else:
+            response["X-Sendfile"] = fullpath
+    else:
+        byte_range = None
+        if_range = request.headers.get("If-Range")
+        if not if_range or if_range == etag or parse_http_date_safe(if_range) == last_modified:
+            byte_range = parse_range(request.headers.get("Range"), stat.st_size)
+
+        if byte_range == "invalid":
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+            return response
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _iter_range(fullpath, start, length), status=206, content_type=content_type
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response["Content-Length"] = str(length)
+        else:
+            # FileResponse lets the WSGI server use its file wrapper / sendfile
+            response = FileResponse(open(fullpath, "rb"), content_type=content_type)
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    if encoding:
+        response["Content-Encoding"] = encoding
+    _cache_headers(response, path)
+    return response
+
+
+def accepted_codings(header):
+    """
+    The content codings an Accept-Encoding header allows: {coding: q} for
+    the ones it names, with "*" standing for the rest. q=0 means "not this".
+    """
+    codings = {}
+    for part in header.split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding.lower()] = q
+    return codings
+
+
+def _accepts(codings, coding):
+    return codings.get(coding, codings.get("*", 0)) > 0
+
+
+def serve_media(request, path, document_root=None):
+    path, fullpath = _resolve(document_root or settings.MEDIA_ROOT, path)
+    return serve_file(request, path, fullpath, offload=True)
+
+
+def serve_static(request, path, document_root=None):
+    """Serve collected static files, preferring a pre-compressed copy."""
+    path, fullpath = _resolve(document_root or settings.STATIC_ROOT, path)
+    content_type = mimetypes.guess_type(fullpath)[0] or "application/octet-stream"
+    accepted = accepted_codings(request.headers.get("Accept-Encoding", ""))
+    for token, suffix, encoding in PRECOMPRESSED:
+        if _accepts(accepted, token) and os.path.isfile(fullpath + suffix):
+            response = serve_file(
+                request, path, fullpath + suffix, content_type=content_type, encoding=encoding
+            )
+            break
+    else:
+        response = serve_file(request, path, fullpath, content_type=content_type)
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:27
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_alter_listing_baths_alter_listing_beds_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='sqft_sort',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Coalesce('sqft', 0), output_field=models.PositiveIntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('status', 'active'), ('visibility', 'Y')), fields=['-created_at', '-id'], name='listing_public_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('status', 'active'), ('visibility', 'Y')), fields=['price', 'id'], name='listing_public_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('status', 'active'), ('visibility', 'Y')), fields=['-sqft_sort', '-id'], name='listing_public_sqft_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('status', 'active'), ('visibility', 'Y'), ('is_featured', True)), fields=['-updated_at'], name='listing_public_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['-created_at'], name='listing_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['city', '-created_at'], name='listing_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['state', '-created_at'], name='listing_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['home_type', '-created_at'], name='listing_home_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['neighborhood', '-created_at'], name='listing_neighborhood_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingphoto',
+            index=models.Index(fields=['listing', 'sort_order', 'id'], name='listingphoto_order_idx'),
+        ),
+    ]
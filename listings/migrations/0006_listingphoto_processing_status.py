@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:30
+
+from django.db import migrations, models
+
+
+def mark_processed_photos_ready(apps, schema_editor):
+    ListingPhoto = apps.get_model('listings', 'ListingPhoto')
+    ListingPhoto.objects.exclude(variants={}).update(processing_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_listingphoto_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listingphoto',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', editable=False, max_length=10),
+        ),
+        migrations.RunPython(mark_processed_photos_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def keep_latest_featured(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    featured = Listing.objects.filter(is_featured=True).order_by('-updated_at', '-id')
+    latest = featured.values_list('pk', flat=True).first()
+    featured.exclude(pk=latest).update(is_featured=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_listing_updated_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_latest_featured, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='listing',
+            name='listing_public_featured_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='listing',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_featured', True)), fields=('is_featured',), name='listing_single_featured'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_listing_single_featured'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='mls_id',
+            field=models.CharField(blank=True, max_length=40, null=True, unique=True),
+        ),
+    ]
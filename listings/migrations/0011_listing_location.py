@@ -0,0 +1,74 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:04
+
+import csv
+import os
+
+from django.conf import settings
+from django.db import migrations, models
+
+CENTROIDS_CSV = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'zip_centroids.csv')
+
+
+def load_zip_centroids(apps, schema_editor):
+    # a frozen copy of listings.geocode.load_centroids, which may change
+    ZipCentroid = apps.get_model('listings', 'ZipCentroid')
+    with open(CENTROIDS_CSV, newline='', encoding='utf-8-sig') as fh:
+        rows = [
+            ZipCentroid(
+                zipcode=row['zipcode'].strip()[:5],
+                city=(row.get('city') or '').strip(),
+                latitude=float(row['latitude']),
+                longitude=float(row['longitude']),
+            )
+            for row in csv.DictReader(fh)
+        ]
+    ZipCentroid.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['zipcode'],
+        update_fields=['city', 'latitude', 'longitude'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_listing_mls_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZipCentroid',
+            fields=[
+                ('zipcode', models.CharField(max_length=5, primary_key=True, serialize=False)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+            ],
+            options={
+                'verbose_name': 'ZIP centroid',
+                'ordering': ['zipcode'],
+            },
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('status', 'active'), ('visibility', 'Y')), fields=['geohash', 'latitude', 'longitude', 'price', 'status', 'visibility'], name='listing_public_geohash_idx'),
+        ),
+        migrations.RunPython(load_zip_centroids, migrations.RunPython.noop),
+    ]
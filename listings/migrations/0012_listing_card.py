@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_cards(apps, schema_editor):
+    # cards are built by the current listings.cards code, which only works
+    # against the schema of this point in history; new databases have
+    # nothing to build and rebuild_listing_cards covers later upgrades
+    if not apps.get_model('listings', 'Listing').objects.exists():
+        return
+    from listings.cards import rebuild
+    rebuild()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_listing_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingCard',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='listings.listing')),
+                ('created_at', models.DateTimeField()),
+                ('price', models.IntegerField()),
+                ('sqft_sort', models.PositiveIntegerField(default=0)),
+                ('beds', models.DecimalField(decimal_places=0, max_digits=2, null=True)),
+                ('baths', models.DecimalField(decimal_places=1, max_digits=3, null=True)),
+                ('zipcode', models.CharField(max_length=10)),
+                ('is_featured', models.BooleanField(default=False)),
+                ('latitude', models.FloatField(null=True)),
+                ('longitude', models.FloatField(null=True)),
+                ('geohash', models.CharField(max_length=9, null=True)),
+                ('street', models.CharField(max_length=255)),
+                ('city', models.CharField(max_length=100)),
+                ('state', models.CharField(max_length=2)),
+                ('price_display', models.CharField(max_length=20)),
+                ('meta_display', models.CharField(max_length=100)),
+                ('neighborhood_name', models.CharField(blank=True, max_length=100)),
+                ('home_type_name', models.CharField(blank=True, max_length=40)),
+                ('photo', models.JSONField(blank=True, null=True)),
+                ('refreshed_at', models.DateTimeField()),
+                ('home_type', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='listings.hometype')),
+                ('neighborhood', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='listings.neighborhood')),
+            ],
+            options={
+                'ordering': ['-created_at', '-listing'],
+                'indexes': [models.Index(fields=['-created_at', '-listing'], name='card_newest_idx'), models.Index(fields=['price', 'listing'], name='card_price_idx'), models.Index(fields=['-sqft_sort', '-listing'], name='card_sqft_idx'), models.Index(fields=['geohash', 'latitude', 'longitude'], name='card_geohash_idx'), models.Index(fields=['neighborhood', '-created_at', '-listing'], name='card_neighborhood_idx'), models.Index(fields=['home_type', '-created_at', '-listing'], name='card_home_type_idx'), models.Index(condition=models.Q(('is_featured', True)), fields=['is_featured'], name='card_featured_idx')],
+            },
+        ),
+        migrations.RunPython(build_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_stats(apps, schema_editor):
+    # same caveat as 0012: current code, only run where there's data
+    if not apps.get_model('listings', 'Listing').objects.exists():
+        return
+    from listings.stats import refresh
+    refresh()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_listing_card'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('all', 'All listings'), ('neighborhood', 'Neighborhood'), ('home_type', 'Home type'), ('zipcode', 'ZIP code')], max_length=20)),
+                ('key', models.CharField(blank=True, max_length=20)),
+                ('label', models.CharField(max_length=100)),
+                ('active_count', models.PositiveIntegerField(default=0)),
+                ('pending_count', models.PositiveIntegerField(default=0)),
+                ('sold_count', models.PositiveIntegerField(default=0)),
+                ('new_count', models.PositiveIntegerField(default=0)),
+                ('price_p10', models.IntegerField(null=True)),
+                ('price_p25', models.IntegerField(null=True)),
+                ('price_p50', models.IntegerField(null=True)),
+                ('price_p75', models.IntegerField(null=True)),
+                ('price_p90', models.IntegerField(null=True)),
+                ('price_per_sqft_p50', models.FloatField(null=True)),
+                ('days_on_market_p50', models.FloatField(null=True)),
+                ('days_to_sell_p50', models.FloatField(null=True)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['dimension', 'label'],
+            },
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='status_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['zipcode'], name='listing_zipcode_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='marketstat',
+            constraint=models.UniqueConstraint(fields=('dimension', 'key'), name='marketstat_group_unique'),
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
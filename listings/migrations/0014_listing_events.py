@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_events(apps, schema_editor):
+    # the history so far is all that was kept: when each listing was listed
+    # and, unless it still is active, when its status last changed
+    schema_editor.execute("""
+        INSERT INTO listings_listingevent (listing_id, at, kind, status, visibility, price)
+        SELECT id, created_at, 'listed', 'active', visibility, price FROM listings_listing
+    """)
+    schema_editor.execute("""
+        INSERT INTO listings_listingevent (listing_id, at, kind, status, visibility, price)
+        SELECT id, COALESCE(status_changed_at, updated_at), 'status', status, visibility, price
+        FROM listings_listing WHERE status != 'active'
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0013_market_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('at', models.DateTimeField()),
+                ('kind', models.CharField(choices=[('listed', 'Listed'), ('status', 'Status change'), ('price', 'Price change'), ('visibility', 'Visibility change'), ('deleted', 'Deleted')], max_length=10)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('pending', 'Pending'), ('sold', 'Sold'), ('off_market', 'Off Market')], max_length=20)),
+                ('visibility', models.CharField(choices=[('Y', 'Visible'), ('N', 'Hidden')], max_length=1)),
+                ('price', models.IntegerField()),
+                ('old_price', models.IntegerField(blank=True, null=True)),
+                ('listing', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['at', 'id'],
+                'indexes': [models.Index(fields=['listing', 'at'], name='listingevent_listing_idx'), models.Index(fields=['status', 'at'], name='listingevent_status_idx'), models.Index(condition=models.Q(('kind', 'price')), fields=['at'], name='listingevent_price_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ListingMonthSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('status', models.CharField(choices=[('active', 'Active'), ('pending', 'Pending'), ('sold', 'Sold'), ('off_market', 'Off Market')], max_length=20)),
+                ('price', models.IntegerField()),
+                ('listing', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['month', 'listing'],
+                'constraints': [models.UniqueConstraint(fields=('month', 'listing'), name='listingmonthsnapshot_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:29
+
+import listings.images
+import listings.models
+from django.db import migrations, models
+
+
+def count_blobs(apps, schema_editor):
+    # the files existing photos use; rehash_listing_photos later moves them
+    # into the content-addressed storage and counts again
+    ListingPhoto = apps.get_model('listings', 'ListingPhoto')
+    PhotoBlob = apps.get_model('listings', 'PhotoBlob')
+    counts = {}
+    for image, variants in ListingPhoto.objects.values_list('image', 'variants').iterator():
+        names = [image] + [name for sources in variants.get('sources', {}).values() for _, name in sources]
+        for name in names:
+            if name:
+                counts[name] = counts.get(name, 0) + 1
+    PhotoBlob.objects.bulk_create(
+        (PhotoBlob(name=name, refs=refs) for name, refs in counts.items()), batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0014_listing_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refs', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='listingphoto',
+            name='image',
+            field=models.ImageField(storage=listings.images.photo_storage, upload_to=listings.models.listing_upload_path),
+        ),
+        migrations.AddIndex(
+            model_name='listingphoto',
+            index=models.Index(fields=['image'], name='listingphoto_image_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photoblob',
+            index=models.Index(condition=models.Q(('refs__lte', 0)), fields=['updated_at'], name='photoblob_unused_idx'),
+        ),
+        migrations.RunPython(count_blobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:12
+
+from django.db import migrations
+
+
+def store_names(apps, schema_editor):
+    # cards used to hold the cover photo's URLs; keep its file names instead
+    ListingCard = apps.get_model('listings', 'ListingCard')
+    ListingPhoto = apps.get_model('listings', 'ListingPhoto')
+    cards = list(ListingCard.objects.exclude(photo=None).only('listing', 'photo'))
+    for card in cards:
+        cover = ListingPhoto.objects.filter(listing_id=card.listing_id).order_by('sort_order', 'id').first()
+        card.photo = None
+        if cover is not None and cover.image:
+            variants = cover.variants if cover.processing_status == 'ready' else {}
+            card.photo = {'image': cover.image.name, 'variants': variants}
+    ListingCard.objects.bulk_update(cards, ['photo'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0016_pricerange_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(store_names, migrations.RunPython.noop),
+    ]
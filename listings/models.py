@@ -1,6 +1,17 @@
-from django.db import models
+import uuid
+
+from django.db import connection, models, transaction
 from django.contrib.auth import get_user_model
+from django.db.models.functions import Coalesce
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from jobs.queue import enqueue
+
+from . import geo
+from .images import FALLBACK_FORMAT, FORMATS, photo_storage
+from .pricing import price_range_index
 
 User = get_user_model()
 
@@ -30,6 +41,8 @@ class HomeType(models.Model):
 class PriceRange(models.Model):
     min_price = models.IntegerField()
     max_price = models.IntegerField()
+    # part of the stamp listings.pricing keys its index on
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["min_price"]
@@ -38,6 +51,77 @@ class PriceRange(models.Model):
         return f"${self.min_price:,.0f} – ${self.max_price:,.0f}"
 
 
+class ZipCentroid(models.Model):
+    """Center of a ZIP code area, for geocoding listings without a network call."""
+    zipcode = models.CharField(max_length=5, primary_key=True)
+    city = models.CharField(max_length=100, blank=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    class Meta:
+        verbose_name = "ZIP centroid"
+        ordering = ["zipcode"]
+
+    def __str__(self):
+        return self.zipcode
+
+
+PUBLIC_LISTING = models.Q(status="active", visibility="Y")
+# Listing fields the market stats are computed from (see listings.stats)
+TRACKED_FIELDS = (
+    "status", "visibility", "price", "sqft", "neighborhood_id", "home_type_id", "zipcode",
+)
+
+
+class LocatedQuerySet(models.QuerySet):
+    """Distance and bounding-box filters for models with a geohash column."""
+    # what within(public=True) adds to each geohash range, to match the
+    # condition of a partial geohash index
+    public_condition = None
+
+    def within(self, south, west, north, east, public=False):
+        """
+        Rows inside a bounding box: geohash range scans, then the exact box.
+        ``public`` also limits them to public rows.
+        """
+        condition = self.public_condition if public else None
+        return self.filter(
+            geo.cover_q(geo.cover(south, west, north, east), condition=condition),
+            latitude__range=(south, north),
+            longitude__range=(west, east),
+        )
+
+    def near(self, latitude, longitude, km, public=False):
+        """Rows within ``km`` of a point, with the distance as ``distance_km``."""
+        return (
+            self.within(*geo.box_around(latitude, longitude, km), public=public)
+            .alias(distance_km=geo.distance_km(latitude, longitude))
+            .filter(distance_km__lte=km)
+        )
+
+
+class ListingQuerySet(LocatedQuerySet):
+    # searched through listing_public_geohash_idx
+    public_condition = PUBLIC_LISTING
+
+    def public(self):
+        """Listings shown on the public site."""
+        return self.filter(PUBLIC_LISTING)
+
+    def with_cover_photo(self):
+        """
+        Load the first photo of every listing in one extra query, so
+        main_photo_url doesn't hit the database once per card.
+        """
+        return self.prefetch_related(
+            models.Prefetch(
+                "photos",
+                queryset=ListingPhoto.objects.order_by("sort_order", "id")[:1],
+                to_attr="cover_photos",
+            )
+        )
+
+
 class Listing(models.Model):
     STATUS_CHOICES = [
         ("active", "Active"),
@@ -50,6 +134,9 @@ class Listing(models.Model):
         ("N", "Hidden"),
     ]
 
+    # id from the MLS feed (see import_listings); empty for hand-made listings
+    mls_id = models.CharField(max_length=40, unique=True, null=True, blank=True)
+
     # core
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
     visibility = models.CharField(max_length=1, choices=VISIBILITY_CHOICES, default="Y")
@@ -61,6 +148,11 @@ class Listing(models.Model):
     city = models.CharField(max_length=100)
     state = models.CharField(max_length=2)  # e.g. NE
     zipcode = models.CharField(max_length=10)
+    # from a ZIP centroid (geocode_listings) unless entered by hand
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # geohash of latitude/longitude, kept by save(); indexed for map queries
+    geohash = models.CharField(max_length=geo.PRECISION, null=True, blank=True, editable=False)
 
     # attributes
     sqft = models.PositiveIntegerField(null=True, blank=True)
@@ -77,6 +169,12 @@ class Listing(models.Model):
     hoa_fee = models.DecimalField(
         max_digits=10, decimal_places=2, null=True, blank=True
     )
+    # sqft with missing values as 0, so "largest first" can use an index
+    sqft_sort = models.GeneratedField(
+        expression=Coalesce("sqft", 0),
+        output_field=models.PositiveIntegerField(),
+        db_persist=True,
+    )
 
     # relationships
     created_by = models.ForeignKey(
@@ -99,16 +197,77 @@ class Listing(models.Model):
     # timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # last status change (set by save()); days on market end here
+    status_changed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = ListingQuerySet.as_manager()
 
     class Meta:
         ordering = ["-created_at"]
+        # partial indexes follow the public query shapes (status="active",
+        # visibility="Y") so the browse/home pages never scan hidden rows
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=PUBLIC_LISTING,
+                name="listing_public_newest_idx",
+            ),
+            models.Index(
+                fields=["price", "id"],
+                condition=PUBLIC_LISTING,
+                name="listing_public_price_idx",
+            ),
+            models.Index(
+                fields=["-sqft_sort", "-id"],
+                condition=PUBLIC_LISTING,
+                name="listing_public_sqft_idx",
+            ),
+            # covers the map clustering query: geohash ranges, then the
+            # coordinates and price straight from the index (status and
+            # visibility are there because the query's WHERE names them)
+            models.Index(
+                fields=["geohash", "latitude", "longitude", "price", "status", "visibility"],
+                condition=PUBLIC_LISTING,
+                name="listing_public_geohash_idx",
+            ),
+            # admin changelist: default ordering and list_filter columns
+            models.Index(fields=["-created_at"], name="listing_created_idx"),
+            # newest change anywhere, for Last-Modified on the public pages
+            models.Index(fields=["-updated_at"], name="listing_updated_idx"),
+            models.Index(fields=["city", "-created_at"], name="listing_city_idx"),
+            models.Index(fields=["state", "-created_at"], name="listing_state_idx"),
+            models.Index(
+                fields=["home_type", "-created_at"], name="listing_home_type_idx"
+            ),
+            models.Index(
+                fields=["neighborhood", "-created_at"], name="listing_neighborhood_idx"
+            ),
+            # market stats refreshes one ZIP code at a time
+            models.Index(fields=["zipcode"], name="listing_zipcode_idx"),
+        ]
+        constraints = [
+            # at most one featured listing; the partial unique index doubles as
+            # the lookup for the home page and for save() demoting the old one
+            models.UniqueConstraint(
+                fields=["is_featured"],
+                condition=models.Q(is_featured=True),
+                name="listing_single_featured",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.street}, {self.city}, {self.state} {self.zipcode}"
 
     # --- photos helpers ---
+    @cached_property
+    def cover_photo(self):
+        # use the photo loaded by with_cover_photo() when it's there
+        if hasattr(self, "cover_photos"):
+            return self.cover_photos[0] if self.cover_photos else None
+        return self.photos.order_by("sort_order", "id").first()
+
     def main_photo(self):
-        p = self.photos.order_by("sort_order", "id").first()
+        p = self.cover_photo
         return p.image.url if p else ""
 
     @property
@@ -120,35 +279,503 @@ class Listing(models.Model):
         return reverse("public_listing_detail", args=[self.pk])
 
     # --- ensure only one listing is featured at a time ---
+    def validate_constraints(self, exclude=None):
+        # save() demotes the current featured listing, so featuring another
+        # one from the admin form isn't a uniqueness error
+        exclude = set(exclude or ()) | {"is_featured"}
+        super().validate_constraints(exclude=exclude)
+
+    def locate(self):
+        """Fill missing coordinates from the ZIP centroid and refresh the geohash."""
+        if self.latitude is None or self.longitude is None:
+            centroid = (
+                ZipCentroid.objects.filter(zipcode=(self.zipcode or "")[:5])
+                .values_list("latitude", "longitude")
+                .first()
+            )
+            if centroid:
+                self.latitude, self.longitude = centroid
+        if self.latitude is None or self.longitude is None:
+            self.geohash = None
+        else:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = instance.tracked_values()
+        return instance
+
+    def tracked_values(self):
+        """The fields market stats depend on, as save() last saw them."""
+        return {name: self.__dict__.get(name) for name in TRACKED_FIELDS}
+
     def save(self, *args, **kwargs):
-        super_result = super().save(*args, **kwargs)
-        if self.is_featured:
-            Listing.objects.exclude(pk=self.pk).update(is_featured=False)
-        return super_result
+        self.price_range_id = price_range_index().lookup(self.price)
+        self.locate()
+        loaded = getattr(self, "_loaded", None)
+        with transaction.atomic():
+            if loaded is None and self.pk is not None:
+                # an instance built by hand rather than loaded: ask the table
+                loaded = Listing.objects.filter(pk=self.pk).values(*TRACKED_FIELDS).first()
+                self._loaded = loaded
+            if loaded is not None and loaded["status"] != self.status:
+                self.status_changed_at = timezone.now()
+            if self.is_featured:
+                # listing_single_featured allows one featured row, so this
+                # demotes at most one listing, found through its index
+                Listing.objects.filter(is_featured=True).exclude(pk=self.pk).update(
+                    is_featured=False, updated_at=timezone.now()
+                )
+            super().save(*args, **kwargs)
+            events = ListingEvent.changes(self, loaded)
+            if events:
+                ListingEvent.objects.bulk_create(events)
+        # the post_save signal has compared against the loaded values by now
+        self._loaded = self.tracked_values()
+
+
+class ListingEvent(models.Model):
+    """
+    Append-only history of a listing's status, price and visibility.
+    Listing.save() (and the feed importer) writes a row in the same
+    transaction as every change, holding the listing's state after it, so
+    the latest row at or before a moment is the listing's state then. Rows
+    outlive their listing; a final "deleted" row closes the history.
+    See listings.history for the queries and monthly compaction.
+    """
+    KIND_CHOICES = [
+        ("listed", "Listed"),
+        ("status", "Status change"),
+        ("price", "Price change"),
+        ("visibility", "Visibility change"),
+        ("deleted", "Deleted"),
+    ]
+
+    # no database constraint, so history survives the listing
+    listing = models.ForeignKey(
+        Listing, on_delete=models.DO_NOTHING, db_constraint=False, related_name="events"
+    )
+    at = models.DateTimeField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=Listing.STATUS_CHOICES)
+    visibility = models.CharField(max_length=1, choices=Listing.VISIBILITY_CHOICES)
+    price = models.IntegerField()
+    # the price before a "price" event
+    old_price = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["at", "id"]
+        indexes = [
+            # one listing's history: days on market
+            models.Index(fields=["listing", "at"], name="listingevent_listing_idx"),
+            # a time window, as status IN (...) AND at range: as-of queries
+            # and status changes in a period
+            models.Index(fields=["status", "at"], name="listingevent_status_idx"),
+            models.Index(fields=["at"], condition=models.Q(kind="price"), name="listingevent_price_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for listing {self.listing_id} at {self.at:%Y-%m-%d %H:%M}"
+
+    @property
+    def is_price_cut(self):
+        return self.kind == "price" and self.old_price is not None and self.price < self.old_price
+
+    @classmethod
+    def changes(cls, listing, before, at=None):
+        """
+        Unsaved events for ``listing``'s status, price and visibility changes
+        since ``before`` (its tracked values); None means it was just listed.
+        """
+        state = {
+            "listing_id": listing.pk,
+            "at": at or listing.updated_at or timezone.now(),
+            "status": listing.status,
+            "visibility": listing.visibility,
+            "price": listing.price,
+        }
+        if before is None:
+            return [cls(kind="listed", **state)]
+        events = []
+        if before["status"] != listing.status:
+            events.append(cls(kind="status", **state))
+        if before["price"] != listing.price:
+            events.append(cls(kind="price", old_price=before["price"], **state))
+        if before["visibility"] != listing.visibility:
+            events.append(cls(kind="visibility", **state))
+        return events
+
+
+class ListingMonthSnapshot(models.Model):
+    """
+    The listings on the market (active or pending, and visible) at the
+    start of a month, written by listings.history.compact(). As-of queries
+    start from the snapshot of their month and replay only that month's
+    events; older events can then be dropped.
+    """
+    month = models.DateField()  # first day of the month
+    listing = models.ForeignKey(
+        Listing, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    status = models.CharField(max_length=20, choices=Listing.STATUS_CHOICES)
+    price = models.IntegerField()
+
+    class Meta:
+        ordering = ["month", "listing"]
+        constraints = [
+            models.UniqueConstraint(fields=["month", "listing"], name="listingmonthsnapshot_unique"),
+        ]
+
+    def __str__(self):
+        return f"Listing {self.listing_id} on {self.month:%Y-%m}"
 
 
 def listing_upload_path(instance, filename):
-    # photos stored under listing_photos/<listing_id>/<filename>
+    # the photo storage files the bytes under their SHA-256 and keeps only
+    # the extension; this is the name plain storages would use
     return f"listing_photos/{instance.listing_id}/{filename}"
 
 
+def variant_names(variants):
+    return [name for sources in variants.get("sources", {}).values() for _, name in sources]
+
+
+UPSERT_BATCH_SIZE = 300
+UPSERT_BLOBS_SQL = """
+INSERT INTO {table} (name, refs, updated_at) VALUES {rows}
+ON CONFLICT (name) DO UPDATE SET refs = {table}.refs + excluded.refs, updated_at = excluded.updated_at
+"""
+
+
+class PhotoBlob(models.Model):
+    """
+    How many photos use a stored file, as their original or one of its
+    variants. Identical uploads share one file in the content-addressed
+    photo storage, so a file can only go once nothing counts it; GC
+    (listings.blobs.collect) deletes the files whose count reached zero.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    refs = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["name"]
+        indexes = [
+            models.Index(fields=["updated_at"], condition=models.Q(refs__lte=0), name="photoblob_unused_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refs})"
+
+    @classmethod
+    def count(cls, names, delta=1):
+        """Add ``delta`` references to each of ``names`` (once per occurrence)."""
+        counts = {}
+        for name in names:
+            if name:
+                counts[name] = counts.get(name, 0) + delta
+        if not counts:
+            return
+        # one upsert that adds to the stored count, so concurrent writers
+        # can't both insert a name and lose a reference
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        table = connection.ops.quote_name(cls._meta.db_table)
+        items = sorted(counts.items())
+        for start in range(0, len(items), UPSERT_BATCH_SIZE):
+            batch = items[start:start + UPSERT_BATCH_SIZE]
+            sql = UPSERT_BLOBS_SQL.format(table=table, rows=", ".join(["(%s, %s, %s)"] * len(batch)))
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [value for name, change in batch for value in (name, change, now)])
+
+
 class ListingPhoto(models.Model):
+    PROCESSING_CHOICES = [
+        ("pending", "Pending"),
+        ("processing", "Processing"),
+        ("ready", "Ready"),
+        ("failed", "Failed"),
+    ]
+
     listing = models.ForeignKey(
         Listing, on_delete=models.CASCADE, related_name="photos"
     )
-    image = models.ImageField(upload_to=listing_upload_path)
+    image = models.ImageField(upload_to=listing_upload_path, storage=photo_storage)
     caption = models.CharField(max_length=255, blank=True)
     sort_order = models.PositiveIntegerField(default=0)
     mime_type = models.CharField(max_length=50, blank=True)
+    # resized copies written by listings.images.build_variants()
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+    # variants are built in the background by the "listings.process_photo" job
+    processing_status = models.CharField(
+        max_length=10,
+        choices=PROCESSING_CHOICES,
+        default="pending",
+        editable=False,
+    )
 
     class Meta:
         ordering = ["sort_order", "id"]
+        indexes = [
+            models.Index(
+                fields=["listing", "sort_order", "id"], name="listingphoto_order_idx"
+            ),
+            # photos sharing a stored file
+            models.Index(fields=["image"], name="listingphoto_image_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         if self.image and not self.mime_type:
             f = getattr(self.image, "file", None)
             self.mime_type = getattr(f, "content_type", "") if f else ""
-        super().save(*args, **kwargs)
+        image_changed = self._state.adding or self.image.name != self._loaded_image
+        if self.image and image_changed:
+            self.processing_status = "pending"
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if image_changed:
+                # the old variants are released when the new ones replace them
+                PhotoBlob.count([self.image.name])
+                PhotoBlob.count([getattr(self, "_loaded_image", None)], -1)
+        if self.image and image_changed:
+            enqueue("listings.process_photo", photo_id=self.pk)
+        self._loaded_image = self.image.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored file so save() only reprocesses real changes
+        instance._loaded_image = instance.__dict__.get("image")
+        return instance
+
+    @property
+    def is_ready(self):
+        return self.processing_status == "ready"
+
+    def stored_names(self):
+        """The original and every variant file this photo uses."""
+        return [self.image.name] + variant_names(self.variants)
+
+    # --- variant helpers ---
+    def variant_sources(self, fmt):
+        """[(width, url), ...] for one format, smallest first."""
+        if not self.is_ready:
+            return []
+        return [
+            (width, self.image.storage.url(name))
+            for width, name in self.variants.get("sources", {}).get(fmt, [])
+        ]
+
+    def srcset(self, fmt=FALLBACK_FORMAT):
+        return ", ".join(f"{url} {width}w" for width, url in self.variant_sources(fmt))
+
+    def variant_url(self, width, fmt=FALLBACK_FORMAT):
+        """Smallest variant at least ``width`` wide, else the largest, else the original."""
+        sources = self.variant_sources(fmt)
+        for w, url in sources:
+            if w >= width:
+                return url
+        if sources:
+            return sources[-1][1]
+        return self.image.url if self.image else ""
+
+    def picture(self):
+        """
+        What responsive_image needs to render this photo, as plain data:
+        {"src", "hero"} for the original, plus "srcset", "sources" (one
+        [mime type, srcset] per modern format), "width" and "height" once
+        the variants are ready. None without an image.
+        """
+        if not self.image:
+            return None
+        if not self.is_ready or not self.variants.get("sources"):
+            return {"src": self.image.url, "hero": self.image.url}
+        return {
+            "src": self.variant_url(640),
+            "hero": self.variant_url(1920),
+            "srcset": self.srcset(FALLBACK_FORMAT),
+            "sources": [
+                [FORMATS[fmt][2], self.srcset(fmt)]
+                for fmt in self.variants["sources"]
+                if fmt != FALLBACK_FORMAT
+            ],
+            "width": self.variants["width"],
+            "height": self.variants["height"],
+        }
+
+    def stored_picture(self):
+        """
+        The file names picture() is built from, for ListingCard.photo: URLs
+        are only worked out when a card renders, so a new MEDIA_URL or
+        storage host doesn't leave stale ones on the cards.
+        """
+        if not self.image:
+            return None
+        return {"image": self.image.name, "variants": self.variants if self.is_ready else {}}
 
     def __str__(self):
         return f"Photo {self.id} for {self.listing}"
+
+
+class ListingCard(models.Model):
+    """
+    Read model behind the public listing grids: one row per public listing
+    holding everything its card shows, already formatted, plus copies of the
+    columns the browse page filters and sorts on. listings.cards keeps it
+    current from signals; rebuild_listing_cards rewrites it.
+    """
+    listing = models.OneToOneField(
+        Listing, on_delete=models.CASCADE, primary_key=True, related_name="card"
+    )
+
+    # filter and sort keys, copied from the listing
+    created_at = models.DateTimeField()
+    price = models.IntegerField()
+    sqft_sort = models.PositiveIntegerField(default=0)
+    beds = models.DecimalField(max_digits=2, decimal_places=0, null=True)
+    baths = models.DecimalField(max_digits=3, decimal_places=1, null=True)
+    zipcode = models.CharField(max_length=10)
+    # no database constraint: deleting a neighborhood or home type clears
+    # these through listings.cards rather than a cascade
+    neighborhood = models.ForeignKey(
+        Neighborhood, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name="+"
+    )
+    home_type = models.ForeignKey(
+        HomeType, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name="+"
+    )
+    is_featured = models.BooleanField(default=False)
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    geohash = models.CharField(max_length=geo.PRECISION, null=True)
+
+    # display
+    street = models.CharField(max_length=255)
+    city = models.CharField(max_length=100)
+    state = models.CharField(max_length=2)
+    price_display = models.CharField(max_length=20)
+    meta_display = models.CharField(max_length=100)
+    neighborhood_name = models.CharField(max_length=100, blank=True)
+    home_type_name = models.CharField(max_length=40, blank=True)
+    # ListingPhoto.stored_picture() of the cover photo; see picture
+    photo = models.JSONField(null=True, blank=True)
+    # when the row was last written; keys the card fragment caches
+    refreshed_at = models.DateTimeField()
+
+    objects = LocatedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["-created_at", "-listing"]
+        indexes = [
+            models.Index(fields=["-created_at", "-listing"], name="card_newest_idx"),
+            models.Index(fields=["price", "listing"], name="card_price_idx"),
+            models.Index(fields=["-sqft_sort", "-listing"], name="card_sqft_idx"),
+            models.Index(fields=["geohash", "latitude", "longitude"], name="card_geohash_idx"),
+            models.Index(
+                fields=["neighborhood", "-created_at", "-listing"], name="card_neighborhood_idx"
+            ),
+            models.Index(
+                fields=["home_type", "-created_at", "-listing"], name="card_home_type_idx"
+            ),
+            models.Index(
+                fields=["is_featured"],
+                condition=models.Q(is_featured=True),
+                name="card_featured_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.street}, {self.city}, {self.state} {self.zipcode}"
+
+    @property
+    def chip(self):
+        return self.neighborhood_name or self.home_type_name
+
+    @cached_property
+    def picture(self):
+        """The cover photo's picture() data, with URLs from the current storage."""
+        if not self.photo:
+            return None
+        return ListingPhoto(
+            image=self.photo["image"], variants=self.photo["variants"], processing_status="ready"
+        ).picture()
+
+    def get_absolute_url(self):
+        return reverse("public_listing_detail", args=[self.pk])
+
+
+class PhotoUpload(models.Model):
+    """A resumable, chunked photo upload in progress (see listings.uploads)."""
+    STATUS_CHOICES = [
+        ("uploading", "Uploading"),
+        ("complete", "Complete"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    listing = models.ForeignKey(
+        Listing, on_delete=models.CASCADE, related_name="uploads"
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="uploading")
+    photo = models.OneToOneField(
+        ListingPhoto, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+
+
+class MarketStat(models.Model):
+    """
+    Market numbers for one neighborhood, home type or ZIP code (or the whole
+    market), rolled up by listings.stats. Prices, price per sqft and days on
+    market are over active listings; days to sell over sold ones.
+    """
+    DIMENSION_CHOICES = [
+        ("all", "All listings"),
+        ("neighborhood", "Neighborhood"),
+        ("home_type", "Home type"),
+        ("zipcode", "ZIP code"),
+    ]
+
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    # neighborhood or home type id, or the ZIP code; empty for "all"
+    key = models.CharField(max_length=20, blank=True)
+    label = models.CharField(max_length=100)
+
+    # inventory
+    active_count = models.PositiveIntegerField(default=0)
+    pending_count = models.PositiveIntegerField(default=0)
+    sold_count = models.PositiveIntegerField(default=0)
+    new_count = models.PositiveIntegerField(default=0)  # listed in the last NEW_DAYS
+
+    # nearest-rank percentiles
+    price_p10 = models.IntegerField(null=True)
+    price_p25 = models.IntegerField(null=True)
+    price_p50 = models.IntegerField(null=True)
+    price_p75 = models.IntegerField(null=True)
+    price_p90 = models.IntegerField(null=True)
+    price_per_sqft_p50 = models.FloatField(null=True)
+    days_on_market_p50 = models.FloatField(null=True)
+    days_to_sell_p50 = models.FloatField(null=True)
+
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["dimension", "label"]
+        constraints = [
+            models.UniqueConstraint(fields=["dimension", "key"], name="marketstat_group_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_dimension_display()}: {self.label}"
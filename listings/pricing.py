@@ -0,0 +1,119 @@
+"""
+Deriving Listing.price_range from Listing.price.
+
+PriceRange rows are loaded into a sorted interval index once per process and
+looked up with bisect. The index is keyed on a stamp read from the table
+(row count, newest id and newest updated_at), so a range added, edited or
+deleted by any process -- the admin, the job worker, a bulk_create -- is
+seen by the next save everywhere; reading the stamp is one aggregate over a
+handful of rows. Writes through update() must set updated_at themselves.
+
+Rows may overlap or leave gaps: a price belongs to the range with the
+largest ``min_price`` not above it, if that range's ``max_price`` still
+covers it. reconcile() applies the same rule to every listing in one UPDATE
+per range.
+"""
+from bisect import bisect_right
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from . import caching
+
+
+class PriceRangeIndex:
+    def __init__(self, ranges):
+        """``ranges`` is an iterable of (pk, min_price, max_price, label)."""
+        self.ranges = sorted(ranges, key=lambda r: (r[1], r[0]))
+        self._mins = [r[1] for r in self.ranges]
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def lookup(self, price):
+        """The pk of the range holding ``price``, or None."""
+        if price is None:
+            return None
+        i = bisect_right(self._mins, price) - 1
+        if i < 0 or price > self.ranges[i][2]:
+            return None
+        return self.ranges[i][0]
+
+    def intervals(self):
+        """(pk, low, high) with overlaps resolved the way lookup() resolves them."""
+        for i, (pk, low, high, _) in enumerate(self.ranges):
+            if i + 1 < len(self.ranges):
+                high = min(high, self._mins[i + 1] - 1)
+            if high >= low:
+                yield pk, low, high
+
+
+def price_ranges_stamp():
+    """Changes whenever a PriceRange row is added, edited or deleted."""
+    from .models import PriceRange
+
+    row = PriceRange.objects.aggregate(n=Count("id"), last=Max("id"), updated=Max("updated_at"))
+    updated = row["updated"].isoformat() if row["updated"] else ""
+    return f"{row['n']}:{row['last']}:{updated}"
+
+
+def price_ranges(stamp=None):
+    """PriceRange rows as (pk, min, max, label), cached under the table's stamp."""
+    from .models import PriceRange
+
+    key = f"listings:price_ranges:{stamp or price_ranges_stamp()}"
+    return cache.get_or_set(
+        key,
+        lambda: [(r.pk, r.min_price, r.max_price, str(r)) for r in PriceRange.objects.all()],
+        None,
+    )
+
+
+_index = (None, None)
+
+
+def price_range_index():
+    global _index
+    stamp = price_ranges_stamp()
+    if _index[0] != stamp:
+        _index = (stamp, PriceRangeIndex(price_ranges(stamp)))
+    return _index[1]
+
+
+def price_ranges_changed():
+    """Drop this process's index; the stamp already tells every process."""
+    global _index
+    _index = (None, None)
+
+
+def reconcile():
+    """
+    Point every listing at the range its price falls in, touching only the
+    rows that are wrong. Returns the number of listings changed.
+    """
+    from .models import Listing
+
+    # built here, not taken from the module's index: this often runs in the
+    # job worker right after the ranges changed
+    index = PriceRangeIndex(price_ranges())
+    changed = 0
+    covered = Q(pk__in=[])
+    with transaction.atomic():
+        for pk, low, high in index.intervals():
+            in_range = Q(price__gte=low, price__lte=high)
+            covered |= in_range
+            changed += (
+                Listing.objects.filter(in_range)
+                .exclude(price_range_id=pk)
+                .update(price_range_id=pk)
+            )
+        changed += (
+            Listing.objects.exclude(covered)
+            .filter(price_range__isnull=False)
+            .update(price_range_id=None)
+        )
+    if changed:
+        # update() skips signals; the range label shows on every page
+        caching.shared_changed()
+    return changed
@@ -0,0 +1,191 @@
+"""
+Full-text listing search on SQLite FTS5.
+
+``listings_listing_fts`` holds one row per listing (rowid = listing id) with
+its address, description, neighborhood name and home-type name. Triggers on
+the listing, neighborhood and home-type tables keep it current on every
+write, including queryset.update() and bulk_create(), which skip signals.
+
+The table and triggers aren't models, so migrations don't know about them.
+ensure_schema() runs after every migrate and recreates whatever is missing
+(SQLite drops a table's triggers when a migration rebuilds that table),
+re-indexing everything when it had to. ``manage.py rebuild_search_index``
+re-indexes by hand.
+
+On other databases search() falls back to ``icontains`` lookups.
+"""
+import re
+from functools import reduce
+from operator import and_, or_
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q
+
+TABLE = "listings_listing_fts"
+FIELDS = ("street", "city", "zipcode", "description")
+# bm25 weight per FTS column: an address hit beats a description hit
+WEIGHTS = {
+    "street": 10.0,
+    "city": 4.0,
+    "zipcode": 8.0,
+    "description": 1.0,
+    "neighborhood": 5.0,
+    "home_type": 3.0,
+}
+MAX_TERMS = 8
+TOKEN = re.compile(r"\w+")
+
+CREATE_TABLE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+    {", ".join(WEIGHTS)},
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+# the indexed row for listing NEW/listing l, names looked up by primary key
+_ROW = """
+    {alias}.street, {alias}.city, {alias}.zipcode, {alias}.description,
+    (SELECT name FROM listings_neighborhood WHERE id = {alias}.neighborhood_id),
+    (SELECT type_name FROM listings_hometype WHERE id = {alias}.home_type_id)
+"""
+
+TRIGGERS = {
+    "listings_fts_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS listings_fts_insert
+        AFTER INSERT ON listings_listing BEGIN
+            INSERT INTO {TABLE} (rowid, {", ".join(WEIGHTS)})
+            VALUES (new.id, {_ROW.format(alias="new")});
+        END
+    """,
+    "listings_fts_update": f"""
+        CREATE TRIGGER IF NOT EXISTS listings_fts_update
+        AFTER UPDATE OF street, city, zipcode, description, neighborhood_id, home_type_id
+        ON listings_listing BEGIN
+            DELETE FROM {TABLE} WHERE rowid = old.id;
+            INSERT INTO {TABLE} (rowid, {", ".join(WEIGHTS)})
+            VALUES (new.id, {_ROW.format(alias="new")});
+        END
+    """,
+    "listings_fts_delete": f"""
+        CREATE TRIGGER IF NOT EXISTS listings_fts_delete
+        AFTER DELETE ON listings_listing BEGIN
+            DELETE FROM {TABLE} WHERE rowid = old.id;
+        END
+    """,
+    "listings_fts_neighborhood": f"""
+        CREATE TRIGGER IF NOT EXISTS listings_fts_neighborhood
+        AFTER UPDATE OF name ON listings_neighborhood BEGIN
+            UPDATE {TABLE} SET neighborhood = new.name
+            WHERE rowid IN (SELECT id FROM listings_listing WHERE neighborhood_id = new.id);
+        END
+    """,
+    "listings_fts_home_type": f"""
+        CREATE TRIGGER IF NOT EXISTS listings_fts_home_type
+        AFTER UPDATE OF type_name ON listings_hometype BEGIN
+            UPDATE {TABLE} SET home_type = new.type_name
+            WHERE rowid IN (SELECT id FROM listings_listing WHERE home_type_id = new.id);
+        END
+    """,
+}
+
+
+def available(using=DEFAULT_DB_ALIAS):
+    return connections[using].vendor == "sqlite"
+
+
+# ---------- schema ---------- #
+
+def _existing(cursor):
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name IN (%s)"
+        % ", ".join(["%s"] * (len(TRIGGERS) + 1)),
+        [TABLE, *TRIGGERS],
+    )
+    return {name for (name,) in cursor.fetchall()}
+
+
+def ensure_schema(using=DEFAULT_DB_ALIAS):
+    """
+    Create the FTS table and triggers if any are missing, then re-index.
+    Returns the number of listings indexed (0 when nothing was missing).
+    """
+    if not available(using):
+        return 0
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'listings_listing'"
+        )
+        if cursor.fetchone() is None:
+            return 0  # listings not migrated yet
+        missing = {TABLE, *TRIGGERS} - _existing(cursor)
+        if not missing:
+            return 0
+        cursor.execute(CREATE_TABLE)
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+    return rebuild(using)
+
+
+def rebuild(using=DEFAULT_DB_ALIAS):
+    """Re-index every listing from scratch; returns the row count."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(
+            f"INSERT INTO {TABLE} (rowid, {', '.join(WEIGHTS)}) "
+            f"SELECT l.id, {_ROW.format(alias='l')} FROM listings_listing l"
+        )
+        count = cursor.rowcount
+        # merge the b-tree segments the bulk insert left behind
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return count
+
+
+# ---------- queries ---------- #
+
+def match_expression(query, prefix=True):
+    """
+    Turn user input into an FTS5 MATCH expression: every word must appear,
+    and with ``prefix`` the last one may be incomplete ("123 ma" finds
+    "123 Maple St"). Returns "" when there is nothing to search for.
+    """
+    terms = TOKEN.findall(query.lower())[:MAX_TERMS]
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    if prefix:
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _icontains(queryset, query):
+    terms = query.split()
+    if not terms:
+        return queryset
+    return queryset.filter(
+        reduce(and_, (
+            reduce(or_, (Q(**{f"{field}__icontains": term}) for field in FIELDS))
+            for term in terms
+        ))
+    )
+
+
+def search(queryset, query, prefix=True):
+    """
+    Narrow a Listing queryset to full-text matches for ``query``, best match
+    first (an explicit order_by() afterwards replaces the ranking).
+    """
+    if not available(queryset.db):
+        return _icontains(queryset, query)
+    match = match_expression(query, prefix=prefix)
+    if not match:
+        return queryset.none()
+    weights = ", ".join(str(weight) for weight in WEIGHTS.values())
+    return queryset.extra(
+        tables=[TABLE],
+        where=[f"{TABLE}.rowid = listings_listing.id", f"{TABLE} MATCH %s"],
+        params=[match],
+        select={"search_rank": f"bm25({TABLE}, {weights})"},
+        order_by=["search_rank", "-id"],
+    )
@@ -0,0 +1,99 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from jobs.queue import enqueue
+
+from . import caching, cards, pricing, stats
+from .models import HomeType, Listing, ListingEvent, ListingPhoto, MarketStat, Neighborhood, PhotoBlob, PriceRange
+
+
+@receiver([post_save, post_delete], sender=Listing)
+def listing_changed(sender, instance, **kwargs):
+    caching.listing_changed(instance.pk)
+
+
+@receiver(post_delete, sender=Listing)
+def listing_deleted_event(sender, instance, **kwargs):
+    # sent inside the delete's transaction, so the log never misses one
+    ListingEvent.objects.create(
+        listing_id=instance.pk,
+        at=timezone.now(),
+        kind="deleted",
+        status=instance.status,
+        visibility=instance.visibility,
+        price=instance.price,
+    )
+
+
+@receiver([post_save, post_delete], sender=ListingPhoto)
+def listing_photo_changed(sender, instance, **kwargs):
+    caching.photos_changed(instance.listing_id)
+
+
+@receiver(post_save, sender=Listing)
+def listing_card_changed(sender, instance, **kwargs):
+    cards.refresh([instance.pk])
+    cards.featured_changed(instance)
+
+
+@receiver(post_delete, sender=ListingPhoto)
+def listing_photo_deleted(sender, instance, **kwargs):
+    # the files stay until blobs.collect() finds nothing else uses them
+    PhotoBlob.count(instance.stored_names(), -1)
+
+
+@receiver([post_save, post_delete], sender=ListingPhoto)
+def listing_photo_card_changed(sender, instance, origin=None, **kwargs):
+    # deleting a listing deletes its card as well as its photos
+    if isinstance(origin, Listing) or (isinstance(origin, QuerySet) and origin.model is Listing):
+        return
+    cards.refresh([instance.listing_id])
+
+
+@receiver(post_save, sender=Neighborhood)
+@receiver(post_save, sender=HomeType)
+def lookup_card_changed(sender, instance, **kwargs):
+    cards.lookup_changed(instance)
+
+
+@receiver(post_delete, sender=Neighborhood)
+@receiver(post_delete, sender=HomeType)
+def lookup_card_deleted(sender, instance, **kwargs):
+    cards.lookup_changed(instance, deleted=True)
+
+
+@receiver([post_save, post_delete], sender=Neighborhood)
+@receiver([post_save, post_delete], sender=HomeType)
+@receiver([post_save, post_delete], sender=PriceRange)
+def shared_row_changed(sender, **kwargs):
+    caching.shared_changed()
+
+
+@receiver([post_save, post_delete], sender=PriceRange)
+def price_range_changed(sender, **kwargs):
+    pricing.price_ranges_changed()
+    enqueue("listings.reconcile_price_ranges")
+
+
+@receiver([post_save, post_delete], sender=Listing)
+def listing_stats_changed(sender, instance, signal, **kwargs):
+    groups = stats.changed_groups(instance, deleted=signal is post_delete)
+    if groups:
+        stats.queue_refresh(groups)
+
+
+@receiver(post_delete, sender=Neighborhood)
+@receiver(post_delete, sender=HomeType)
+def lookup_stats_deleted(sender, instance, **kwargs):
+    # its listings moved out of the group without signals
+    dimension = "neighborhood" if sender is Neighborhood else "home_type"
+    stats.queue_refresh([(dimension, str(instance.pk))])
+
+
+@receiver(post_save, sender=Neighborhood)
+@receiver(post_save, sender=HomeType)
+def lookup_stats_renamed(sender, instance, **kwargs):
+    dimension = "neighborhood" if sender is Neighborhood else "home_type"
+    MarketStat.objects.filter(dimension=dimension, key=str(instance.pk)).update(label=str(instance))
@@ -0,0 +1,227 @@
+"""
+Market statistics rolled up per neighborhood, home type and ZIP code.
+
+Each dimension is computed by one SQL query: window functions rank the
+listings of every (group, status) partition by price, price per sqft and
+days on market, and a grouped SELECT picks the rows at the nearest-rank
+percentile positions, so SQLite sorts the rows and Python only ever sees
+one row per group. The results are stored in MarketStat, which is all the
+stats page and the API read.
+
+Listing saves and deletes queue a refresh of just the groups the listing
+was in before and after the change (see listings.signals); bulk writes
+queue a full refresh, and ``manage.py refresh_market_stats`` (run daily,
+since days on market grow by themselves) recomputes everything. Refreshes
+queued while one is still waiting are folded into it (queue_refresh()), so
+a burst of saves costs one run, and one whole-market rollup.
+
+Days on market run from created_at to the last status change, or to now
+for active listings; rows without a recorded change use updated_at.
+julianday() makes this SQLite-only, like the search index.
+"""
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import enqueue
+
+from .models import HomeType, MarketStat, Neighborhood
+
+PERCENTILES = (10, 25, 50, 75, 90)
+NEW_DAYS = 30
+# how long a queued refresh waits for more changes to fold in
+REFRESH_DELAY = timedelta(seconds=10)
+ALL_LABEL = "All of Omaha"
+
+# dimension -> grouping column ("" groups every listing together)
+DIMENSIONS = {
+    "all": "''",
+    "neighborhood": "neighborhood_id",
+    "home_type": "home_type_id",
+    "zipcode": "zipcode",
+}
+# the MarketStat fields filled from each rollup row, in column order
+STAT_FIELDS = (
+    ["active_count", "pending_count", "sold_count", "new_count"]
+    + [f"price_p{p}" for p in PERCENTILES]
+    + ["price_per_sqft_p50", "days_on_market_p50", "days_to_sell_p50"]
+)
+
+
+def _at(rank, count, percentile, value, status="active"):
+    # the nearest-rank position is ceil(percentile * count / 100)
+    return (
+        f"MIN(CASE WHEN status = '{status}' AND {rank} = ({percentile} * {count} + 99) / 100 "
+        f"THEN {value} END)"
+    )
+
+
+# one per STAT_FIELDS entry
+COLUMNS = (
+    [
+        "SUM(status = 'active')",
+        "SUM(status = 'pending')",
+        "SUM(status = 'sold')",
+        "SUM(status = 'active' AND created_at >= %s)",
+    ]
+    + [_at("price_rank", "n", p, "price") for p in PERCENTILES]
+    + [
+        _at("ppsf_rank", "n_ppsf", 50, "ppsf"),
+        _at("dom_rank", "n", 50, "dom"),
+        _at("dom_rank", "n", 50, "dom", status="sold"),
+    ]
+)
+
+ROLLUP_SQL = """
+WITH ranked AS (
+    SELECT
+        grp, status, price, ppsf, dom, created_at,
+        COUNT(*) OVER by_status AS n,
+        COUNT(ppsf) OVER by_status AS n_ppsf,
+        ROW_NUMBER() OVER (by_status ORDER BY price) AS price_rank,
+        ROW_NUMBER() OVER (by_status ORDER BY ppsf IS NULL, ppsf) AS ppsf_rank,
+        ROW_NUMBER() OVER (by_status ORDER BY dom) AS dom_rank
+    FROM (
+        SELECT
+            {group} AS grp, status, price, created_at,
+            CASE WHEN sqft > 0 THEN CAST(price AS REAL) / sqft END AS ppsf,
+            julianday(CASE WHEN status = 'active' THEN %s
+                      ELSE COALESCE(status_changed_at, updated_at) END)
+                - julianday(created_at) AS dom
+        FROM listings_listing
+        WHERE visibility = 'Y' AND status IN ('active', 'pending', 'sold') {where}
+    )
+    WINDOW by_status AS (PARTITION BY grp, status)
+)
+SELECT grp, {columns}
+FROM ranked
+GROUP BY grp
+"""
+
+
+def rollup(dimension, keys=None, now=None):
+    """
+    {group key: [values in STAT_FIELDS order]} for ``dimension``, limited to
+    the groups in ``keys`` when given.
+    """
+    column = DIMENSIONS[dimension]
+    now = now or timezone.now()
+    adapt = connection.ops.adapt_datetimefield_value
+    # parameters in the order they appear: now, the keys, new_count's cutoff
+    params, where = [adapt(now)], ""
+    if keys is not None:
+        where = f"AND {column} IN ({', '.join(['%s'] * len(keys))})"
+        params.extend(keys)
+    elif dimension != "all":
+        where = f"AND {column} IS NOT NULL"
+    params.append(adapt(now - timedelta(days=NEW_DAYS)))
+    sql = ROLLUP_SQL.format(group=column, where=where, columns=", ".join(COLUMNS))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {str(row[0]): list(row[1:]) for row in cursor.fetchall()}
+
+
+def _labels(dimension, keys):
+    if dimension == "neighborhood":
+        return {str(pk): name for pk, name in Neighborhood.objects.filter(pk__in=keys).values_list("pk", "name")}
+    if dimension == "home_type":
+        return {str(pk): name for pk, name in HomeType.objects.filter(pk__in=keys).values_list("pk", "type_name")}
+    if dimension == "zipcode":
+        return {key: key for key in keys}
+    return {"": ALL_LABEL}
+
+
+def refresh(groups=None):
+    """
+    Recompute the MarketStat rows for ``groups`` ([(dimension, key), ...]),
+    or for everything. Groups left without listings lose their row.
+    Returns how many rows were written.
+    """
+    now = timezone.now()
+    written = 0
+    for dimension in DIMENSIONS:
+        if groups is None:
+            keys = None
+        else:
+            keys = sorted({str(key) for dim, key in groups if dim == dimension})
+            if not keys:
+                continue
+        # the whole-market row has no key to filter on
+        rows = rollup(dimension, None if dimension == "all" else keys, now)
+        labels = _labels(dimension, list(rows))
+        MarketStat.objects.bulk_create(
+            [
+                MarketStat(
+                    dimension=dimension,
+                    key=key,
+                    label=labels.get(key, key),
+                    computed_at=now,
+                    **dict(zip(STAT_FIELDS, values)),
+                )
+                for key, values in rows.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["dimension", "key"],
+            update_fields=STAT_FIELDS + ["label", "computed_at"],
+        )
+        stale = MarketStat.objects.filter(dimension=dimension).exclude(key__in=list(rows))
+        if keys is not None and dimension != "all":
+            stale = stale.filter(key__in=keys)
+        stale.delete()
+        written += len(rows)
+    return written
+
+
+def listing_groups(values):
+    """The (dimension, key) groups a listing with these tracked values counts in."""
+    groups = [("all", "")]
+    for dimension, column in DIMENSIONS.items():
+        if dimension != "all" and values.get(column) not in (None, ""):
+            groups.append((dimension, str(values[column])))
+    return groups
+
+
+def changed_groups(listing, deleted=False):
+    """
+    Groups to refresh after ``listing`` was saved or deleted: the ones it
+    was in before and after, or none when nothing the stats use changed.
+    """
+    current = listing.tracked_values()
+    loaded = getattr(listing, "_loaded", None)
+    if deleted or loaded is None:
+        return listing_groups(current)
+    if loaded == current:
+        return []
+    return sorted(set(listing_groups(loaded)) | set(listing_groups(current)))
+
+
+def queue_refresh(groups=None):
+    """
+    Queue a refresh of ``groups`` (None: everything), or add them to the
+    refresh already waiting in the queue.
+    """
+    if groups is not None:
+        groups = {tuple(group) for group in groups}
+    pending = Job.objects.filter(task="listings.refresh_market_stats", status="queued")
+    job = pending.order_by("run_after", "id").values("pk", "payload").first()
+    if job is not None:
+        if job["payload"].get("groups") is None:
+            return  # a full refresh covers them
+        if groups is not None:
+            groups |= {tuple(group) for group in job["payload"]["groups"]}
+        payload = {} if groups is None else {"groups": sorted(groups)}
+        # the filter on status misses if a worker claimed the job meanwhile
+        if pending.filter(pk=job["pk"]).update(payload=payload):
+            return
+    payload = {} if groups is None else {"groups": sorted(groups)}
+    enqueue("listings.refresh_market_stats", delay=REFRESH_DELAY, **payload)
+
+
+def grouped():
+    """MarketStat rows by dimension, for the stats page and API."""
+    stats = {dimension: [] for dimension, _ in MarketStat.DIMENSION_CHOICES}
+    for stat in MarketStat.objects.all():
+        stats[stat.dimension].append(stat)
+    return stats
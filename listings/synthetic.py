@@ -0,0 +1,105 @@
+"""
+Seeded synthetic listings for benchmarks.
+
+generate() adds listings (and photo rows) spread across neighborhoods, home
+types and price ranges. The same seed and counts always produce the same
+data, so benchmark runs on different machines or commits measure the same
+thing. Photo rows point at image names that don't exist on disk: pages only
+need their URLs.
+"""
+import random
+
+from . import caching, cards, geo, stats
+from .models import HomeType, Listing, ListingEvent, ListingPhoto, Neighborhood, PriceRange
+from .pricing import price_range_index, price_ranges_changed
+
+WORDS = (
+    "maple oak elm cedar birch pine walnut spruce willow aspen brick ranch "
+    "colonial craftsman finished basement updated kitchen garage fenced yard "
+    "hardwood floors deck patio fireplace quiet street near park schools"
+).split()
+CITIES = ("Omaha", "Bellevue", "Papillion", "Elkhorn", "La Vista", "Ralston")
+NEIGHBORHOODS = (
+    "Dundee", "Benson", "Aksarben", "Midtown", "Millard", "Florence",
+    "Field Club", "Gifford Park", "Country Club", "Elmwood Park",
+)
+HOME_TYPES = ("Single Family", "Townhouse", "Condo", "Duplex", "Ranch", "Acreage")
+# (south, west, north, east) of the Omaha metro, where listings are scattered
+METRO_BOX = (41.10, -96.25, 41.36, -95.88)
+PRICE_BANDS = ((0, 149999), (150000, 249999), (250000, 399999), (400000, 649999), (650000, 2000000))
+
+
+def ensure_lookups():
+    """Neighborhood, home type and price range ids, creating the standard rows if missing."""
+    for name in NEIGHBORHOODS:
+        Neighborhood.objects.get_or_create(name=name)
+    for name in HOME_TYPES:
+        HomeType.objects.get_or_create(type_name=name)
+    if not PriceRange.objects.exists():
+        PriceRange.objects.bulk_create(PriceRange(min_price=low, max_price=high) for low, high in PRICE_BANDS)
+        # bulk_create sends no signals
+        price_ranges_changed()
+    return (
+        list(Neighborhood.objects.values_list("pk", flat=True)),
+        list(HomeType.objects.values_list("pk", flat=True)),
+    )
+
+
+def generate(count, photos=0, seed=0, batch_size=1000):
+    """Add ``count`` listings with ``photos`` photo rows each; returns the new listings' ids."""
+    neighborhoods, home_types = ensure_lookups()
+    ranges = price_range_index()
+    # offset by what's there so repeated calls with one seed add new rows
+    start = Listing.objects.filter(mls_id__startswith="SYN-").count()
+    rng = random.Random(f"{seed}:{start}")
+
+    listings = []
+    for n in range(start, start + count):
+        price = rng.randint(60, 1200) * 1000
+        latitude = round(rng.uniform(METRO_BOX[0], METRO_BOX[2]), 6)
+        longitude = round(rng.uniform(METRO_BOX[1], METRO_BOX[3]), 6)
+        listings.append(Listing(
+            mls_id=f"SYN-{seed}-{n}",
+            status=rng.choices(("active", "pending", "sold", "off_market"), weights=(80, 8, 8, 4))[0],
+            visibility="Y" if rng.random() < 0.95 else "N",
+            street=f"{rng.randint(100, 9999)} {rng.choice(WORDS).title()} St",
+            city=rng.choice(CITIES),
+            state="NE",
+            zipcode=str(rng.randint(68101, 68164)),
+            price=price,
+            beds=rng.randint(1, 6),
+            baths=rng.choice((1, 1.5, 2, 2.5, 3, 3.5)),
+            sqft=rng.randint(600, 5000),
+            year_built=rng.randint(1890, 2024),
+            description=" ".join(rng.choices(WORDS, k=20)),
+            neighborhood_id=rng.choice(neighborhoods),
+            home_type_id=rng.choice(home_types),
+            price_range_id=ranges.lookup(price),
+            latitude=latitude,
+            longitude=longitude,
+            geohash=geo.encode(latitude, longitude),
+        ))
+    Listing.objects.bulk_create(listings, batch_size=batch_size)
+    ids = [listing.pk for listing in listings]
+    ListingEvent.objects.bulk_create(
+        (ListingEvent.changes(listing, None)[0] for listing in listings), batch_size=batch_size
+    )
+
+    if photos:
+        ListingPhoto.objects.bulk_create(
+            (
+                ListingPhoto(
+                    listing_id=pk,
+                    image=f"listing_photos/{pk}/synthetic-{i}.jpg",
+                    sort_order=i,
+                    mime_type="image/jpeg",
+                )
+                for pk in ids
+                for i in range(photos)
+            ),
+            batch_size=batch_size,
+        )
+    cards.refresh(ids)
+    caching.shared_changed()
+    stats.queue_refresh()
+    return ids
@@ -0,0 +1,50 @@
+from django.db import transaction
+
+from jobs.queue import task
+
+from . import cards, stats
+from .caching import photos_changed
+from .images import build_variants
+from .models import ListingPhoto, PhotoBlob, variant_names
+from .pricing import reconcile
+
+
+@task("listings.process_photo")
+def process_photo(photo_id):
+    photo = ListingPhoto.objects.filter(pk=photo_id).first()
+    if photo is None or not photo.image:
+        return  # deleted (or emptied) before the worker got to it
+
+    ListingPhoto.objects.filter(pk=photo_id, image=photo.image.name).update(processing_status="processing")
+    # the same file on another photo already has its variants
+    variants = (
+        ListingPhoto.objects.filter(image=photo.image.name, processing_status="ready")
+        .exclude(pk=photo_id)
+        .values_list("variants", flat=True)
+        .first()
+    )
+    try:
+        variants = variants or build_variants(photo.image.name, photo.image.storage)
+    except Exception:
+        ListingPhoto.objects.filter(pk=photo_id, image=photo.image.name).update(processing_status="failed")
+        raise  # let the queue retry it
+    with transaction.atomic():
+        # a new image gets its own job; these variants are then left uncounted for GC
+        current = ListingPhoto.objects.filter(pk=photo_id, image=photo.image.name)
+        old = current.values_list("variants", flat=True).first()
+        if old is not None and current.update(variants=variants, processing_status="ready"):
+            PhotoBlob.count(variant_names(variants))
+            PhotoBlob.count(variant_names(old), -1)
+    # update() skips signals; pages showing the original need rebuilding
+    photos_changed(photo.listing_id)
+    cards.refresh([photo.listing_id])
+
+
+@task("listings.reconcile_price_ranges")
+def reconcile_price_ranges():
+    reconcile()
+
+
+@task("listings.refresh_market_stats")
+def refresh_market_stats(groups=None):
+    stats.refresh(groups)
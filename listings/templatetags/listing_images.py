@@ -0,0 +1,62 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+DEFAULT_SIZES = "100vw"
+
+
+@register.simple_tag
+def responsive_image(photo, sizes=DEFAULT_SIZES, alt="", css_class="", loading="lazy"):
+    """
+    Render a ListingPhoto as a <picture> with one <source> per modern format
+    and a JPEG <img srcset> fallback. Photos whose variants are still being
+    processed fall back to the original file. ``photo`` may also be
+    ListingPhoto.picture() data, as from ListingCard.picture.
+
+        {% responsive_image listing.cover_photo sizes="(max-width: 900px) 100vw, 400px" alt=listing %}
+        {% responsive_image card.picture sizes="384px" alt=card %}
+    """
+    picture = photo if isinstance(photo, dict) else (photo.picture() if photo else None)
+    if not picture:
+        return ""
+
+    img_attrs = {
+        "alt": alt,
+        "class": css_class,
+        "loading": loading,
+        "decoding": "async",
+    }
+    if "srcset" not in picture:
+        return format_html(
+            '<img src="{}" alt="{alt}" class="{class}" loading="{loading}" decoding="{decoding}">',
+            picture["src"],
+            **img_attrs,
+        )
+
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        ((mime_type, srcset, sizes) for mime_type, srcset in picture["sources"]),
+    )
+    return format_html(
+        "<picture>{}"
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" '
+        'alt="{alt}" class="{class}" loading="{loading}" decoding="{decoding}">'
+        "</picture>",
+        sources,
+        picture["src"],
+        picture["srcset"],
+        sizes,
+        picture["width"],
+        picture["height"],
+        **img_attrs,
+    )
+
+
+@register.filter
+def variant_url(photo, width):
+    """{{ photo|variant_url:320 }} -> URL of the smallest JPEG at least that wide."""
+    if not photo:
+        return ""
+    return photo.variant_url(int(width))
@@ -1,3 +1,1360 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from config.database import BUSY_TIMEOUT_MS, CONN_MAX_AGE
+from config.instrumentation import QueryBudgetExceeded, assert_query_budget
+from jobs.models import Job
+from jobs.queue import run_pending
+
+from . import blobs, cards, geo, history, stats, synthetic
+from .browse import paginate
+from .caching import cache_stats, reset_cache_stats
+from .facets import compute_facets
+from .images import build_variants
+from .pricing import PriceRangeIndex, price_range_index, price_ranges_changed, reconcile
+from .models import (
+    HomeType, Listing, ListingCard, ListingEvent, ListingMonthSnapshot, ListingPhoto, MarketStat,
+    Neighborhood, PhotoBlob, PriceRange, variant_names,
+)
+from .search import search
+
+User = get_user_model()
+
+
+def make_listing(**kwargs):
+    data = {
+        "street": "123 Main St",
+        "city": "Omaha",
+        "state": "NE",
+        "zipcode": "68102",
+        "price": 250000,
+    }
+    data.update(kwargs)
+    return Listing.objects.create(**data)
+
+
+def make_listings(count, photos=2, **kwargs):
+    listings = []
+    for i in range(count):
+        listing = make_listing(street=f"{100 + i} Main St", **kwargs)
+        for n in range(photos):
+            ListingPhoto.objects.create(
+                listing=listing,
+                image=f"listing_photos/{listing.pk}/{n}.png",
+                sort_order=photos - n,
+                mime_type="image/png",
+            )
+        listings.append(listing)
+    return listings
+
+
+class CoverPhotoTests(TestCase):
+    def test_cover_photo_uses_sort_order(self):
+        listing = make_listings(1, photos=3)[0]
+        listing = Listing.objects.with_cover_photo().get(pk=listing.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(listing.main_photo_url.endswith("/2.png"))
+
+    def test_listing_without_photos(self):
+        listing = make_listing()
+        listing = Listing.objects.with_cover_photo().get(pk=listing.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(listing.main_photo_url, "")
+
+    def _count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_listings(self):
+        for name in ("public_home", "public_listings"):
+            with self.subTest(view=name):
+                Listing.objects.all().delete()
+                make_listings(1)
+                small = self._count_queries(reverse(name))
+                make_listings(8)
+                large = self._count_queries(reverse(name))
+                self.assertEqual(small, large)
+
+
+class FeaturedListingTests(TestCase):
+    def test_featuring_demotes_only_the_previous_one(self):
+        first = make_listing(is_featured=True)
+        make_listings(3, photos=0)
+        second = make_listing(street="9 Oak St")
+        second.is_featured = True
+        with CaptureQueriesContext(connection) as ctx:
+            second.save()
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        # the old featured row, this one, then the old featured card
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(list(Listing.objects.filter(is_featured=True)), [second])
+        first.refresh_from_db()
+        self.assertFalse(first.is_featured)
+
+    def test_constraint_rejects_a_second_featured_row(self):
+        make_listing(is_featured=True)
+        other = make_listing(street="9 Oak St")
+        with self.assertRaises(IntegrityError):
+            Listing.objects.filter(pk=other.pk).update(is_featured=True)
+
+    def test_home_shows_featured_listing(self):
+        listing = make_listing(is_featured=True)
+        response = self.client.get(reverse("public_home"))
+        self.assertEqual(response.context["featured"].pk, listing.pk)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dundee = Neighborhood.objects.create(name="Dundee")
+        self.maple = make_listing(street="123 Maple St", neighborhood=self.dundee)
+        self.oak = make_listing(street="9 Oak Ave", description="Maple trees out back.")
+
+    def search(self, query):
+        return list(search(Listing.objects.all(), query))
+
+    def test_ranked_and_prefix_matches(self):
+        self.assertEqual(self.search("maple"), [self.maple, self.oak])
+        self.assertEqual(self.search("map"), [self.maple, self.oak])
+        self.assertEqual(self.search("maple oak"), [self.oak])
+        self.assertEqual(self.search("dundee"), [self.maple])
+        self.assertEqual(self.search("  ()* "), [])
+
+    def test_index_follows_writes(self):
+        Listing.objects.filter(pk=self.oak.pk).update(street="44 Elm St")
+        self.assertEqual(self.search("elm"), [self.oak])
+        self.dundee.name = "Happy Hollow"
+        self.dundee.save()
+        self.assertEqual(self.search("hollow"), [self.maple])
+        self.assertEqual(self.search("dundee"), [])
+        self.maple.delete()
+        self.assertEqual(self.search("hollow"), [])
+
+    def test_public_endpoint(self):
+        make_listing(street="5 Maple Ct", visibility="N")
+        response = self.client.get(reverse("public_listing_search"), {"q": "mapl"})
+        results = response.json()["results"]
+        self.assertEqual([r["id"] for r in results], [self.maple.pk, self.oak.pk])
+        self.assertEqual(results[0]["neighborhood"], "Dundee")
+
+    def test_admin_changelist_uses_index(self):
+        admin_user = User.objects.create_superuser("admin", "a@example.com", "pw")
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse("admin:listings_listing_changelist"), {"q": "oak"})
+        self.assertEqual(list(response.context["cl"].result_list), [self.oak])
+
+
+class BrowsePaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.listings = make_listings(7, photos=0)
+        # give several listings the same price to exercise the id tiebreak
+        for i, listing in enumerate(self.listings):
+            Listing.objects.filter(pk=listing.pk).update(price=100000 + (i // 3) * 1000)
+        cards.refresh(listing.pk for listing in self.listings)
+
+    def walk(self, sort):
+        ids, cursor = [], None
+        while True:
+            page = paginate(Listing.objects.all(), sort=sort, after=cursor, page_size=3)
+            ids.extend(obj.pk for obj in page.items)
+            if not page.has_next:
+                return ids
+            cursor = page.next_cursor
+
+    def test_forward_walk_visits_every_row_once(self):
+        for sort, expected in (
+            ("newest", Listing.objects.order_by("-created_at", "-id")),
+            ("price_asc", Listing.objects.order_by("price", "id")),
+            ("price_desc", Listing.objects.order_by("-price", "-id")),
+        ):
+            with self.subTest(sort=sort):
+                self.assertEqual(self.walk(sort), [obj.pk for obj in expected])
+
+    def test_previous_page_matches(self):
+        first = paginate(Listing.objects.all(), page_size=3)
+        second = paginate(Listing.objects.all(), after=first.next_cursor, page_size=3)
+        back = paginate(Listing.objects.all(), before=second.prev_cursor, page_size=3)
+        self.assertEqual(back.items, first.items)
+        self.assertFalse(back.has_previous)
+        self.assertTrue(back.has_next)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        page = paginate(Listing.objects.all(), after="not-a-cursor", page_size=3)
+        self.assertEqual(page.items, list(Listing.objects.order_by("-created_at", "-id")[:3]))
+
+    def test_view_filters_and_counts(self):
+        response = self.client.get(reverse("public_listings"), {"max_price": 100000})
+        self.assertEqual(response.context["total_count"], 3)
+        self.assertEqual(len(response.context["listings"]), 3)
+        self.assertContains(response, "3 homes available")
+
+        response = self.client.get(reverse("public_listings"), {"sort": "sqft"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["next_url"] == "")
+
+
+def png_upload(name="photo.png", size=(800, 500)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (40, 90, 160)).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # the rollback won't fire PriceRange signals; drop the cached ranges
+        self.addCleanup(price_ranges_changed)
+        self.dundee = Neighborhood.objects.create(name="Dundee")
+        self.benson = Neighborhood.objects.create(name="Benson")
+        self.ranch = HomeType.objects.create(type_name="Ranch")
+        self.low = PriceRange.objects.create(min_price=0, max_price=199999)
+        self.high = PriceRange.objects.create(min_price=200000, max_price=999999)
+        for neighborhood, beds, price in (
+            (self.dundee, 2, 150000),
+            (self.dundee, 3, 250000),
+            (self.benson, 4, 300000),
+            (self.benson, 3, 120000),
+        ):
+            make_listing(neighborhood=neighborhood, home_type=self.ranch, beds=beds, price=price)
+        make_listing(neighborhood=self.dundee, beds=5, visibility="N")
+
+    def counts(self, facets, name):
+        return {item["label"]: item["count"] for item in facets[name]}
+
+    def test_counts_in_one_query(self):
+        price_range_index()  # warm the PriceRange index
+        # the price range stamp and the grouped counts
+        with self.assertNumQueries(2):
+            facets = compute_facets({})
+        self.assertEqual(self.counts(facets, "neighborhood"), {"Benson": 2, "Dundee": 2})
+        self.assertEqual(self.counts(facets, "home_type"), {"Ranch": 4})
+        self.assertEqual(self.counts(facets, "beds"), {"2+": 4, "3+": 3, "4+": 1})
+        self.assertEqual(self.counts(facets, "price"), {str(self.low): 2, str(self.high): 2})
+
+    def test_facet_ignores_its_own_selection(self):
+        facets = compute_facets({"neighborhood": self.dundee.pk, "min_price": 200000})
+        # other neighborhoods stay visible, every other facet is narrowed
+        self.assertEqual(self.counts(facets, "neighborhood"), {"Benson": 1, "Dundee": 1})
+        self.assertEqual(self.counts(facets, "beds"), {"3+": 1})
+        self.assertTrue(facets["neighborhood"][1]["selected"])
+
+    def test_price_band_ignores_its_own_selection(self):
+        facets = compute_facets({"min_price": 200000, "max_price": 999999})
+        self.assertEqual(self.counts(facets, "price"), {str(self.low): 2, str(self.high): 2})
+        self.assertEqual([item["selected"] for item in facets["price"]], [False, True])
+        # the other facets only count the selected band
+        self.assertEqual(self.counts(facets, "neighborhood"), {"Benson": 1, "Dundee": 1})
+        self.assertEqual(self.counts(facets, "beds"), {"3+": 2, "4+": 1})
+
+    def test_view_caches_facets(self):
+        url = reverse("public_listings")
+        admin_user = User.objects.create_superuser("admin", "a@example.com", "pw")
+        self.client.force_login(admin_user)  # bypass the page cache
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {"after": "x"})
+        self.assertFalse(any("GROUP BY" in q["sql"] for q in ctx.captured_queries))
+        self.assertContains(response, "Dundee <span>2</span>")
+
+
+class PriceRangeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(price_ranges_changed)
+        self.low = PriceRange.objects.create(min_price=0, max_price=199999)
+        self.high = PriceRange.objects.create(min_price=200000, max_price=499999)
+
+    def test_index_lookup(self):
+        # overlapping 1/2, gap between 2 and 3
+        index = PriceRangeIndex([(3, 300, 400, ""), (1, 0, 100, ""), (2, 50, 200, "")])
+        self.assertEqual([index.lookup(p) for p in (0, 49, 50, 250, 300, 401)], [1, 1, 2, None, 3, None])
+        self.assertEqual(list(index.intervals()), [(1, 0, 49), (2, 50, 200), (3, 300, 400)])
+
+    def test_assigned_on_save(self):
+        listing = make_listing(price=150000)
+        self.assertEqual(listing.price_range, self.low)
+        listing.price = 250000
+        # the price range stamp, savepoint, UPDATE, the listing and cover
+        # photo for its card, the card upsert, the queued stats refresh and
+        # its update, the price event, release
+        with self.assertNumQueries(10):
+            listing.save()
+        self.assertEqual(listing.price_range_id, self.high.pk)
+        listing.price = 900000
+        listing.save()
+        self.assertIsNone(listing.price_range_id)
+
+    def test_reconcile_after_ranges_change(self):
+        cheap = make_listing(price=150000)
+        pricey = make_listing(price=600000)
+        Listing.objects.filter(pk=cheap.pk).update(price=250000)
+        with self.captureOnCommitCallbacks(execute=True):
+            top = PriceRange.objects.create(min_price=500000, max_price=999999)
+        run_pending()  # the reconcile job queued by the signal
+        cheap.refresh_from_db()
+        pricey.refresh_from_db()
+        self.assertEqual((cheap.price_range, pricey.price_range), (self.high, top))
+        self.assertEqual(reconcile(), 0)
+
+
+class ImportListingsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        media = override_settings(MEDIA_ROOT=os.path.join(self.dir, "media"))
+        media.enable()
+        self.addCleanup(media.disable)
+        Image.new("RGB", (8, 8)).save(os.path.join(self.dir, "front.jpg"))
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as fh:
+            fh.write(text)
+        return path
+
+    def test_csv_import_is_idempotent(self):
+        feed = self.write("feed.csv", (
+            "mls_id,street,city,state,zipcode,price,beds,neighborhood,home_type,photos\n"
+            'A1,1 Elm St,Omaha,NE,68132,"$150,000",3,Dundee,Ranch,front.jpg\n'
+            "A2,2 Elm St,Omaha,NE,68132,210000,2,dundee,,\n"
+            "A3,3 Elm St,Omaha,NE,68132,lots,2,,,\n"
+        ))
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command("import_listings", feed, photos=self.dir, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(Listing.objects.count(), 2)
+        self.assertEqual(Neighborhood.objects.count(), 1)
+        first = Listing.objects.get(mls_id="A1")
+        self.assertEqual((first.price, first.home_type.type_name), (150000, "Ranch"))
+        self.assertEqual(first.photos.count(), 1)
+        self.assertEqual(Job.objects.filter(task="listings.process_photo").count(), 1)
+        # a re-run recognises the photo by its content and leaves the file be
+        path = first.photos.get().image.path
+        os.utime(path, (0, 0))
+        call_command("import_listings", feed, photos=self.dir, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(os.path.getmtime(path), 0)
+
+    def test_missing_columns_keep_existing_values(self):
+        dundee = Neighborhood.objects.create(name="Dundee")
+        make_listing(mls_id="D1", status="sold", description="Corner lot", sqft=1850, neighborhood=dundee)
+        feed = self.write("feed.csv", (
+            "mls_id,street,city,state,zipcode,price,beds\n"
+            "D1,1 Elm St,Omaha,NE,68132,240000,3\n"
+        ))
+        call_command("import_listings", feed, stdout=io.StringIO())
+        listing = Listing.objects.get(mls_id="D1")
+        self.assertEqual(
+            (listing.status, listing.description, listing.sqft, listing.neighborhood, listing.price, listing.beds),
+            ("sold", "Corner lot", 1850, dundee, 240000, 3),
+        )
+        self.assertFalse(ListingEvent.objects.filter(listing=listing, kind="status").exists())
+
+    def test_status_change_is_timestamped(self):
+        make_listing(mls_id="E1")
+        feed = self.write("feed.csv", (
+            "mls_id,street,city,state,zipcode,price,status\n"
+            "E1,1 Elm St,Omaha,NE,68132,240000,sold\n"
+        ))
+        call_command("import_listings", feed, stdout=io.StringIO())
+        changed_at = Listing.objects.get(mls_id="E1").status_changed_at
+        self.assertIsNotNone(changed_at)
+        call_command("import_listings", feed, stdout=io.StringIO())
+        self.assertEqual(Listing.objects.get(mls_id="E1").status_changed_at, changed_at)
+
+    def test_photo_names_stay_inside_the_photo_directory(self):
+        photos = os.path.join(self.dir, "photos")
+        os.mkdir(photos)
+        feed = self.write("feed.csv", (
+            "mls_id,street,city,state,zipcode,price,photos\n"
+            f"C1,1 Elm St,Omaha,NE,68132,150000,../front.jpg|{os.path.join(self.dir, 'front.jpg')}\n"
+        ))
+        err = io.StringIO()
+        call_command("import_listings", feed, photos=photos, stdout=io.StringIO(), stderr=err)
+        self.assertFalse(ListingPhoto.objects.exists())
+        self.assertEqual(err.getvalue().count("photo outside the photo directory"), 2)
+
+    def test_json_upsert_updates_rows_and_search(self):
+        make_listing(mls_id="B1", street="9 Old Rd")
+        feed = self.write("feed.json", json.dumps([
+            {"mls_id": "B1", "street": "9 New Rd", "city": "Omaha", "state": "NE",
+             "zipcode": "68102", "price": 99000},
+            {"mls_id": "B2", "street": "10 New Rd", "city": "Omaha", "state": "NE",
+             "zipcode": "68102", "price": 120000, "status": "pending"},
+        ], indent=2))
+        with mock.patch("listings.importer.JSON_BLOCK", 16):  # force partial reads
+            call_command("import_listings", feed, stdout=io.StringIO())
+        self.assertEqual(Listing.objects.get(mls_id="B1").street, "9 New Rd")
+        self.assertEqual(Listing.objects.get(mls_id="B2").status, "pending")
+        self.assertEqual(len(search(Listing.objects.all(), "new rd")), 2)
+        self.assertEqual(len(search(Listing.objects.all(), "old")), 0)
+        # the upsert logs the price change and the new listing
+        self.assertEqual(
+            sorted(ListingEvent.objects.filter(listing__mls_id__in=["B1", "B2"]).values_list("kind", "old_price")),
+            [("listed", None), ("listed", None), ("price", 250000)],
+        )
+
+
+class GeoTests(TestCase):
+    # Omaha downtown (68102) and Dundee (68132) centroids are about 5.6 km apart
+    DOWNTOWN = (41.2624, -95.9331)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_geohash_and_cover(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+        south, west, north, east = geo.bounds("9z7f8")
+        self.assertTrue(south <= geo.decode("9z7f8")[0] <= north)
+        box = (41.24, -96.02, 41.28, -95.96)
+        ranges = geo.cover(*box)
+        self.assertLessEqual(len(ranges), geo.MAX_COVER_CELLS)
+        for lat, lng in ((41.24, -96.02), (41.28, -95.96), (41.26, -95.99)):
+            geohash = geo.encode(lat, lng)
+            self.assertTrue(any(low <= geohash and (high is None or geohash < high) for low, high in ranges))
+
+    def test_save_geocodes_from_zip_centroid(self):
+        listing = make_listing(zipcode="68102")
+        self.assertAlmostEqual(listing.latitude, self.DOWNTOWN[0])
+        self.assertEqual(listing.geohash, geo.encode(*self.DOWNTOWN))
+        exact = make_listing(zipcode="68102", latitude=41.3, longitude=-96.0)
+        self.assertEqual((exact.latitude, exact.geohash), (41.3, geo.encode(41.3, -96.0)))
+        self.assertIsNone(make_listing(zipcode="10001").geohash)
+
+    def test_near_matches_haversine(self):
+        listings = [
+            make_listing(street=f"{i} Grid St", latitude=41.2 + i * 0.01, longitude=-96.05 + i * 0.01)
+            for i in range(15)
+        ]
+        near = set(Listing.objects.near(*self.DOWNTOWN, 6).values_list("pk", flat=True))
+        expected = {
+            listing.pk for listing in listings
+            if geo.haversine_km(*self.DOWNTOWN, listing.latitude, listing.longitude) <= 6
+        }
+        self.assertTrue(expected)
+        self.assertEqual(near, expected)
+
+        url = reverse("public_listings") + f"?lat={self.DOWNTOWN[0]}&lng={self.DOWNTOWN[1]}&radius=3"
+        response = self.client.get(url)
+        self.assertEqual(
+            {listing.pk for listing in response.context["listings"]},
+            set(Listing.objects.near(*self.DOWNTOWN, 3 * 1.609344).values_list("pk", flat=True)),
+        )
+
+    def test_map_clusters_by_zoom(self):
+        for i in range(4):
+            make_listing(street=f"{i} A St", latitude=41.2600 + i * 0.001, longitude=-95.9300)
+        lone = make_listing(street="Far Rd", latitude=41.3000, longitude=-96.1000)
+        make_listing(street="Hidden", latitude=41.2600, longitude=-95.9300, visibility="N")
+        bbox = "-96.2,41.2,-95.9,41.35"
+
+        data = self.client.get(reverse("public_listing_map"), {"bbox": bbox, "zoom": 11}).json()
+        self.assertEqual([cluster["count"] for cluster in data["clusters"]], [4])
+        self.assertEqual([marker["id"] for marker in data["listings"]], [lone.pk])
+        self.assertEqual(data["listings"][0]["url"], lone.get_absolute_url())
+
+        data = self.client.get(reverse("public_listing_map"), {"bbox": bbox, "zoom": 20}).json()
+        self.assertEqual(len(data["listings"]), 5)
+
+        response = self.client.get(reverse("public_listing_map"), {"bbox": "nope", "zoom": 3})
+        self.assertEqual(response.status_code, 400)
+
+    def test_geocode_command(self):
+        listing = make_listing(zipcode="68132")
+        Listing.objects.filter(pk=listing.pk).update(latitude=None, longitude=None, geohash=None)
+        path = os.path.join(tempfile.mkdtemp(), "zips.csv")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, "w") as fh:
+            fh.write("zipcode,city,latitude,longitude\n68132,Omaha,41.5,-96.5\n")
+        out = io.StringIO()
+        call_command("geocode_listings", centroids=path, stdout=out, stderr=io.StringIO())
+        listing.refresh_from_db()
+        self.assertEqual((listing.latitude, listing.geohash), (41.5, geo.encode(41.5, -96.5)))
+        self.assertIn("Geocoded 1 listing(s)", out.getvalue())
+
+
+class ListingCardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dundee = Neighborhood.objects.create(name="Dundee")
+
+    def test_kept_current_from_signals(self):
+        listing = make_listing(price=1250000, beds=3, baths=2.5, sqft=1850, neighborhood=self.dundee)
+        card = ListingCard.objects.get(pk=listing.pk)
+        self.assertEqual(card.price_display, "$1,250,000")
+        self.assertEqual(card.meta_display, "3 beds · 2.5 baths · 1,850 sqft")
+        self.assertEqual(card.chip, "Dundee")
+        self.assertIsNone(card.photo)
+
+        ListingPhoto.objects.create(listing=listing, image="listing_photos/1/a.png", mime_type="image/png")
+        card = ListingCard.objects.get(pk=listing.pk)
+        self.assertEqual(card.photo, {"image": "listing_photos/1/a.png", "variants": {}})
+        self.assertEqual(card.picture["src"], "/media/listing_photos/1/a.png")
+
+        self.dundee.name = "Dundee-Memorial Park"
+        self.dundee.save()
+        self.assertEqual(ListingCard.objects.get(pk=listing.pk).neighborhood_name, "Dundee-Memorial Park")
+        self.dundee.delete()
+        card = ListingCard.objects.get(pk=listing.pk)
+        self.assertEqual((card.neighborhood_id, card.chip), (None, ""))
+
+        listing.refresh_from_db()
+        listing.status = "sold"
+        listing.save()
+        self.assertFalse(ListingCard.objects.filter(pk=listing.pk).exists())
+        listing.status = "active"
+        listing.save()
+        listing.delete()
+        self.assertFalse(ListingCard.objects.exists())
+
+    def test_rebuild_command(self):
+        make_listings(3, photos=1)
+        make_listing(visibility="N")
+        ListingCard.objects.all().delete()
+        out = io.StringIO()
+        call_command("rebuild_listing_cards", stdout=out)
+        self.assertIn("Built 3 listing card(s).", out.getvalue())
+
+    def test_grids_read_only_cards(self):
+        make_listings(3, photos=2, neighborhood=self.dundee)
+        for name in ("public_home", "public_listings"):
+            with self.subTest(view=name), CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, "1.png")
+            grid = [q["sql"] for q in ctx.captured_queries if "listings_listingcard" in q["sql"]]
+            self.assertTrue(grid)
+            for sql in grid:
+                self.assertNotIn("JOIN", sql)
+            self.assertFalse([q for q in ctx.captured_queries if "listings_listingphoto" in q["sql"]])
+
+
+class MarketStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dundee = Neighborhood.objects.create(name="Dundee")
+        self.condo = HomeType.objects.create(type_name="Condo")
+        for i, price in enumerate((100000, 200000, 300000, 400000, 500000)):
+            make_listing(price=price, sqft=1000 * (i + 1), neighborhood=self.dundee, zipcode="68132")
+        make_listing(price=900000, home_type=self.condo, visibility="N")
+
+    def stat(self, dimension, key):
+        return MarketStat.objects.get(dimension=dimension, key=key)
+
+    def test_rollup(self):
+        self.assertEqual(stats.refresh(), 3)  # all, Dundee, 68132
+        dundee = self.stat("neighborhood", str(self.dundee.pk))
+        self.assertEqual((dundee.label, dundee.active_count, dundee.new_count), ("Dundee", 5, 5))
+        self.assertEqual(
+            [dundee.price_p10, dundee.price_p25, dundee.price_p50, dundee.price_p75, dundee.price_p90],
+            [100000, 200000, 300000, 400000, 500000],
+        )
+        self.assertEqual(dundee.price_per_sqft_p50, 100.0)
+        self.assertLess(dundee.days_on_market_p50, 1)
+        self.assertFalse(MarketStat.objects.filter(dimension="home_type").exists())
+
+    def run_refresh(self):
+        # the refresh waits a little for more changes; make it due now
+        Job.objects.update(run_after=timezone.now())
+        run_pending()
+
+    def test_refreshed_incrementally(self):
+        # setUp's six saves were folded into one refresh
+        job = Job.objects.get(task="listings.refresh_market_stats")
+        self.assertEqual(
+            [tuple(group) for group in job.payload["groups"]],
+            [("all", ""), ("home_type", str(self.condo.pk)), ("neighborhood", str(self.dundee.pk)),
+             ("zipcode", "68102"), ("zipcode", "68132")],
+        )
+        self.run_refresh()
+        listing = Listing.objects.get(price=100000)
+        listing.status = "sold"
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.save()
+        job = Job.objects.get(task="listings.refresh_market_stats", status="queued")
+        self.assertEqual(
+            [tuple(group) for group in job.payload["groups"]],
+            [("all", ""), ("neighborhood", str(self.dundee.pk)), ("zipcode", "68132")],
+        )
+        self.run_refresh()
+        dundee = self.stat("neighborhood", str(self.dundee.pk))
+        self.assertEqual((dundee.active_count, dundee.sold_count, dundee.price_p50), (4, 1, 300000))
+        self.assertIsNotNone(dundee.days_to_sell_p50)
+
+        # saving without touching a stats field queues nothing
+        listing.description = "Updated"
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.save()
+        self.assertFalse(Job.objects.filter(status="queued").exists())
+
+    def test_page_and_api_read_rollups(self):
+        stats.refresh()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("public_market_stats"))
+        self.assertContains(response, "Dundee")
+        self.assertContains(response, "$300,000")
+
+        response = self.client.get(reverse("api:market_stats"), {"dimension": "zipcode"})
+        [row] = response.json()["results"]
+        self.assertEqual((row["key"], row["price"]["p50"], row["active"]), ("68132", 300000, 5))
+        response = self.client.get(reverse("api:market_stats"), {"dimension": "county"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ListingEventTests(TestCase):
+    def at(self, month, day):
+        return datetime(2026, month, day, 12, tzinfo=dt_timezone.utc)
+
+    def log(self, listing, month, day, kind, status="active", visibility="Y", price=200000, old_price=None):
+        ListingEvent.objects.create(
+            listing=listing, at=self.at(month, day), kind=kind, status=status,
+            visibility=visibility, price=price, old_price=old_price,
+        )
+
+    def test_changes_are_logged_with_the_save(self):
+        listing = make_listing(price=300000)
+        listing.description = "Updated"
+        listing.save()
+        listing.price = 280000
+        listing.status = "pending"
+        listing.save()
+        # not loaded through the ORM, so save() reads the old values first
+        copy = Listing.objects.get(pk=listing.pk)
+        del copy._loaded
+        copy.visibility = "N"
+        copy.save()
+        self.assertEqual(
+            list(listing.events.values_list("kind", "status", "visibility", "price", "old_price")),
+            [
+                ("listed", "active", "Y", 300000, None),
+                ("status", "pending", "Y", 280000, None),
+                ("price", "pending", "Y", 280000, 300000),
+                ("visibility", "pending", "N", 280000, None),
+            ],
+        )
+        [cut] = history.price_cuts(listing=listing)
+        self.assertTrue(cut.is_price_cut)
+
+        pk = listing.pk
+        listing.delete()
+        self.assertEqual(ListingEvent.objects.filter(listing_id=pk).last().kind, "deleted")
+
+    def test_inventory_as_of_survives_compaction(self):
+        first, second = make_listing(), make_listing()
+        ListingEvent.objects.all().delete()
+        self.log(first, 1, 10, "listed")
+        self.log(first, 2, 15, "price", price=180000, old_price=200000)
+        self.log(first, 2, 16, "status", status="pending", price=180000)
+        self.log(first, 3, 5, "status", status="sold", price=180000)
+        self.log(second, 2, 1, "listed")
+        self.log(second, 2, 20, "visibility", visibility="N")
+        expected = {
+            (1, 20): {"active": 1, "pending": 0},
+            (2, 10): {"active": 2, "pending": 0},
+            (2, 17): {"active": 1, "pending": 1},
+            (2, 25): {"active": 0, "pending": 1},
+            (3, 10): {"active": 0, "pending": 0},
+        }
+        for (month, day), counts in expected.items():
+            self.assertEqual(history.inventory_as_of(self.at(month, day)), counts)
+
+        self.assertEqual(history.compact(now=self.at(4, 2)), 2)
+        self.assertEqual(
+            list(ListingMonthSnapshot.objects.values_list("month", "listing_id", "status")),
+            [(date(2026, 2, 1), first.pk, "active"), (date(2026, 3, 1), first.pk, "pending")],
+        )
+        self.assertEqual(history.compact(now=self.at(4, 2)), 0)
+        for (month, day), counts in expected.items():
+            self.assertEqual(history.inventory_as_of(self.at(month, day)), counts)
+        self.assertEqual(history.state_as_of(self.at(2, 25)), {first.pk: ("pending", 180000)})
+
+        self.assertEqual(history.days_on_market(first, until=self.at(4, 1)), 37)
+        self.assertEqual(list(history.price_cuts(since=self.at(2, 1), until=self.at(3, 1))), [
+            ListingEvent.objects.get(kind="price"),
+        ])
+
+        # events before March go; its snapshot still answers for March on
+        self.assertEqual(history.prune(1, now=self.at(4, 2)), 5)
+        self.assertEqual(history.inventory_as_of(self.at(3, 2)), {"active": 0, "pending": 1})
+        self.assertEqual(history.inventory_as_of(self.at(3, 10)), {"active": 0, "pending": 0})
+
+    def test_prune_writes_the_snapshots_it_needs(self):
+        listing = make_listing()
+        ListingEvent.objects.all().delete()
+        self.log(listing, 1, 10, "listed")
+        self.log(listing, 3, 20, "status", status="pending")
+        # never compacted: prune must not lose January's listing
+        self.assertEqual(history.prune(1, now=self.at(4, 2)), 1)
+        self.assertEqual(history.state_as_of(self.at(3, 10)), {listing.pk: ("active", 200000)})
+        self.assertEqual(history.inventory_as_of(self.at(3, 25)), {"active": 0, "pending": 1})
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "a@example.com", "pw"))
+        dundee = Neighborhood.objects.create(name="Dundee")
+        make_listing(mls_id="E1", street="1 Elm St", neighborhood=dundee)
+        make_listing(street="2 Elm St", status="pending")
+
+    def read(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_export_follows_changelist_filters(self):
+        url = reverse("admin:listings_listing_export")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {"status__exact": "active", "format": "csv"})
+            rows = list(csv.DictReader(io.StringIO(self.read(response))))
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual([(r["mls_id"], r["neighborhood"]) for r in rows], [("E1", "Dundee")])
+        listing_selects = [
+            q for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT") and "listings_listing" in q["sql"]
+        ]
+        self.assertEqual(len(listing_selects), 1)  # one joined query, no per-row lookups
+
+    def test_json_action(self):
+        response = self.client.post(reverse("admin:listings_listing_changelist"), {
+            "action": "export_json",
+            "_selected_action": list(Listing.objects.values_list("pk", flat=True)),
+        })
+        rows = json.loads(self.read(response))
+        self.assertEqual(sorted(r["street"] for r in rows), ["1 Elm St", "2 Elm St"])
+
+    def test_changelist_links_keep_filters(self):
+        response = self.client.get(
+            reverse("admin:listings_listing_changelist"), {"status__exact": "pending"}
+        )
+        self.assertContains(response, "?status__exact=pending&amp;format=csv")
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dundee = Neighborhood.objects.create(name="Dundee")
+        self.listings = make_listings(5, photos=2, neighborhood=self.dundee)
+        make_listing(street="Hidden", visibility="N")
+
+    def test_sparse_fields_and_keyset_pages(self):
+        url = reverse("api:listing_list")
+        seen = []
+        params = {"fields": "id,street,neighborhood,photo", "limit": 2, "sort": "price_asc"}
+        with self.assertNumQueries(3):  # validators, listings, cover photos
+            response = self.client.get(url, params)
+        while True:
+            data = response.json()
+            for item in data["results"]:
+                self.assertEqual(set(item), {"id", "street", "neighborhood", "photo"})
+                self.assertEqual(item["neighborhood"], "Dundee")
+                self.assertTrue(item["photo"]["url"])
+            seen.extend(item["id"] for item in data["results"])
+            if not data["next"]:
+                break
+            self.assertTrue(data["next"].startswith(f"{url}?"))
+            response = self.client.get(data["next"])
+        expected = Listing.objects.public().order_by("price", "id").values_list("id", flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_detail_photos_and_etag(self):
+        listing = self.listings[0]
+        url = reverse("api:listing_detail", args=[listing.pk])
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(len(data["photos"]), 2)
+        self.assertEqual(data["url"], listing.get_absolute_url())
+        self.assertIn("max-age=60", response["Cache-Control"])
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+        photos = self.client.get(reverse("api:listing_photos", args=[listing.pk])).json()
+        self.assertEqual([p["id"] for p in photos["results"]], [p["id"] for p in data["photos"]])
+
+    def test_errors(self):
+        self.assertEqual(
+            self.client.get(reverse("api:listing_list"), {"fields": "id,secret"}).status_code, 400
+        )
+        hidden = Listing.objects.get(street="Hidden")
+        self.assertEqual(
+            self.client.get(reverse("api:listing_detail", args=[hidden.pk])).status_code, 404
+        )
+
+
+@override_settings(ROOT_URLCONF="config.urls_async")
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dundee = Neighborhood.objects.create(name="Dundee")
+        self.listings = make_listings(4, photos=2, neighborhood=self.dundee)
+        self.featured = make_listing(street="Featured", is_featured=True)
+
+    async def test_pages_match_sync_views(self):
+        for url in ("/", "/listings/", "/listings/?sort=price_asc", f"/listings/{self.listings[0].pk}/"):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            with override_settings(ROOT_URLCONF="config.urls"):
+                cache.clear()
+                expected = await sync_to_async(self.client.get)(url)
+            self.assertEqual(response.content, expected.content, url)
+            self.assertIn("ETag", response)
+
+    async def test_home_context(self):
+        response = await self.async_client.get("/")
+        self.assertEqual(response.context["featured"].pk, self.featured.pk)
+        self.assertEqual(len(response.context["latest_listings"]), 5)
+
+    async def test_missing_listing_404(self):
+        hidden = await sync_to_async(make_listing)(visibility="N")
+        response = await self.async_client.get(f"/listings/{hidden.pk}/")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_cached_and_not_modified(self):
+        first = await self.async_client.get("/listings/")
+        second = await self.async_client.get("/listings/", headers={"if-none-match": first["ETag"]})
+        self.assertEqual(second.status_code, 304)
+
+
+class PhotoVariantTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root, PHOTO_VARIANT_FORMATS=("webp", "jpeg")
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def create_photo(self):
+        listing = make_listing()
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = ListingPhoto.objects.create(listing=listing, image=png_upload())
+        self.assertEqual(photo.processing_status, "pending")
+        self.assertEqual(Job.objects.filter(task="listings.process_photo").count(), 1)
+        run_pending()
+        photo.refresh_from_db()
+        return photo
+
+    def test_variants_built_by_job(self):
+        photo = self.create_photo()
+        self.assertEqual(photo.processing_status, "ready")
+        self.assertEqual(photo.variants["width"], 800)
+        self.assertEqual(set(photo.variants["sources"]), {"webp", "jpeg"})
+        # nothing is upscaled: 320, 640 and the original 800
+        self.assertEqual([w for w, _ in photo.variants["sources"]["webp"]], [320, 640, 800])
+        for _, name in photo.variants["sources"]["jpeg"]:
+            self.assertTrue(photo.image.storage.exists(name))
+        self.assertEqual(
+            photo.variant_url(300), photo.image.storage.url(photo.variants["sources"]["jpeg"][0][1])
+        )
+
+    def test_saving_unchanged_photo_does_not_requeue(self):
+        photo = self.create_photo()
+        photo.caption = "Kitchen"
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.save()
+        self.assertFalse(Job.objects.filter(task="listings.process_photo", status="queued").exists())
+        self.assertEqual(photo.processing_status, "ready")
+
+    def test_pending_photo_falls_back_to_original(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = ListingPhoto.objects.create(listing=make_listing(), image=png_upload())
+        self.assertEqual(photo.variant_url(320), photo.image.url)
+
+    def test_responsive_image_tag(self):
+        photo = self.create_photo()
+        html = Template(
+            "{% load listing_images %}{% responsive_image photo sizes='50vw' alt='Home' %}"
+        ).render(Context({"photo": photo}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f"{photo.variant_url(640)} 640w", html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('sizes="50vw"', html)
+
+
+@override_settings(PHOTO_VARIANT_FORMATS=("jpeg",))
+class PhotoStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def refs(self, name):
+        return PhotoBlob.objects.get(name=name).refs
+
+    def test_identical_uploads_share_one_file(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = ListingPhoto.objects.create(listing=make_listing(), image=png_upload("front.png"))
+            second = ListingPhoto.objects.create(listing=make_listing(), image=png_upload("IMG_1.PNG"))
+        run_pending()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        data = png_upload().read()
+        digest = hashlib.sha256(data).hexdigest()
+        self.assertEqual(first.image.name, f"listing_photos/sha256/{digest[:2]}/{digest}.png")
+        self.assertEqual(second.image.name, first.image.name)
+        # the second photo reused the first one's variants
+        self.assertEqual(second.variants, first.variants)
+        self.assertEqual({self.refs(name) for name in first.stored_names()}, {2})
+
+        storage = first.image.storage
+        later = timezone.now() + timedelta(hours=2)
+        first.delete()
+        self.assertEqual(blobs.collect(now=later), 0)
+        second.listing.delete()
+        self.assertEqual(self.refs(second.image.name), 0)
+        self.assertEqual(blobs.collect(now=later), len(second.stored_names()))
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(PhotoBlob.objects.exists())
+
+    def test_variants_of_a_replaced_image_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = ListingPhoto.objects.create(listing=make_listing(), image=png_upload("front.png"))
+        built = []
+
+        def replace_while_building(name, storage):
+            built.append(build_variants(name, storage))
+            ListingPhoto.objects.filter(pk=photo.pk).update(image="listing_photos/sha256/other.png")
+            return built[0]
+
+        with mock.patch("listings.tasks.build_variants", side_effect=replace_while_building):
+            run_pending()
+        photo.refresh_from_db()
+        self.assertEqual(photo.variants, {})
+        self.assertFalse(PhotoBlob.objects.filter(name__in=variant_names(built[0])).exists())
+
+    def test_counts_add_up_in_one_query(self):
+        PhotoBlob.count(["a.png"])
+        with self.assertNumQueries(1):
+            PhotoBlob.count(["a.png", "b.png", "a.png", ""])
+        self.assertEqual((self.refs("a.png"), self.refs("b.png")), (3, 1))
+        PhotoBlob.count(["a.png", "b.png"], -1)
+        self.assertEqual((self.refs("a.png"), self.refs("b.png")), (2, 0))
+
+    def test_rehash_moves_old_names(self):
+        data = png_upload().read()
+        photos = []
+        for listing in (make_listing(), make_listing()):
+            name = f"listing_photos/{listing.pk}/front.png"
+            os.makedirs(os.path.join(self.media_root, os.path.dirname(name)))
+            with open(os.path.join(self.media_root, name), "wb") as fh:
+                fh.write(data)
+            photos.append(ListingPhoto.objects.create(listing=listing, image=name, mime_type="image/png"))
+        ListingPhoto.objects.create(
+            listing=photos[0].listing, image="listing_photos/0/missing.png", mime_type="image/png"
+        )
+
+        out = io.StringIO()
+        call_command("rehash_listing_photos", workers=2, stdout=out)
+        self.assertIn("Rehashed 2 file(s) used by 2 photo(s)", out.getvalue())
+        names = {photo.image.name for photo in ListingPhoto.objects.exclude(image__contains="missing")}
+        [name] = names
+        self.assertTrue(name.startswith("listing_photos/sha256/"))
+        self.assertEqual(self.refs(name), 2)
+        old = os.path.join(self.media_root, "listing_photos", str(photos[0].listing_id), "front.png")
+        self.assertFalse(os.path.exists(old))
+
+
+@override_settings(PHOTO_VARIANT_FORMATS=("jpeg",))
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            CHUNKED_UPLOAD_DIR=os.path.join(self.media_root, "chunks"),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        chunk_size = mock.patch("listings.uploads.CHUNK_SIZE", 1000)
+        chunk_size.start()
+        self.addCleanup(chunk_size.stop)
+
+        user = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(user)
+        self.listing = make_listings(1, photos=2)[0]
+        buffer = io.BytesIO()
+        Image.frombytes("RGB", (40, 30), os.urandom(40 * 30 * 3)).save(buffer, "PNG")
+        self.data = buffer.getvalue()
+
+    def start(self, data=None):
+        data = data or self.data
+        response = self.client.post(
+            reverse("admin:listings_listing_upload_start", args=[self.listing.pk]),
+            {"filename": "porch.png", "size": len(data), "sha256": hashlib.sha256(data).hexdigest()},
+            content_type="application/json",
+        )
+        self.assertIn(response.status_code, (200, 201))
+        return response.json()
+
+    def put_chunk(self, state, index, data=None):
+        data = data or self.data
+        return self.client.put(
+            f"{state['url']}chunks/{index}/",
+            data[index * 1000:(index + 1) * 1000],
+            content_type="application/octet-stream",
+        )
+
+    def test_upload_resume_and_complete(self):
+        state = self.start()
+        chunks = -(-len(self.data) // 1000)
+        self.assertGreater(chunks, 1)
+        self.assertEqual(self.put_chunk(state, 0).json()["received"], 1000)
+
+        # a skipped chunk is refused, and starting again resumes where we were
+        self.assertEqual(self.put_chunk(state, 2).status_code, 409)
+        resumed = self.start()
+        self.assertEqual((resumed["id"], resumed["received"]), (state["id"], 1000))
+
+        for index in range(1, chunks):
+            self.assertEqual(self.put_chunk(state, index).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            done = self.client.post(f"{state['url']}complete/").json()
+        self.assertEqual(done["status"], "complete")
+
+        photo = ListingPhoto.objects.get(pk=done["photo_id"])
+        self.assertEqual(photo.sort_order, 3)
+        self.assertEqual(photo.mime_type, "image/png")
+        with photo.image.open("rb") as fh:
+            self.assertEqual(fh.read(), self.data)
+        self.assertTrue(Job.objects.filter(task="listings.process_photo").exists())
+
+    def test_checksum_mismatch_restarts_upload(self):
+        state = self.start()
+        corrupt = b"x" * len(self.data)
+        for index in range(-(-len(self.data) // 1000)):
+            self.put_chunk(state, index, corrupt)
+        response = self.client.post(f"{state['url']}complete/")
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()["received"], 0)
+        self.assertFalse(ListingPhoto.objects.filter(image__contains="porch").exists())
+
+    def test_malformed_content_length(self):
+        state = self.start()
+        response = self.client.put(
+            f"{state['url']}chunks/0/", self.data[:1000],
+            content_type="application/octet-stream", CONTENT_LENGTH="lots",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "Invalid Content-Length.")
+
+    def test_requires_permission(self):
+        state = self.start()
+        staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.post(
+            reverse("admin:listings_listing_upload_start", args=[self.listing.pk]),
+            {}, content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(state["url"]).status_code, 403)
+
+
+class PublicPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        self.listing = make_listings(1, photos=1)[0]
+
+    def test_anonymous_pages_are_cached(self):
+        for url in (reverse("public_home"), reverse("public_listings"), self.listing.get_absolute_url()):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+                # only the ETag/Last-Modified aggregate runs on a hit
+                with self.assertNumQueries(1):
+                    self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        self.assertEqual(cache_stats()["hits"], 3)
+        self.assertEqual(cache_stats()["misses"], 3)
+
+    def test_per_process_cache_warns(self):
+        from .checks import check_shared_cache
+
+        self.assertEqual(check_shared_cache(None), [])
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ["listings.W001"])
+
+    def test_logged_in_users_bypass_cache(self):
+        self.client.force_login(User.objects.create_user("buyer", password="pw"))
+        self.client.get(reverse("public_listings"))
+        self.assertNotIn("X-Cache", self.client.get(reverse("public_listings")))
+
+    def test_hidden_listing_leaves_cached_pages(self):
+        detail = self.listing.get_absolute_url()
+        self.assertContains(self.client.get(reverse("public_listings")), self.listing.street)
+        self.client.get(detail)
+
+        self.listing.visibility = "N"
+        self.listing.save()
+
+        response = self.client.get(reverse("public_listings"))
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertNotContains(response, self.listing.street)
+        self.assertEqual(self.client.get(detail).status_code, 404)
+
+    def test_other_detail_pages_stay_cached(self):
+        other = make_listing(street="9 Elm St")
+        self.client.get(other.get_absolute_url())
+        self.listing.price = 1
+        self.listing.save()
+        self.assertEqual(self.client.get(other.get_absolute_url())["X-Cache"], "HIT")
+
+    def test_related_changes_invalidate(self):
+        neighborhood = Neighborhood.objects.create(name="Dundee")
+        Listing.objects.filter(pk=self.listing.pk).update(neighborhood=neighborhood)
+        cache.clear()
+        self.assertContains(self.client.get(reverse("public_listings")), "Dundee")
+
+        neighborhood.name = "Benson"
+        neighborhood.save()
+        self.assertContains(self.client.get(reverse("public_listings")), "Benson")
+
+        updated_at = Listing.objects.get(pk=self.listing.pk).updated_at
+        ListingPhoto.objects.filter(listing=self.listing).first().delete()
+        self.assertGreater(Listing.objects.get(pk=self.listing.pk).updated_at, updated_at)
+        self.assertEqual(self.client.get(reverse("public_listings"))["X-Cache"], "MISS")
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.listing = make_listings(1, photos=1)[0]
+
+    def test_not_modified_skips_rendering(self):
+        for url in (reverse("public_home"), reverse("public_listings"), self.listing.get_absolute_url()):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header("Last-Modified"))
+                self.assertIn("no-cache", response["Cache-Control"])
+                with self.assertNumQueries(1):
+                    again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(again.status_code, 304)
+
+    def test_etag_changes_with_listing_and_photos(self):
+        url = self.listing.get_absolute_url()
+        etag = self.client.get(url)["ETag"]
+        ListingPhoto.objects.create(
+            listing=self.listing, image="listing_photos/x.png", mime_type="image/png"
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = self.client.get(reverse("public_listings"))["ETag"]
+        make_listing(street="1 New St", visibility="N")
+        response = self.client.get(reverse("public_listings"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_hashed_media_is_immutable(self):
+        from .media import serve_media
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        os.makedirs(os.path.join(media_root, "variants"))
+        stored = "variants/" + "ab" * 32 + ".jpg"
+        for name in ("variants/a.0123456789ab.320.webp", stored, "plain.png"):
+            with open(os.path.join(media_root, name), "wb") as fh:
+                fh.write(b"x")
+        request = RequestFactory().get("/")
+        response = serve_media(request, "variants/a.0123456789ab.320.webp", media_root)
+        self.assertIn("immutable", response["Cache-Control"])
+        response = serve_media(request, stored, media_root)
+        self.assertIn("immutable", response["Cache-Control"])
+        response = serve_media(request, "plain.png", media_root)
+        self.assertNotIn("immutable", response["Cache-Control"])
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0, REQUEST_METRICS_HEADER=True)
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dundee = Neighborhood.objects.create(name="Dundee")
+        self.listings = make_listings(8, photos=2, neighborhood=self.dundee)
+        make_listing(street="Featured", is_featured=True)
+
+    def test_pages_within_budget(self):
+        pk = self.listings[0].pk
+        urls = [
+            reverse("public_home"),
+            reverse("public_about"),
+            reverse("public_contact"),
+            reverse("public_omaha_info"),
+            reverse("public_listings"),
+            reverse("public_listings") + f"?neighborhood={self.dundee.pk}&beds=2&sort=price_desc",
+            reverse("public_listing_detail", args=[pk]),
+            reverse("public_listing_search") + "?q=main",
+            reverse("public_listing_map") + "?bbox=-96.2,41.1,-95.8,41.4&zoom=11",
+            reverse("api:listing_list"),
+            reverse("api:listing_detail", args=[pk]),
+            reverse("api:listing_photos", args=[pk]),
+            reverse("public_market_stats"),
+            reverse("api:market_stats") + "?dimension=neighborhood",
+        ]
+        stats.refresh()
+        for url in urls:
+            cache.clear()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            assert_query_budget(response)
+
+    def test_metrics_header_and_duplicates(self):
+        with self.assertLogs("config.requests", "INFO") as logs:
+            response = self.client.get(reverse("public_home"))
+        metrics = response.request_metrics
+        self.assertIn(f'desc="{metrics.query_count} queries"', response["Server-Timing"])
+        self.assertGreater(metrics.template_seconds, 0)
+        self.assertEqual(metrics.size, len(response.content))
+        self.assertEqual(metrics.duplicates(), {})
+        self.assertEqual(logs.records[0].metrics["url_name"], "public_home")
+
+    def test_n_plus_one_goes_over_budget(self):
+        # a card reaching back to its listing costs a query per card
+        with mock.patch.object(ListingCard, "chip", property(lambda card: card.listing.street)):
+            with self.assertLogs("config.requests", "WARNING"):
+                response = self.client.get(reverse("public_listings"))
+        self.assertTrue(response.request_metrics.over_budget())
+        with self.assertRaises(QueryBudgetExceeded):
+            assert_query_budget(response)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_unsampled(self):
+        response = self.client.get(reverse("public_home"))
+        self.assertFalse(hasattr(response, "request_metrics"))
+        self.assertNotIn("Server-Timing", response)
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        self.addCleanup(price_ranges_changed)
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def test_generator_is_seeded(self):
+        first = synthetic.generate(5, photos=2, seed=7)
+        rows = list(Listing.objects.filter(pk__in=first).order_by("pk").values_list("street", "price", "neighborhood__name"))
+        Listing.objects.all().delete()
+        second = synthetic.generate(5, photos=2, seed=7)
+        self.assertEqual(
+            rows,
+            list(Listing.objects.filter(pk__in=second).order_by("pk").values_list("street", "price", "neighborhood__name")),
+        )
+        self.assertEqual(ListingPhoto.objects.count(), 10)
+        self.assertFalse(Listing.objects.filter(price_range=None).exists())
+
+    def test_results_and_regression_check(self):
+        output = os.path.join(self.dir, "bench.json")
+        call_command("benchmark", sizes="10,20", photos=1, repeat=1, output=output, stdout=io.StringIO())
+        with open(output) as fh:
+            results = json.load(fh)
+        self.assertEqual(set(results["results"]), {"10", "20"})
+        self.assertGreater(results["results"]["20"]["public_listings"]["queries"], 0)
+        self.assertFalse(Listing.objects.exists())  # rolled back
+
+        for timings in results["results"].values():
+            for timing in timings.values():
+                timing["median_ms"] /= 100
+        baseline = os.path.join(self.dir, "baseline.json")
+        with open(baseline, "w") as fh:
+            json.dump(results, fh)
+        with self.assertRaisesMessage(CommandError, "slower than the baseline"):
+            call_command(
+                "benchmark", sizes="10", photos=1, repeat=1, baseline=baseline,
+                stdout=io.StringIO(), stderr=io.StringIO(),
+            )
+
+
+class DatabaseTuningTests(TestCase):
+    def test_pragmas_on_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], BUSY_TIMEOUT_MS)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA temp_store")
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+    def test_writes_begin_immediate(self):
+        self.assertEqual(connection.settings_dict["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+        self.assertEqual(connection.settings_dict["CONN_MAX_AGE"], CONN_MAX_AGE)
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.body = bytes(range(256)) * 4
+        with open(os.path.join(self.root, "photo.jpg"), "wb") as fh:
+            fh.write(self.body)
+
+    def serve(self, **headers):
+        from .media import serve_media
+
+        return serve_media(RequestFactory().get("/", **headers), "photo.jpg", self.root)
+
+    def test_range_requests(self):
+        response = self.serve(HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.body)}")
+        self.assertEqual(b"".join(response.streaming_content), self.body[10:20])
+
+        response = self.serve(HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), self.body[-5:])
+
+        response = self.serve(HTTP_RANGE=f"bytes={len(self.body)}-")
+        self.assertEqual(response.status_code, 416)
+
+        # a stale If-Range gets the whole (changed) file instead of a range
+        response = self.serve(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.body)
+
+    @override_settings(MEDIA_ACCEL="x-accel-redirect", MEDIA_ACCEL_PREFIX="/protected/")
+    def test_accel_redirect_offload(self):
+        response = self.serve()
+        self.assertEqual(response["X-Accel-Redirect"], "/protected/photo.jpg")
+        self.assertEqual(response.content, b"")
+
+    def test_precompressed_static(self):
+        from .media import serve_static
+
+        with open(os.path.join(self.root, "site.css"), "w") as fh:
+            fh.write("body{}")
+        with open(os.path.join(self.root, "site.css.gz"), "wb") as fh:
+            fh.write(b"gz")
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        response = serve_static(request, "site.css", self.root)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+        response = serve_static(RequestFactory().get("/"), "site.css", self.root)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        # refused with q=0, or only named inside another token
+        for header in ("gzip;q=0, br", "x-gzip-not", "*;q=0"):
+            request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=header)
+            response = serve_static(request, "site.css", self.root)
+            self.assertFalse(response.has_header("Content-Encoding"), header)
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="identity;q=0.5, *;q=0.1")
+        self.assertEqual(serve_static(request, "site.css", self.root)["Content-Encoding"], "gzip")
@@ -0,0 +1,218 @@
+"""
+Resumable, chunked photo uploads for the dashboard.
+
+Instead of one multipart POST holding every photo, the browser:
+
+1. POSTs ``{"filename", "size", "sha256"}`` to ``.../<listing_id>/uploads/``
+   and gets back an upload id, the chunk size and how many bytes the server
+   already has (non-zero when resuming the same file);
+2. PUTs the raw bytes of chunk ``n`` to ``.../uploads/<id>/chunks/<n>/``;
+3. POSTs ``.../uploads/<id>/complete/``, which checks the SHA-256 and attaches
+   the file to the listing as a ListingPhoto.
+
+Chunks are written straight to a part file on disk, so a dropped connection
+only costs the chunk in flight.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Max
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+
+from .models import Listing, ListingPhoto, PhotoUpload
+
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+READ_BLOCK = 64 * 1024
+
+
+def upload_dir():
+    default = os.path.join(settings.BASE_DIR, "upload_chunks")
+    return getattr(settings, "CHUNKED_UPLOAD_DIR", default)
+
+
+def part_path(upload):
+    return os.path.join(upload_dir(), f"{upload.pk}.part")
+
+
+def received_bytes(upload):
+    # the part file is the source of truth: it survives a crash mid-request
+    try:
+        return os.path.getsize(part_path(upload))
+    except FileNotFoundError:
+        return 0
+
+
+def upload_state(upload):
+    return {
+        "id": str(upload.pk),
+        # chunks go to <url>chunks/<n>/, completion to <url>complete/
+        "url": reverse("admin:listings_listing_upload_status", args=[upload.pk]),
+        "filename": upload.filename,
+        "size": upload.size,
+        "chunk_size": CHUNK_SIZE,
+        "received": upload.size if upload.status == "complete" else received_bytes(upload),
+        "status": upload.status,
+        "photo_id": upload.photo_id,
+    }
+
+
+def _error(message, code=400, **extra):
+    return JsonResponse({"error": message, **extra}, status=code)
+
+
+def _can_upload(request):
+    return request.user.has_perm("listings.add_listingphoto")
+
+
+@require_POST
+def start_upload(request, listing_id):
+    if not _can_upload(request):
+        return _error("Permission denied.", code=403)
+    listing = get_object_or_404(Listing, pk=listing_id)
+    try:
+        data = json.loads(request.body)
+        filename = os.path.basename(str(data["filename"]))[:255]
+        size = int(data["size"])
+        sha256 = str(data["sha256"]).lower()
+    except (ValueError, KeyError, TypeError):
+        return _error("Expected JSON with filename, size and sha256.")
+    if not filename or not 0 < size <= MAX_UPLOAD_SIZE or len(sha256) != 64:
+        return _error("Invalid filename, size or sha256.")
+
+    # the same file again (e.g. after a page reload) resumes the old upload
+    upload, created = PhotoUpload.objects.get_or_create(
+        listing=listing,
+        filename=filename,
+        size=size,
+        sha256=sha256,
+        status="uploading",
+        defaults={"created_by": request.user},
+    )
+    return JsonResponse(upload_state(upload), status=201 if created else 200)
+
+
+@require_GET
+def upload_status(request, upload_id):
+    if not _can_upload(request):
+        return _error("Permission denied.", code=403)
+    upload = get_object_or_404(PhotoUpload, pk=upload_id)
+    return JsonResponse(upload_state(upload))
+
+
+@require_http_methods(["PUT", "POST"])
+def upload_chunk(request, upload_id, index):
+    if not _can_upload(request):
+        return _error("Permission denied.", code=403)
+    upload = get_object_or_404(PhotoUpload, pk=upload_id)
+    if upload.status != "uploading":
+        return _error("Upload already completed.", code=409, **upload_state(upload))
+
+    offset = index * CHUNK_SIZE
+    try:
+        length = int(request.headers.get("Content-Length") or 0)
+    except ValueError:
+        return _error("Invalid Content-Length.")
+    expected = min(CHUNK_SIZE, upload.size - offset)
+    if expected <= 0 or length != expected:
+        return _error(f"Chunk {index} must be {max(expected, 0)} bytes.")
+
+    received = received_bytes(upload)
+    if offset > received:
+        # a gap: tell the client where to carry on from
+        return _error("Missing earlier chunks.", code=409, **upload_state(upload))
+
+    os.makedirs(upload_dir(), exist_ok=True)
+    path = part_path(upload)
+    with open(path, "r+b" if os.path.exists(path) else "wb") as fh:
+        fh.seek(offset)
+        remaining = length
+        while remaining:
+            block = request.read(min(READ_BLOCK, remaining))
+            if not block:
+                break
+            fh.write(block)
+            remaining -= len(block)
+    if remaining:
+        # connection dropped mid-chunk; drop the partial tail
+        with open(path, "r+b") as fh:
+            fh.truncate(offset)
+        return _error("Incomplete chunk body.", **upload_state(upload))
+
+    PhotoUpload.objects.filter(pk=upload.pk).update(updated_at=timezone.now())
+    return JsonResponse(upload_state(upload))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@require_POST
+def complete_upload(request, upload_id):
+    if not _can_upload(request):
+        return _error("Permission denied.", code=403)
+    upload = get_object_or_404(PhotoUpload, pk=upload_id)
+    if upload.status == "complete":
+        return JsonResponse(upload_state(upload))
+
+    if received_bytes(upload) != upload.size:
+        return _error("Upload is not finished yet.", code=409, **upload_state(upload))
+    path = part_path(upload)
+    if _sha256_file(path) != upload.sha256:
+        # corrupt: throw the bytes away so the client starts this file over
+        _remove(path)
+        return _error(
+            "Checksum mismatch; upload the file again.", code=422, **upload_state(upload)
+        )
+
+    with transaction.atomic():
+        upload = PhotoUpload.objects.select_for_update().get(pk=upload.pk)
+        if upload.status != "complete":
+            last = upload.listing.photos.aggregate(last=Max("sort_order"))["last"]
+            photo = ListingPhoto(
+                listing=upload.listing,
+                sort_order=0 if last is None else last + 1,
+                mime_type=mimetypes.guess_type(upload.filename)[0] or "",
+            )
+            with open(path, "rb") as fh:
+                photo.image.save(upload.filename, File(fh), save=False)
+            photo.save()
+            upload.photo = photo
+            upload.status = "complete"
+            upload.save(update_fields=["photo", "status", "updated_at"])
+    _remove(path)
+    return JsonResponse(upload_state(upload))
+
+
+def purge_stale_uploads(max_age=timedelta(days=2)):
+    """Delete unfinished uploads (and their part files) nobody touched for ``max_age``."""
+    stale = PhotoUpload.objects.filter(
+        status="uploading", updated_at__lt=timezone.now() - max_age
+    )
+    count = 0
+    for upload in stale:
+        _remove(part_path(upload))
+        upload.delete()
+        count += 1
+    return count
@@ -1,22 +1,53 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, get_object_or_404
-from .models import Listing
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_GET
+from .browse import (
+    ListingFilterForm, acached_count, apaginate, apply_filters, cached_count, paginate,
+)
+from .caching import cache_public_page
+from .conditional import conditional_listing_page, list_stamp
+from .facets import facet_counts
+from .geo import MAX_ZOOM
+from .maps import map_clusters
+from .models import Listing, ListingCard, ListingPhoto
+from .search import search
+from .stats import NEW_DAYS, grouped
 
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+DEFAULT_MAP_ZOOM = 12
+# market stats change when listings do, a refresh job later
+STATS_MAX_AGE = 300
+
+
+# The grids read ListingCard rows only (see listings.cards): one indexed
+# scan of one table, with the cover photo and display strings already there.
+
+def _featured_card():
+    # Featured listing – at most one row; no ordering, so SQLite reads it
+    # straight from the card_featured_idx index
+    return ListingCard.objects.filter(is_featured=True).order_by()[:1]
 
-def public_home(request):
-    # Featured listing – latest active & visible one
-    featured = (
-        Listing.objects
-        .filter(is_featured=True, status="active", visibility="Y")
-        .order_by("-updated_at")
-        .first()
-    )
 
+def _latest_cards():
     # Latest 6 visible listings
-    latest_listings = (
-        Listing.objects
-        .filter(status="active", visibility="Y")
-        .order_by("-created_at")[:6]
-    )
+    return ListingCard.objects.order_by("-created_at")[:6]
+
+
+def _detail_listing():
+    return Listing.objects.select_related("neighborhood", "home_type", "price_range")
+
+
+@conditional_listing_page
+@cache_public_page
+def public_home(request):
+    featured = _featured_card()
+    featured = featured[0] if featured else None
+    latest_listings = _latest_cards()
 
     return render(request, "site/home.html", {
         "featured": featured,
@@ -24,22 +55,187 @@ def public_home(request):
     })
 
 
+def _page_url(request, **params):
+    query = request.GET.copy()
+    for key in ("after", "before"):
+        query.pop(key, None)
+    query.update(params)
+    return f"?{query.urlencode()}"
+
+
+@conditional_listing_page
+@cache_public_page
 def public_listings(request):
-    listings = (
-        Listing.objects
-        .filter(status="active", visibility="Y")
-        .order_by("-created_at")
+    form = ListingFilterForm(request.GET or None)
+    state = form.filter_state()
+    sort = form.sort_key()
+
+    base = apply_filters(ListingCard.objects.all(), state)
+    page = paginate(
+        base,
+        sort=sort,
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
     )
-    return render(request, "site/listings.html", {"listings": listings})
+
+    return render(request, "site/listings.html", {
+        "listings": page.items,
+        "page": page,
+        "form": form,
+        "total_count": cached_count(base, state),
+        "facets": facet_counts(state, list_stamp(request)),
+        "next_url": _page_url(request, after=page.next_cursor) if page.has_next else "",
+        "prev_url": _page_url(request, before=page.prev_cursor) if page.has_previous else "",
+    })
 
 
 # listings/views.py
+@conditional_listing_page
+@cache_public_page
 def public_listing_detail(request, pk):
-    listing = get_object_or_404(
-        Listing.objects.select_related("neighborhood", "home_type", "price_range"),
-        pk=pk,
-        visibility="Y",
-    )
+    listing = get_object_or_404(_detail_listing(), pk=pk, visibility="Y")
     photos = listing.photos.all()
     return render(request, "listings/detail.html", {"listing": listing, "photos": photos})
 
+
+@require_GET
+@cache_public_page
+def public_listing_search(request):
+    """
+    Ranked JSON search over public listings; the last word is matched as a
+    prefix, so the endpoint also serves search-as-you-type suggestions.
+    """
+    query = request.GET.get("q", "").strip()
+    try:
+        limit = min(max(int(request.GET.get("limit", SEARCH_LIMIT)), 1), MAX_SEARCH_LIMIT)
+    except ValueError:
+        limit = SEARCH_LIMIT
+
+    results = []
+    if query:
+        listings = search(
+            Listing.objects.public().select_related("neighborhood", "home_type").with_cover_photo(),
+            query,
+        )[:limit]
+        for listing in listings:
+            photo = listing.cover_photo
+            results.append({
+                "id": listing.pk,
+                "url": listing.get_absolute_url(),
+                "street": listing.street,
+                "city": listing.city,
+                "state": listing.state,
+                "zipcode": listing.zipcode,
+                "price": listing.price,
+                "neighborhood": listing.neighborhood.name if listing.neighborhood else None,
+                "home_type": listing.home_type.type_name if listing.home_type else None,
+                "photo": photo.variant_url(320) if photo else None,
+            })
+    return JsonResponse({"query": query, "results": results})
+
+
+@require_GET
+@cache_public_page
+def public_listing_map(request):
+    """
+    Map markers as JSON: ``?bbox=west,south,east,north&zoom=N`` plus any of
+    the browse filters. Nearby listings are clustered on the server.
+    """
+    try:
+        west, south, east, north = (float(value) for value in request.GET["bbox"].split(","))
+        zoom = int(request.GET.get("zoom", DEFAULT_MAP_ZOOM))
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "bbox=west,south,east,north and a numeric zoom are required."}, status=400)
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        return JsonResponse({"error": "bbox is out of range."}, status=400)
+
+    form = ListingFilterForm(request.GET)
+    data = map_clusters(form.filter_state(), (south, west, north, east), min(max(zoom, 0), MAX_ZOOM))
+    return JsonResponse(data)
+
+
+@require_GET
+def public_market_stats(request):
+    """Neighborhood, home type and ZIP code market numbers, read from the MarketStat rollups."""
+    stats = grouped()
+    response = render(request, "site/market_stats.html", {
+        "stats": stats,
+        "sections": [
+            ("neighborhood", stats["neighborhood"]),
+            ("home type", stats["home_type"]),
+            ("ZIP code", stats["zipcode"]),
+        ],
+        "new_days": NEW_DAYS,
+    })
+    patch_cache_control(response, public=True, max_age=STATS_MAX_AGE)
+    return response
+
+
+# ---------- async (ASGI) versions ---------- #
+#
+# config.urls_async routes the public pages here when served through
+# config.asgi. Independent queries are started together with asyncio.gather;
+# templates render in a worker thread because they may still query (the
+# filter form's choices, for one).
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+@conditional_listing_page
+@cache_public_page
+async def public_home_async(request):
+    featured, latest_listings = await asyncio.gather(
+        _alist(_featured_card()),
+        _alist(_latest_cards()),
+    )
+    return await sync_to_async(render)(request, "site/home.html", {
+        "featured": featured[0] if featured else None,
+        "latest_listings": latest_listings,
+    })
+
+
+@conditional_listing_page
+@cache_public_page
+async def public_listings_async(request):
+    form = ListingFilterForm(request.GET or None)
+    # validating the model choice fields queries the database
+    state = await sync_to_async(form.filter_state)()
+    sort = form.sort_key()
+
+    base = apply_filters(ListingCard.objects.all(), state)
+    page, total_count, facets = await asyncio.gather(
+        apaginate(
+            base,
+            sort=sort,
+            after=request.GET.get("after"),
+            before=request.GET.get("before"),
+        ),
+        acached_count(base, state),
+        sync_to_async(facet_counts)(state, list_stamp(request)),
+    )
+
+    return await sync_to_async(render)(request, "site/listings.html", {
+        "listings": page.items,
+        "page": page,
+        "form": form,
+        "total_count": total_count,
+        "facets": facets,
+        "next_url": _page_url(request, after=page.next_cursor) if page.has_next else "",
+        "prev_url": _page_url(request, before=page.prev_cursor) if page.has_previous else "",
+    })
+
+
+@conditional_listing_page
+@cache_public_page
+async def public_listing_detail_async(request, pk):
+    listing, photos = await asyncio.gather(
+        _detail_listing().filter(pk=pk, visibility="Y").afirst(),
+        _alist(ListingPhoto.objects.filter(listing_id=pk).order_by("sort_order", "id")),
+    )
+    if listing is None:
+        raise Http404("No Listing matches the given query.")
+    return await sync_to_async(render)(request, "listings/detail.html", {
+        "listing": listing,
+        "photos": photos,
+    })
@@ -0,0 +1,116 @@
+/* Resumable, chunked photo uploads for the listing change form.
+ * Talks to the endpoints in listings/uploads.py. */
+(function () {
+  "use strict";
+
+  var MAX_RETRIES = 8;
+
+  function csrfToken() {
+    var match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+    return match ? decodeURIComponent(match[1]) : "";
+  }
+
+  function sleep(ms) {
+    return new Promise(function (resolve) { setTimeout(resolve, ms); });
+  }
+
+  async function request(method, url, body, contentType) {
+    var headers = { "X-CSRFToken": csrfToken() };
+    if (contentType) headers["Content-Type"] = contentType;
+    var response = await fetch(url, {
+      method: method,
+      body: body,
+      headers: headers,
+      credentials: "same-origin",
+    });
+    var data = await response.json().catch(function () { return {}; });
+    return { status: response.status, data: data };
+  }
+
+  // retry network errors and 5xx with backoff; return 4xx answers to the caller
+  async function withRetry(fn) {
+    for (var attempt = 0; ; attempt++) {
+      try {
+        var result = await fn();
+        if (result.status < 500) return result;
+      } catch (err) {
+        if (attempt >= MAX_RETRIES) throw err;
+      }
+      if (attempt >= MAX_RETRIES) throw new Error("Server keeps failing");
+      await sleep(Math.min(30000, 500 * Math.pow(2, attempt)));
+    }
+  }
+
+  async function sha256Hex(file) {
+    var digest = await crypto.subtle.digest("SHA-256", await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest))
+      .map(function (b) { return b.toString(16).padStart(2, "0"); })
+      .join("");
+  }
+
+  async function upload(startUrl, file, report) {
+    report("hashing…");
+    var hash = await sha256Hex(file);
+    var state = (await withRetry(function () {
+      return request("POST", startUrl, JSON.stringify({
+        filename: file.name, size: file.size, sha256: hash,
+      }), "application/json");
+    })).data;
+    if (state.error) throw new Error(state.error);
+
+    while (state.status === "uploading") {
+      var index = Math.floor(state.received / state.chunk_size);
+      var offset = index * state.chunk_size;
+      if (offset >= state.size) {
+        var done = await withRetry(function () {
+          return request("POST", state.url + "complete/");
+        });
+        if (done.status === 422) {
+          state = done.data;  // checksum mismatch: server dropped the bytes
+          continue;
+        }
+        if (done.data.error) throw new Error(done.data.error);
+        state = done.data;
+        break;
+      }
+      var chunk = file.slice(offset, offset + state.chunk_size);
+      var result = await withRetry(function () {
+        return request("PUT", state.url + "chunks/" + index + "/", chunk,
+                       "application/octet-stream");
+      });
+      if (result.status >= 400 && result.status !== 409) {
+        throw new Error(result.data.error || "Upload failed");
+      }
+      state = result.data;
+      report(Math.round(100 * state.received / state.size) + "%");
+    }
+    report("done");
+  }
+
+  function init(container) {
+    var input = container.querySelector("input[type=file]");
+    var list = container.querySelector(".chunked-upload-list");
+    input.addEventListener("change", async function () {
+      var files = Array.from(input.files);
+      input.disabled = true;
+      for (var i = 0; i < files.length; i++) {
+        var item = document.createElement("li");
+        list.appendChild(item);
+        var report = (function (el, name) {
+          return function (msg) { el.textContent = name + ": " + msg; };
+        })(item, files[i].name);
+        try {
+          await upload(container.dataset.startUrl, files[i], report);
+        } catch (err) {
+          report("failed (" + err.message + ") — select the file again to resume");
+        }
+      }
+      input.disabled = false;
+      input.value = "";
+    });
+  }
+
+  document.addEventListener("DOMContentLoaded", function () {
+    document.querySelectorAll(".chunked-upload").forEach(init);
+  });
+})();
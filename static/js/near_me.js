@@ -0,0 +1,25 @@
+/* "Near me" on the listings filter form: fills the hidden lat/lng fields
+ * from the browser's location and submits, limiting results to the radius. */
+(function () {
+  "use strict";
+
+  var button = document.querySelector("[data-near-me]");
+  if (!button || !navigator.geolocation) return;
+  var form = button.form;
+  button.hidden = false;
+  button.addEventListener("click", function () {
+    button.disabled = true;
+    navigator.geolocation.getCurrentPosition(
+      function (position) {
+        form.elements.lat.value = position.coords.latitude.toFixed(5);
+        form.elements.lng.value = position.coords.longitude.toFixed(5);
+        if (!form.elements.radius.value) form.elements.radius.value = "5";
+        form.submit();
+      },
+      function () {
+        button.disabled = false;
+      },
+      { maximumAge: 600000, timeout: 10000 }
+    );
+  });
+})();